@@ -0,0 +1,18 @@
+"""
+gunicorn config for sso-profile project.
+
+Pages spend most of their time waiting on directory-api, SSO and Companies
+House, so by default each worker process serves many requests concurrently
+on gevent greenlets instead of one at a time. gevent makes the blocking
+socket I/O of the existing API clients cooperative, and patches
+`threading.local` so per-request state such as `core.cache.request_cache`
+stays per request.
+
+For more information on this file, see
+http://docs.gunicorn.org/en/19.5.0/settings.html
+"""
+
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
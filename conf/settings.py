@@ -65,6 +65,12 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'core.middleware.PrefixUrlMiddleware',
+    'core.middleware.RequestCacheMiddleware',
+    'core.middleware.MetricsBatchMiddleware',
+    'core.middleware.UpstreamTimingMiddleware',
+    'core.middleware.UpstreamCallBudgetMiddleware',
+    'core.middleware.CircuitOpenMiddleware',
+    'core.middleware.SessionSizeMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'directory_sso_api_client.middleware.AuthenticationMiddleware',
@@ -168,9 +174,41 @@ elif STORAGE_CLASS_NAME == 'default':
     AWS_QUERYSTRING_AUTH = env.bool('AWS_QUERYSTRING_AUTH', False)
     S3_USE_SIGV4 = env.bool('S3_USE_SIGV4', True)
     AWS_S3_HOST = env.str('AWS_S3_HOST', 's3.eu-west-1.amazonaws.com')
+    # files read back from S3 larger than this are spooled to disk rather than held in memory
+    AWS_S3_MAX_MEMORY_SIZE = env.int('AWS_S3_MAX_MEMORY_SIZE', 1024 * 1024)
 else:
     raise NotImplementedError()
 
+# case study media is uploaded by the browser straight to S3 using a presigned POST
+DIRECT_UPLOAD_AWS_ACCESS_KEY_ID = env.str('DIRECT_UPLOAD_AWS_ACCESS_KEY_ID', env.str('AWS_ACCESS_KEY_ID', ''))
+DIRECT_UPLOAD_AWS_SECRET_ACCESS_KEY = env.str(
+    'DIRECT_UPLOAD_AWS_SECRET_ACCESS_KEY', env.str('AWS_SECRET_ACCESS_KEY', '')
+)
+DIRECT_UPLOAD_BUCKET_NAME = env.str('DIRECT_UPLOAD_BUCKET_NAME', env.str('AWS_STORAGE_BUCKET_NAME', ''))
+DIRECT_UPLOAD_REGION_NAME = env.str('DIRECT_UPLOAD_REGION_NAME', 'eu-west-1')
+# set to use a local S3 stand-in such as minio or localstack
+DIRECT_UPLOAD_ENDPOINT_URL = env.str('DIRECT_UPLOAD_ENDPOINT_URL', '') or None
+DIRECT_UPLOAD_KEY_PREFIX = env.str('DIRECT_UPLOAD_KEY_PREFIX', 'case-study-uploads')
+DIRECT_UPLOAD_POLICY_EXPIRES = env.int('DIRECT_UPLOAD_POLICY_EXPIRES', 60 * 10)
+# uploaded objects larger than this are spooled to disk when sent on to directory-api
+DIRECT_UPLOAD_MAX_MEMORY_SIZE = env.int('DIRECT_UPLOAD_MAX_MEMORY_SIZE', 1024 * 1024)
+# uploads are deleted once used. Abandoned ones are expired by the rules set by
+# `./manage.py configure_direct_upload_bucket`
+DIRECT_UPLOAD_EXPIRY_DAYS = env.int('DIRECT_UPLOAD_EXPIRY_DAYS', 2)
+
+# uploaded logos are parked in the direct upload bucket and resized by `./manage.py process_logos`
+LOGO_UPLOAD_KEY_PREFIX = env.str('LOGO_UPLOAD_KEY_PREFIX', 'logo-uploads')
+# 'logo' is sent to directory-api, the others are saved as thumbnails under LOGO_THUMBNAIL_PATH
+LOGO_RENDITION_SIZES = {
+    'logo': (600, 600),
+    'thumbnail-medium': (300, 300),
+    'thumbnail-small': (100, 100),
+}
+LOGO_THUMBNAIL_PATH = env.str('LOGO_THUMBNAIL_PATH', 'company-logos')
+LOGO_JPEG_QUALITY = env.int('LOGO_JPEG_QUALITY', 85)
+# how long the logo worker can act on the user's behalf after the upload
+LOGO_SESSION_TIMEOUT = env.int('LOGO_SESSION_TIMEOUT', 60 * 60)
+
 # Logging for development
 if DEBUG:
     LOGGING = {
@@ -305,6 +343,13 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
 SESSION_COOKIE_SECURE = env.bool('SESSION_COOKIE_SECURE', True)
 SESSION_COOKIE_NAME = env.str('SESSION_COOKIE_NAME', 'profile_sessionid')
 SESSION_COOKIE_HTTPONLY = True
+
+# the wizards keep their data in redis, with only an id in the session cookie
+WIZARD_STORAGE_NAME = env.str('WIZARD_STORAGE_NAME', 'core.wizard_storage.RedisStorage')
+WIZARD_STORAGE_TIMEOUT = env.int('WIZARD_STORAGE_TIMEOUT', 60 * 60 * 24)
+# browsers ignore cookies larger than about 4KB
+SESSION_SIZE_BUDGET = env.int('SESSION_SIZE_BUDGET', 4096)
+SESSION_SIZE_BUDGET_STRICT = env.bool('SESSION_SIZE_BUDGET_STRICT', False)
 CSRF_COOKIE_SECURE = True
 
 # Google tag manager
@@ -329,6 +374,14 @@ EXPORTING_OPPORTUNITIES_API_SECRET = env.str(
 EXPORTING_OPPORTUNITIES_SEARCH_URL = env.str(
     'EXPORTING_OPPORTUNITIES_SEARCH_URL'
 )
+EXPORTING_OPPORTUNITIES_API_POOL_MAXSIZE = env.int('EXPORTING_OPPORTUNITIES_API_POOL_MAXSIZE', 10)
+EXPORTING_OPPORTUNITIES_API_CONNECT_TIMEOUT = env.float('EXPORTING_OPPORTUNITIES_API_CONNECT_TIMEOUT', 3.05)
+EXPORTING_OPPORTUNITIES_API_READ_TIMEOUT = env.float('EXPORTING_OPPORTUNITIES_API_READ_TIMEOUT', 10)
+EXPORTING_OPPORTUNITIES_API_MAX_RETRIES = env.int('EXPORTING_OPPORTUNITIES_API_MAX_RETRIES', 2)
+EXPORTING_OPPORTUNITIES_API_RETRY_BACKOFF_FACTOR = env.float('EXPORTING_OPPORTUNITIES_API_RETRY_BACKOFF_FACTOR', 0.3)
+EXPORTING_OPPORTUNITIES_API_TCP_KEEPALIVE = env.bool('EXPORTING_OPPORTUNITIES_API_TCP_KEEPALIVE', False)
+EXPORTING_OPPORTUNITIES_CACHE_TIMEOUT = env.int('EXPORTING_OPPORTUNITIES_CACHE_TIMEOUT', 60 * 2)
+EXPORTING_OPPORTUNITIES_NOT_FOUND_CACHE_TIMEOUT = env.int('EXPORTING_OPPORTUNITIES_NOT_FOUND_CACHE_TIMEOUT', 60 * 30)
 
 # find a buyer
 FAB_EDIT_PROFILE_URL = env.str('FAB_EDIT_PROFILE_URL')
@@ -338,6 +391,9 @@ FAB_ADD_CASE_STUDY_URL = env.str('FAB_ADD_CASE_STUDY_URL')
 FEATURE_FLAGS = {
     'COUNTRY_SELECTOR_ON': False,
     'MAINTENANCE_MODE_ON': env.bool('FEATURE_MAINTENANCE_MODE_ENABLED', False),  # used by directory-components
+    'SERVER_TIMING_HEADER_ON': env.bool('FEATURE_SERVER_TIMING_HEADER_ENABLED', False),
+    'CASE_STUDY_DIRECT_UPLOAD_ON': env.bool('FEATURE_CASE_STUDY_DIRECT_UPLOAD_ENABLED', False),
+    'LOGO_PROCESSING_ON': env.bool('FEATURE_LOGO_PROCESSING_ENABLED', False),
 }
 
 # Healthcheck
@@ -377,9 +433,13 @@ DIRECTORY_CH_SEARCH_CLIENT_SENDER_ID = env.str(
 DIRECTORY_CH_SEARCH_CLIENT_DEFAULT_TIMEOUT = env.str(
     'DIRECTORY_CH_SEARCH_CLIENT_DEFAULT_TIMEOUT', 5
 )
+COMPANIES_HOUSE_SEARCH_CACHE_TIMEOUT = env.int('COMPANIES_HOUSE_SEARCH_CACHE_TIMEOUT', 60 * 60 * 24)
+COMPANIES_HOUSE_SEARCH_LRU_MAXSIZE = env.int('COMPANIES_HOUSE_SEARCH_LRU_MAXSIZE', 1000)
 
 # getAddress.io
 GET_ADDRESS_API_KEY = env.str('GET_ADDRESS_API_KEY')
+GET_ADDRESS_API_POOL_MAXSIZE = env.int('GET_ADDRESS_API_POOL_MAXSIZE', 10)
+ADDRESS_SEARCH_CACHE_TIMEOUT = env.int('ADDRESS_SEARCH_CACHE_TIMEOUT', 60 * 60 * 24 * 30)
 
 # directory forms api client
 DIRECTORY_FORMS_API_BASE_URL = env.str('DIRECTORY_FORMS_API_BASE_URL')
@@ -403,6 +463,15 @@ GOV_NOTIFY_NEW_MEMBER_REGISTERED_TEMPLATE_ID = env.str(
     '439a8415-52d8-4975-b230-15cd34305bb5'
 )
 
+# emails queued in redis and sent by `./manage.py drain_outbox`
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_RETRY_BACKOFF = env.int('OUTBOX_RETRY_BACKOFF', 30)
+OUTBOX_STATUS_TIMEOUT = env.int('OUTBOX_STATUS_TIMEOUT', 60 * 60 * 24 * 7)
+OUTBOX_POLL_TIMEOUT = env.int('OUTBOX_POLL_TIMEOUT', 5)
+# a worker's in-flight messages are requeued once its heartbeat is this old
+OUTBOX_WORKER_TIMEOUT = env.int('OUTBOX_WORKER_TIMEOUT', 60 * 5)
+OUTBOX_FAILED_MAX_LENGTH = env.int('OUTBOX_FAILED_MAX_LENGTH', 1000)
+
 # directory api
 DIRECTORY_API_CLIENT_BASE_URL = env.str('DIRECTORY_API_CLIENT_BASE_URL')
 DIRECTORY_API_CLIENT_API_KEY = env.str('DIRECTORY_API_CLIENT_API_KEY')
@@ -413,6 +482,34 @@ DIRECTORY_API_CLIENT_DEFAULT_TIMEOUT = env.str(
     'DIRECTORY_API_CLIENT_DEFAULT_TIMEOUT', 15
 )
 
+# cross-request cache of the logged in user's company profile
+COMPANY_PROFILE_CACHE_TIMEOUT = env.int('COMPANY_PROFILE_CACHE_TIMEOUT', 60 * 5)
+COMPANY_PROFILE_NOT_FOUND_CACHE_TIMEOUT = env.int('COMPANY_PROFILE_NOT_FOUND_CACHE_TIMEOUT', 60)
+# how long the last retrieved company profile is kept to serve while directory-api is unavailable
+COMPANY_PROFILE_FALLBACK_CACHE_TIMEOUT = env.int('COMPANY_PROFILE_FALLBACK_CACHE_TIMEOUT', 60 * 60 * 24)
+# cross-request cache of the collaborators of the logged in user's company
+COLLABORATOR_DIRECTORY_CACHE_TIMEOUT = env.int('COLLABORATOR_DIRECTORY_CACHE_TIMEOUT', 60 * 5)
+# number of collaborators or invites shown per page of the admin tools
+COLLABORATOR_PAGE_SIZE = env.int('COLLABORATOR_PAGE_SIZE', 50)
+
+# stop calling directory-api, SSO and Companies House while they are failing
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5)
+CIRCUIT_BREAKER_FAILURE_WINDOW = env.int('CIRCUIT_BREAKER_FAILURE_WINDOW', 30)
+CIRCUIT_BREAKER_RESET_TIMEOUT = env.int('CIRCUIT_BREAKER_RESET_TIMEOUT', 30)
+
+# concurrent cold cache reads of the same key wait for one fetch instead of all calling upstream
+SINGLE_FLIGHT_LOCK_TIMEOUT = env.int('SINGLE_FLIGHT_LOCK_TIMEOUT', 20)
+SINGLE_FLIGHT_WAIT_TIMEOUT = env.float('SINGLE_FLIGHT_WAIT_TIMEOUT', 5)
+SINGLE_FLIGHT_POLL_INTERVAL = env.float('SINGLE_FLIGHT_POLL_INTERVAL', 0.05)
+
+# upstream calls a request can make before `UpstreamCallBudgetMiddleware` flags it
+UPSTREAM_CALL_BUDGET = env.int('UPSTREAM_CALL_BUDGET', 8)
+UPSTREAM_CALL_BUDGET_STRICT = env.bool('UPSTREAM_CALL_BUDGET_STRICT', False)
+
+# threads per worker process used to fetch a view's upstream data concurrently. Shared by all of the
+# requests a gevent worker is serving, so greenlets rather than OS threads when running under gunicorn
+PREFETCH_MAX_WORKERS = env.int('PREFETCH_MAX_WORKERS', 20)
+
 # directory client core
 DIRECTORY_CLIENT_CORE_CACHE_EXPIRE_SECONDS = 60 * 60 * 24 * 30  # 30 days
 
@@ -431,6 +528,22 @@ VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES = env.int(
 VALIDATOR_MAX_CASE_STUDY_VIDEO_SIZE_BYTES = env.int(
     'VALIDATOR_MAX_CASE_STUDY_VIDEO_SIZE_BYTES', 20 * 1024 * 1024
 )
+# checked from the image header, before anything decodes the image
+VALIDATOR_MAX_IMAGE_PIXELS = env.int('VALIDATOR_MAX_IMAGE_PIXELS', 25 * 1000 * 1000)
+
+# uploaded files are written to temporary files rather than held in memory,
+# and files larger than allowed for their field are abandoned part way
+FILE_UPLOAD_HANDLERS = [
+    'core.upload_handlers.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_SIZE_BYTES = {
+    'logo': VALIDATOR_MAX_LOGO_SIZE_BYTES,
+    'image_one': VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES,
+    'image_two': VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES,
+    'image_three': VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES,
+    'video_one': VALIDATOR_MAX_CASE_STUDY_VIDEO_SIZE_BYTES,
+}
 
 AUTH_USER_MODEL = 'sso.SSOUser'
 
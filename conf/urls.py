@@ -42,6 +42,11 @@ healthcheck_urls = [
         directory_healthcheck.views.PingView.as_view(),
         name='ping'
     ),
+    url(
+        r'^metrics/$',
+        core.views.MetricsView.as_view(),
+        name='metrics'
+    ),
 ]
 
 api_urls = [
@@ -210,6 +215,11 @@ urlpatterns = [
         company_admin_required(profile.business_profile.views.AdminCollaboratorEditFormView.as_view()),
         name='business-profile-admin-collaborator-edit'
     ),
+    url(
+        r'^business-profile/admin/bulk/$',
+        company_admin_required(profile.business_profile.views.AdminCollaboratorBulkFormView.as_view()),
+        name='business-profile-admin-collaborator-bulk'
+    ),
     url(
         r'^business-profile/admin/disconnect/$',
         company_admin_required(profile.business_profile.views.AdminDisconnectFormView.as_view()),
@@ -270,6 +280,11 @@ urlpatterns = [
         company_required(profile.business_profile.views.BusinessDetailsFormView.as_view()),
         name='business-profile-business-details'
     ),
+    url(
+        r'^business-profile/case-study-media-upload/$',
+        company_required(profile.business_profile.views.CaseStudyMediaUploadView.as_view()),
+        name='business-profile-case-study-media-upload'
+    ),
     url(
         r'^business-profile/case-study/(?P<id>[0-9]+)/(?P<step>.+)/$',
         company_required(
@@ -6,12 +6,14 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 
+from core.helpers import companies_house_search_lru
 from core.tests.helpers import create_response
 
 
 @pytest.fixture(autouse=True)
 def clear_cache():
     cache.clear()
+    companies_house_search_lru.clear()
 
 
 @pytest.fixture
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import upstream
+
+
+class RequestCache(threading.local):
+    """Memoize upstream API reads for the lifetime of a single request.
+
+    Responses are keyed on the client method and the arguments it was called
+    with, so the same resource is fetched at most once per request. The cache
+    is only populated between `activate` and `deactivate` - which
+    `core.middleware.RequestCacheMiddleware` calls around every request - so
+    calls made outside of a request always reach the upstream service.
+
+    Helpers that write to an upstream service must call `clear` afterwards so
+    that subsequent reads within the same request see the change.
+
+    """
+
+    store = None
+
+    @property
+    def is_active(self):
+        return self.store is not None
+
+    def activate(self, store=None):
+        self.store = {} if store is None else store
+
+    def deactivate(self):
+        self.store = None
+
+    def clear(self):
+        if self.is_active:
+            self.store.clear()
+        upstream.recorder.mark_invalidated()
+
+    def call(self, method, *args, **kwargs):
+        if not self.is_active:
+            return upstream.call(method, *args, **kwargs)
+        key = self.build_key(method, *args, **kwargs)
+        if key not in self.store:
+            self.store[key] = upstream.call(method, *args, **kwargs)
+        return self.store[key]
+
+    @staticmethod
+    def build_key(method, *args, **kwargs):
+        # mocked client methods do not have a __qualname__
+        name = getattr(method, '__qualname__', None) or id(method)
+        return (name, args, tuple(sorted(kwargs.items())))
+
+
+request_cache = RequestCache()
+
+
+class LRUCache:
+    """Bounded in-process cache that evicts the least recently used entry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SingleFlight:
+    """Coalesce concurrent fetches of the same cache key.
+
+    `fetch` must store its result in the cache under `key`. Only one caller
+    runs it at a time:
+
+    - within a process, other callers for the key wait for the first and
+      share its result or exception.
+    - across processes, the first caller takes a lock in redis. Callers in
+      other processes poll the cache until the result appears. If the lock is
+      released without a result (the fetch failed) or `wait_timeout` passes,
+      they fetch it themselves.
+
+    """
+
+    def __init__(self, lock_timeout, wait_timeout, poll_interval):
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def do(self, key, fetch):
+        with self.lock:
+            flight = self.flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self.flights[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        if not is_leader:
+            if flight['done'].wait(timeout=self.wait_timeout):
+                if flight['error'] is not None:
+                    raise flight['error']
+                return flight['result']
+            return fetch()
+        try:
+            flight['result'] = self.do_across_processes(key=key, fetch=fetch)
+            return flight['result']
+        except Exception as error:
+            flight['error'] = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight['done'].set()
+
+    def do_across_processes(self, key, fetch):
+        lock_key = f'{key}-SINGLE-FLIGHT'
+        if cache.add(key=lock_key, value=True, timeout=self.lock_timeout):
+            try:
+                return fetch()
+            finally:
+                cache.delete(lock_key)
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entries = cache.get_many([key, lock_key])
+            if key in entries:
+                return entries[key]
+            if lock_key not in entries:
+                break
+        return fetch()
+
+
+single_flight = SingleFlight(
+    lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+    wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT,
+    poll_interval=settings.SINGLE_FLIGHT_POLL_INTERVAL,
+)
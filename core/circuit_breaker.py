@@ -0,0 +1,118 @@
+import logging
+import time
+
+import requests
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_CIRCUIT_BREAKER = 'CIRCUIT_BREAKER'
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling an upstream service whose circuit is open.
+
+    Subclasses `ConnectionError` so existing `RequestException` handling and
+    fallbacks apply to it.
+
+    """
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} circuit is open')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stop calling an upstream service that keeps failing.
+
+    The state is kept in redis so it is shared by all worker processes. After
+    `failure_threshold` failures within `failure_window` seconds the circuit
+    opens and calls fail fast with `CircuitOpenError`. Once `reset_timeout`
+    seconds have passed one process is let through to probe the service:
+    success closes the circuit, failure opens it for another `reset_timeout`.
+
+    Exceptions raised by `requests` and 5xx responses count as failures.
+
+    """
+
+    def __init__(self, name, failure_threshold, failure_window, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.failures_key = f'{CACHE_KEY_CIRCUIT_BREAKER}-{name}-FAILURES'
+        self.opened_key = f'{CACHE_KEY_CIRCUIT_BREAKER}-{name}-OPENED'
+        self.probe_key = f'{CACHE_KEY_CIRCUIT_BREAKER}-{name}-PROBE'
+
+    def call(self, method, *args, **kwargs):
+        is_probe = self.before_call()
+        try:
+            response = method(*args, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record_failure(is_probe)
+            raise
+        if getattr(response, 'status_code', 200) >= 500:
+            self.record_failure(is_probe)
+        elif is_probe:
+            self.close()
+        return response
+
+    def before_call(self):
+        """Raise `CircuitOpenError` unless the call can go ahead. Returns whether the call is the probe."""
+        opened_at = cache.get(self.opened_key)
+        if opened_at is None:
+            return False
+        retry_after = opened_at + self.reset_timeout - time.time()
+        if retry_after > 0 or not cache.add(self.probe_key, True, timeout=self.reset_timeout):
+            raise CircuitOpenError(name=self.name, retry_after=max(retry_after, 0))
+        return True
+
+    def record_failure(self, is_probe):
+        if is_probe:
+            self.open()
+            return
+        if cache.add(self.failures_key, 1, timeout=self.failure_window):
+            failures = 1
+        else:
+            try:
+                failures = cache.incr(self.failures_key)
+            except ValueError:
+                # the window expired between the add and the incr
+                cache.add(self.failures_key, 1, timeout=self.failure_window)
+                failures = 1
+        if failures >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        logger.error('%s circuit opened', self.name)
+        cache.set(self.opened_key, time.time(), timeout=None)
+        cache.delete_many([self.failures_key, self.probe_key])
+
+    def close(self):
+        logger.info('%s circuit closed', self.name)
+        cache.delete_many([self.opened_key, self.failures_key, self.probe_key])
+
+
+def build_circuit_breaker(name):
+    return CircuitBreaker(
+        name=name,
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        failure_window=settings.CIRCUIT_BREAKER_FAILURE_WINDOW,
+        reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+    )
+
+
+# keyed on the top level package of the client method
+circuit_breakers = {
+    'directory_api_client': build_circuit_breaker('DIRECTORY_API'),
+    'directory_sso_api_client': build_circuit_breaker('SSO_API'),
+    'directory_ch_client': build_circuit_breaker('COMPANIES_HOUSE'),
+}
+
+
+def get_circuit_breaker(method):
+    module = getattr(method, '__module__', None) or ''
+    return circuit_breakers.get(module.split('.')[0])
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.text import get_valid_filename
+
+
+def build_client():
+    # imported here so that web workers only load boto3 once a direct upload is made
+    import boto3
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.DIRECT_UPLOAD_AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.DIRECT_UPLOAD_AWS_SECRET_ACCESS_KEY,
+        region_name=settings.DIRECT_UPLOAD_REGION_NAME,
+        endpoint_url=settings.DIRECT_UPLOAD_ENDPOINT_URL,
+    )
+
+
+client = SimpleLazyObject(build_client)
+
+
+def build_key(prefix, filename):
+    # the uuid stops uploads of files with the same name overwriting each other
+    return f'{prefix}/{uuid.uuid4()}/{get_valid_filename(os.path.basename(filename))}'
+
+
+def create_presigned_post(key, max_size, content_types):
+    """Sign a policy that lets the browser POST one file straight to the bucket.
+
+    The policy only allows the given key, a size of up to `max_size` bytes
+    and a Content-Type starting with one of `content_types`. Returns the url
+    to POST to and the form fields to send with the file.
+
+    """
+
+    return client.generate_presigned_post(
+        Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME,
+        Key=key,
+        Conditions=[
+            ['content-length-range', 1, max_size],
+            ['starts-with', '$Content-Type', os.path.commonprefix(content_types)],
+        ],
+        ExpiresIn=settings.DIRECT_UPLOAD_POLICY_EXPIRES,
+    )
+
+
+def get_metadata(key):
+    """Return the size and content type of an uploaded object, or None if it does not exist."""
+    try:
+        response = client.head_object(Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME, Key=key)
+    except client.exceptions.ClientError as error:
+        if error.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+    return {'size': response['ContentLength'], 'content_type': response['ContentType']}
+
+
+def open_object(key):
+    """Download an uploaded object to a temporary file, spooled to disk if large.
+
+    Returns a (filename, file) tuple as accepted by `requests` for multipart uploads.
+
+    """
+
+    file = tempfile.SpooledTemporaryFile(max_size=settings.DIRECT_UPLOAD_MAX_MEMORY_SIZE)
+    client.download_fileobj(Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME, Key=key, Fileobj=file)
+    file.seek(0)
+    return os.path.basename(key), file
+
+
+def upload_object(key, file, content_type):
+    # for files that reach us rather than being uploaded by the browser
+    client.upload_fileobj(
+        Fileobj=file,
+        Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME,
+        Key=key,
+        ExtraArgs={'ContentType': content_type},
+    )
+
+
+def delete_object(key):
+    client.delete_object(Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME, Key=key)
+
+
+def delete_objects(keys):
+    client.delete_objects(
+        Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME,
+        Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True},
+    )
+
+
+def put_expiry_rules(prefixes, days):
+    """Expire the objects under each of `prefixes` `days` days after they are uploaded.
+
+    This clears up uploads that were abandoned before they were used. It
+    replaces the bucket's whole lifecycle configuration.
+
+    """
+
+    client.put_bucket_lifecycle_configuration(
+        Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME,
+        LifecycleConfiguration={
+            'Rules': [
+                {
+                    'ID': f'expire-{prefix}',
+                    'Filter': {'Prefix': f'{prefix}/'},
+                    'Status': 'Enabled',
+                    'Expiration': {'Days': days},
+                }
+                for prefix in prefixes
+            ]
+        },
+    )
@@ -1,8 +1,14 @@
 from directory_constants import urls
 from directory_components import forms
+import directory_validators.file
 
+from django.conf import settings
+from django.core.validators import validate_image_file_extension
+from django.forms import FileField, ImageField, ValidationError
 from django.utils.safestring import mark_safe
 
+from core import image_headers
+
 
 TERMS_LABEL = mark_safe(
     'Tick this box to accept the '
@@ -36,3 +42,46 @@ class PersonalDetails(forms.Form):
         super().__init__(*args, **kwargs)
         if ask_terms_agreed:
             self.fields['terms_agreed'] = forms.BooleanField(label=TERMS_LABEL)
+
+
+class HeaderImageField(FileField):
+    """Accept a PNG or JPEG, checking it from its header alone.
+
+    `ImageField` reads the whole upload into memory and has Pillow verify it.
+    This reads only the signature and the header for the format and
+    dimensions, so files that are not images or that decode to too many
+    pixels are rejected without being decoded.
+
+    """
+
+    default_validators = [validate_image_file_extension]
+    default_error_messages = {
+        'invalid_image': ImageField.default_error_messages['invalid_image'],
+        'invalid_image_format': directory_validators.file.MESSAGE_INVALID_IMAGE_FORMAT,
+        'too_many_pixels': 'Image is too large. Use an image with smaller dimensions.',
+    }
+
+    def to_python(self, data):
+        file = super().to_python(data)
+        if file is None:
+            return None
+        try:
+            header = image_headers.read_image_header(file)
+        except image_headers.UnrecognisedImageError as exc:
+            raise ValidationError(self.error_messages['invalid_image_format'], code='invalid_image_format') from exc
+        except image_headers.MalformedImageError as exc:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image') from exc
+        finally:
+            file.seek(0)
+        if not header.width or not header.height:
+            raise ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+        if header.width * header.height > settings.VALIDATOR_MAX_IMAGE_PIXELS:
+            raise ValidationError(self.error_messages['too_many_pixels'], code='too_many_pixels')
+        file.image_header = header
+        file.content_type = image_headers.CONTENT_TYPES[header.format]
+        return file
+
+    def widget_attrs(self, widget):
+        attrs = super().widget_attrs(widget)
+        attrs.setdefault('accept', ','.join(image_headers.CONTENT_TYPES.values()))
+        return attrs
@@ -1,9 +1,37 @@
+from concurrent import futures
+import hashlib
+import logging
+
+from directory_ch_client.client import ch_search_api_client
 from directory_sso_api_client import sso_api_client
 from directory_api_client.client import api_client
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import metrics, upstream
+from core.cache import LRUCache, request_cache
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_COMPANIES_HOUSE_SEARCH = 'COMPANIES_HOUSE_SEARCH'
+CACHE_KEY_ADDRESS_SEARCH = 'ADDRESS_SEARCH'
+
+prefetch_executor = futures.ThreadPoolExecutor(max_workers=settings.PREFETCH_MAX_WORKERS)
+companies_house_search_lru = LRUCache(maxsize=settings.COMPANIES_HOUSE_SEARCH_LRU_MAXSIZE)
+
+address_search_session = requests.Session()
+address_search_session.auth = HTTPBasicAuth('api-key', settings.GET_ADDRESS_API_KEY)
+address_search_session.mount('https://', HTTPAdapter(pool_maxsize=settings.GET_ADDRESS_API_POOL_MAXSIZE))
 
 
 def create_user_profile(sso_session_id, data):
-    profile_response = sso_api_client.user.create_user_profile(sso_session_id=sso_session_id, data=data)
+    profile_response = upstream.call(sso_api_client.user.create_user_profile, sso_session_id=sso_session_id, data=data)
+    request_cache.clear()
     profile_response.raise_for_status()
     # Call made to Supplier to keep name in Sync
     # To be removed once we remove from supplier model
@@ -12,7 +40,8 @@ def create_user_profile(sso_session_id, data):
 
 
 def update_user_profile(sso_session_id, data):
-    profile_response = sso_api_client.user.update_user_profile(sso_session_id=sso_session_id, data=data)
+    profile_response = upstream.call(sso_api_client.user.update_user_profile, sso_session_id=sso_session_id, data=data)
+    request_cache.clear()
     profile_response.raise_for_status()
     # Call made to Supplier to keep name in Sync
     # To be removed once we remove from supplier model
@@ -22,7 +51,8 @@ def update_user_profile(sso_session_id, data):
 
 def update_supplier_profile_name(sso_session_id, data):
     name = extract_full_name(data)
-    response = api_client.supplier.profile_update(sso_session_id=sso_session_id, data={'name': name})
+    response = upstream.call(api_client.supplier.profile_update, sso_session_id=sso_session_id, data={'name': name})
+    request_cache.clear()
     if response.status_code not in [200, 404]:
         response.raise_for_status()
     return response
@@ -32,3 +62,137 @@ def extract_full_name(data):
     first_name = data.get('first_name')
     last_name = data.get('last_name')
     return f'{first_name} {last_name}'
+
+
+def run_concurrently(*calls):
+    """Run independent upstream calls concurrently and wait for all of them.
+
+    The calls share the current request's `request_cache` and are recorded
+    against the current request. Returns a `(result, error)` pair per call, in
+    the order the calls were given.
+
+    """
+
+    store = request_cache.store
+    upstream_calls = upstream.recorder.calls
+    invalidations = upstream.recorder.invalidations
+
+    def run(call):
+        request_cache.activate(store)
+        # record against the parent request, or straight to the histogram outside of one
+        upstream.recorder.calls = upstream_calls
+        upstream.recorder.invalidations = invalidations
+        try:
+            return call()
+        finally:
+            request_cache.deactivate()
+            upstream.recorder.deactivate()
+
+    pending = [prefetch_executor.submit(run, call) for call in calls]
+    futures.wait(pending)
+    return [
+        (None, future.exception()) if future.exception() else (future.result(), None)
+        for future in pending
+    ]
+
+
+def prefetch(*calls):
+    """Run independent upstream reads concurrently and wait for all of them.
+
+    The calls share the current request's `request_cache`, so when the view
+    later makes the same calls the responses are already to hand. Errors are
+    not raised here: the view will make the call again and handle the error
+    as it normally would.
+
+    """
+
+    for _, error in run_concurrently(*calls):
+        if error:
+            logger.warning('Prefetch failed', exc_info=error)
+
+
+def normalise_search_term(term):
+    return ' '.join(term.lower().split())
+
+
+def build_companies_house_search_cache_key(term):
+    digest = hashlib.md5(term.encode()).hexdigest()
+    return f'{CACHE_KEY_COMPANIES_HOUSE_SEARCH}-{digest}'
+
+
+def narrow_companies_house_search(result, term, prefix):
+    # the results for a prefix can answer a longer term only if they are the
+    # complete set of matches rather than the first page of them, and only if
+    # every one of them matched on its title. Companies House also matches
+    # company numbers, previous names and other fields that are not filtered
+    # on here, so otherwise the search goes upstream.
+    if prefix == term:
+        return result['items']
+    if result['total_results'] is None or result['total_results'] > len(result['items']):
+        return None
+    if any(character.isdigit() for character in term):
+        return None
+    titles = [normalise_search_term(item.get('title', '')) for item in result['items']]
+    if not all(prefix in title for title in titles):
+        return None
+    return [item for item, title in zip(result['items'], titles) if term in title]
+
+
+def search_companies_house(term):
+    """Search Companies House, reusing cached results for the term or a prefix of it.
+
+    Results are looked up in an in-process LRU before redis, and redis is
+    queried for every prefix of the term in one round trip.
+
+    """
+
+    term = normalise_search_term(term)
+    prefixes = [term[:index] for index in range(len(term), 0, -1)]
+
+    for prefix in prefixes:
+        result = companies_house_search_lru.get(prefix)
+        if result is not None:
+            items = narrow_companies_house_search(result, term, prefix)
+            if items is not None:
+                return items
+
+    keys = {prefix: build_companies_house_search_cache_key(prefix) for prefix in prefixes}
+    cached = cache.get_many(keys.values())
+    for prefix in prefixes:
+        result = cached.get(keys[prefix])
+        if result is not None:
+            companies_house_search_lru.set(prefix, result)
+            items = narrow_companies_house_search(result, term, prefix)
+            if items is not None:
+                return items
+
+    response = upstream.call(ch_search_api_client.company.search_companies, query=term)
+    response.raise_for_status()
+    parsed = response.json()
+    result = {'items': parsed['items'], 'total_results': parsed.get('total_results')}
+    cache.set(keys[term], result, timeout=settings.COMPANIES_HOUSE_SEARCH_CACHE_TIMEOUT)
+    companies_house_search_lru.set(term, result)
+    return result['items']
+
+
+def normalise_postcode(postcode):
+    return ''.join(postcode.split()).upper()
+
+
+def search_address(postcode):
+    postcode = normalise_postcode(postcode)
+    key = f'{CACHE_KEY_ADDRESS_SEARCH}-{postcode}'
+    addresses = cache.get(key)
+    if addresses is not None:
+        metrics.address_search_cache.increment(metrics.CacheCounter.HIT)
+        return addresses
+    metrics.address_search_cache.increment(metrics.CacheCounter.MISS)
+    response = upstream.call(address_search_session.get, f'https://api.getAddress.io/find/{postcode}/', timeout=10)
+    if response.ok:
+        addresses = [address.replace(' ,', '') for address in response.json()['addresses']]
+    elif response.status_code == 400:
+        addresses = []
+    else:
+        response.raise_for_status()
+    cache.set(key, addresses, timeout=settings.ADDRESS_SEARCH_CACHE_TIMEOUT)
+    return addresses
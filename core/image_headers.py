@@ -0,0 +1,84 @@
+import collections
+import os
+import struct
+
+
+ImageHeader = collections.namedtuple('ImageHeader', ['format', 'width', 'height'])
+
+CONTENT_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg'}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8'
+# SOF0 to SOF15 hold the frame dimensions. DHT, JPG and DAC share the range but do not.
+JPEG_START_OF_FRAME_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# markers that are not followed by a segment length: TEM, RST0 to RST7 and SOI
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD9)])
+JPEG_START_OF_SCAN = 0xDA
+JPEG_END_OF_IMAGE = 0xD9
+
+
+class UnrecognisedImageError(ValueError):
+    pass
+
+
+class MalformedImageError(ValueError):
+    pass
+
+
+def read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise MalformedImageError('Unexpected end of file')
+    return memoryview(data)
+
+
+def read_png_header(file):
+    # the IHDR chunk must come first: length, type, then width and height
+    chunk = read_exactly(file, 16)
+    length, chunk_type, width, height = struct.unpack_from('>I4sII', chunk)
+    if length != 13 or chunk_type != b'IHDR':
+        raise MalformedImageError('PNG does not start with an IHDR chunk')
+    return ImageHeader(format='PNG', width=width, height=height)
+
+
+def read_jpeg_header(file):
+    # walk the segments, seeking past their contents, until the start of frame
+    while True:
+        marker = read_exactly(file, 2)
+        if marker[0] != 0xFF:
+            raise MalformedImageError('Expected a JPEG marker')
+        code = marker[1]
+        while code == 0xFF:
+            # markers may be padded with any number of 0xFF
+            code = read_exactly(file, 1)[0]
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (JPEG_START_OF_SCAN, JPEG_END_OF_IMAGE):
+            raise MalformedImageError('JPEG has no start of frame')
+        length, = struct.unpack_from('>H', read_exactly(file, 2))
+        if length < 2:
+            raise MalformedImageError('Invalid JPEG segment length')
+        if code in JPEG_START_OF_FRAME_MARKERS:
+            precision, height, width = struct.unpack_from('>BHH', read_exactly(file, 5))
+            return ImageHeader(format='JPEG', width=width, height=height)
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_header(file):
+    """Return the format and dimensions of a PNG or JPEG from its header.
+
+    Only the signature and the segments before the image data are read, so
+    the image is never decoded. Raises `UnrecognisedImageError` if the file is
+    neither format and `MalformedImageError` if its header is invalid. The
+    file is left at an arbitrary position.
+
+    """
+
+    file.seek(0)
+    signature = file.read(len(PNG_SIGNATURE))
+    if signature == PNG_SIGNATURE:
+        return read_png_header(file)
+    if signature[:len(JPEG_SIGNATURE)] == JPEG_SIGNATURE:
+        file.seek(len(JPEG_SIGNATURE))
+        return read_jpeg_header(file)
+    raise UnrecognisedImageError('Not a PNG or JPEG')
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import direct_upload
+
+
+class Command(BaseCommand):
+    help = 'Expire abandoned case study and logo uploads in the direct upload bucket.'
+
+    def handle(self, *args, **options):
+        prefixes = [settings.DIRECT_UPLOAD_KEY_PREFIX, settings.LOGO_UPLOAD_KEY_PREFIX]
+        direct_upload.put_expiry_rules(prefixes=prefixes, days=settings.DIRECT_UPLOAD_EXPIRY_DAYS)
+        self.stdout.write(self.style.SUCCESS(f'Uploads under {", ".join(prefixes)} now expire'))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import email_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the emails queued in the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send the emails that are currently due and then exit.',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = email_outbox.drain()
+            self.stdout.write(self.style.SUCCESS(f'Sent {count} outbox messages'))
+            return
+        while True:
+            email_outbox.recover()
+            email_outbox.promote_due()
+            email_outbox.process_one(block_timeout=settings.OUTBOX_POLL_TIMEOUT)
@@ -0,0 +1,165 @@
+import bisect
+import threading
+
+from django_redis import get_redis_connection
+
+from django.core.cache import cache
+
+
+CACHE_KEY_METRICS = 'METRICS'
+
+
+class Counter:
+    """Count events by label across all worker processes using redis."""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def build_key(self, label):
+        return f'{CACHE_KEY_METRICS}-{self.name}-{label}'
+
+    def increment(self, label):
+        assert label in self.labels
+        key = self.build_key(label)
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+    def get_values(self):
+        keys = {label: self.build_key(label) for label in self.labels}
+        values = cache.get_many(keys.values())
+        return {label: values.get(key, 0) for label, key in keys.items()}
+
+
+class CacheCounter(Counter):
+
+    HIT = 'hit'
+    MISS = 'miss'
+
+    def __init__(self, name):
+        super().__init__(name=name, labels=[self.HIT, self.MISS])
+
+    def get_values(self):
+        values = super().get_values()
+        total = values[self.HIT] + values[self.MISS]
+        return {**values, 'hit_ratio': values[self.HIT] / total if total else None}
+
+
+class Histogram:
+    """Distribution of values by label across all worker processes using redis.
+
+    The default buckets suit durations in seconds.
+
+    """
+
+    buckets = [0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+    def __init__(self, name, buckets=None):
+        self.name = name
+        self.labels_key = f'{CACHE_KEY_METRICS}-{name}'
+        if buckets is not None:
+            self.buckets = buckets
+
+    def build_key(self, label):
+        return f'{self.labels_key}-{label}'
+
+    def get_bucket(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        return str(self.buckets[index]) if index < len(self.buckets) else '+Inf'
+
+    def observe_many(self, observations):
+        observations = [(self, label, value) for label, value in observations]
+        if batch.is_active:
+            batch.observations.extend(observations)
+        else:
+            write_observations(observations)
+
+    def write(self, pipeline, label, value):
+        key = self.build_key(label)
+        pipeline.sadd(self.labels_key, label)
+        pipeline.hincrby(key, self.get_bucket(value), 1)
+        pipeline.hincrby(key, 'count', 1)
+        pipeline.hincrbyfloat(key, 'sum', value)
+
+    def get_values(self):
+        connection = get_redis_connection('default')
+        labels = sorted(label.decode() for label in connection.smembers(self.labels_key))
+        pipeline = connection.pipeline(transaction=False)
+        for label in labels:
+            pipeline.hgetall(self.build_key(label))
+        return {label: self.summarise(values) for label, values in zip(labels, pipeline.execute())}
+
+    def summarise(self, values):
+        values = {key.decode(): value for key, value in values.items()}
+        count = int(values.get('count', 0))
+        # bucket counts are cumulative, as with prometheus
+        buckets = {}
+        total = 0
+        for bucket in [str(bucket) for bucket in self.buckets] + ['+Inf']:
+            total += int(values.get(bucket, 0))
+            buckets[bucket] = total
+        return {
+            'count': count,
+            'mean': float(values['sum']) / count if count else None,
+            'p50': self.get_quantile(buckets, count, 0.5),
+            'p95': self.get_quantile(buckets, count, 0.95),
+            'buckets': buckets,
+        }
+
+    @staticmethod
+    def get_quantile(buckets, count, quantile):
+        # upper bound of the bucket the quantile falls in
+        for bucket, total in buckets.items():
+            if count and total >= count * quantile:
+                return bucket
+        return None
+
+
+class ObservationBatch(threading.local):
+    """Hold the histogram observations made while handling the current request.
+
+    `core.middleware.MetricsBatchMiddleware` calls `activate` and `deactivate`
+    around every request and writes the observations in one redis round
+    trip. Observations made outside of a request are written straight away.
+
+    """
+
+    observations = None
+
+    @property
+    def is_active(self):
+        return self.observations is not None
+
+    def activate(self):
+        self.observations = []
+
+    def deactivate(self):
+        observations, self.observations = self.observations, None
+        return observations
+
+
+batch = ObservationBatch()
+
+
+def write_observations(observations):
+    """Write (histogram, label, value) observations in one pipeline."""
+    if not observations:
+        return
+    pipeline = get_redis_connection('default').pipeline(transaction=False)
+    for histogram, label, value in observations:
+        histogram.write(pipeline=pipeline, label=label, value=value)
+    pipeline.execute()
+
+
+address_search_cache = CacheCounter('ADDRESS_SEARCH_CACHE')
+email_outbox = Counter('EMAIL_OUTBOX', labels=['sent', 'retrying', 'failed'])
+logo_outbox = Counter('LOGO_OUTBOX', labels=['sent', 'retrying', 'failed'])
+upstream_latency = Histogram('UPSTREAM_LATENCY')
+# bytes, up to and beyond the 4KB that browsers allow for a cookie
+session_size = Histogram('SESSION_SIZE', buckets=[256, 512, 1024, 2048, 3072, 4096, 8192])
+
+counters = [address_search_cache, email_outbox, logo_outbox, upstream_latency, session_size]
+
+
+def get_stats():
+    return {counter.name: counter.get_values() for counter in counters}
@@ -1,5 +1,169 @@
+import logging
+
 from directory_components.middleware import AbstractPrefixUrlMiddleware
 
+from django.conf import settings
+from django.template.response import TemplateResponse
+
+from core import metrics, upstream
+from core.circuit_breaker import CircuitOpenError
+from core.cache import request_cache
+
+
+logger = logging.getLogger(__name__)
+
 
 class PrefixUrlMiddleware(AbstractPrefixUrlMiddleware):
     prefix = '/profile/'
+
+
+class RequestCacheMiddleware:
+    """Scope `core.cache.request_cache` to the current request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_cache.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            request_cache.deactivate()
+
+
+class MetricsBatchMiddleware:
+    """Write the histogram observations made by each request in one redis round trip.
+
+    Must come before the middleware that observe metrics, such as
+    `UpstreamTimingMiddleware` and `SessionSizeMiddleware`.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.batch.activate()
+        try:
+            return self.get_response(request)
+        finally:
+            metrics.write_observations(metrics.batch.deactivate())
+
+
+class UpstreamTimingMiddleware:
+    """Record the latency of the upstream calls made by each request.
+
+    The calls are added to `core.metrics.upstream_latency` and, when the
+    feature flag is on, summarised in a `Server-Timing` response header.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        upstream.recorder.activate()
+        try:
+            response = self.get_response(request)
+        finally:
+            calls = upstream.recorder.calls
+            upstream.recorder.deactivate()
+        request.upstream_calls = calls
+        if calls:
+            upstream.observe(calls)
+            if settings.FEATURE_FLAGS['SERVER_TIMING_HEADER_ON']:
+                response['Server-Timing'] = upstream.build_server_timing(calls)
+        return response
+
+
+class UpstreamCallBudgetExceeded(Exception):
+    pass
+
+
+class UpstreamCallBudgetMiddleware:
+    """Flag requests that make too many upstream calls or repeat an identical call.
+
+    The budget is `settings.UPSTREAM_CALL_BUDGET` unless the view sets
+    `upstream_call_budget`. Problems are logged, or raised when
+    `settings.UPSTREAM_CALL_BUDGET_STRICT` is on - as it is in the tests.
+
+    Must come after `UpstreamTimingMiddleware`.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        budget = getattr(request, 'upstream_call_budget', settings.UPSTREAM_CALL_BUDGET)
+        problems = upstream.find_problems(
+            calls=upstream.recorder.calls or [], budget=budget, invalidations=upstream.recorder.invalidations or []
+        )
+        if problems:
+            message = f'{request.path}: ' + '; '.join(problems)
+            if settings.UPSTREAM_CALL_BUDGET_STRICT:
+                raise UpstreamCallBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'upstream_call_budget', None)
+        if budget is not None:
+            request.upstream_call_budget = budget
+
+
+class SessionSizeBudgetExceeded(Exception):
+    pass
+
+
+class SessionSizeMiddleware:
+    """Measure the session cookie each request leaves the browser sending.
+
+    The size of the cookie, name and value, is added to
+    `core.metrics.session_size` labelled by url name. A cookie larger than
+    `settings.SESSION_SIZE_BUDGET` is logged, or raised when
+    `settings.SESSION_SIZE_BUDGET_STRICT` is on - as it is in the tests.
+
+    Must come before `SessionMiddleware`, so the cookie it sets is seen.
+
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        name = settings.SESSION_COOKIE_NAME
+        if name in response.cookies:
+            value = response.cookies[name].value
+        else:
+            value = request.COOKIES.get(name)
+        if value:
+            size = len(name) + 1 + len(value)
+            url_name = request.resolver_match.url_name if request.resolver_match else None
+            metrics.session_size.observe_many([(url_name or 'unknown', size)])
+            if size > settings.SESSION_SIZE_BUDGET:
+                message = f'{request.path}: session cookie of {size} bytes exceeds the budget of ' \
+                    f'{settings.SESSION_SIZE_BUDGET} bytes'
+                if settings.SESSION_SIZE_BUDGET_STRICT:
+                    raise SessionSizeBudgetExceeded(message)
+                logger.warning(message)
+        return response
+
+
+class CircuitOpenMiddleware:
+    """Fail fast with a 503 when a view needs an upstream service whose circuit is open."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, CircuitOpenError):
+            response = TemplateResponse(request=request, template='500.html', status=503)
+            response['Retry-After'] = int(exception.retry_after) + 1
+            return response
@@ -1,3 +1,5 @@
+import directory_validators.file
+
 from django.utils.functional import cached_property
 
 from core import helpers
@@ -55,3 +57,35 @@ class CreateUpdateUserProfileMixin:
 
         self.request.user.first_name = data['first_name']
         self.request.user.last_name = data['last_name']
+
+
+class PrefetchMixin:
+    """Fetch the upstream data the view depends on concurrently.
+
+    Views return the calls they will make from `get_prefetch_calls`. Those
+    calls are run in parallel before the view is dispatched, so the page waits
+    for the slowest call rather than the sum of all of them.
+
+    """
+
+    def get_prefetch_calls(self):
+        return []
+
+    def dispatch(self, *args, **kwargs):
+        helpers.prefetch(*self.get_prefetch_calls())
+        return super().dispatch(*args, **kwargs)
+
+
+class OversizedUploadMixin:
+    """Show an error for the files that `core.upload_handlers.MaxSizeUploadHandler` abandoned."""
+
+    def get_form(self, *args, **kwargs):
+        form = super().get_form(*args, **kwargs)
+        oversized_uploads = getattr(self.request, 'oversized_uploads', None)
+        if form.is_bound and oversized_uploads:
+            for name in form.fields:
+                if form.add_prefix(name) in oversized_uploads:
+                    # replaces the "required" error the missing file would otherwise get
+                    form.errors[name] = form.error_class([directory_validators.file.MESSAGE_FILE_TOO_BIG])
+                    form.cleaned_data.pop(name, None)
+        return form
@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+import uuid
+
+from directory_forms_api_client import actions
+from django_redis import get_redis_connection
+
+from django.conf import settings
+
+from core import metrics, upstream
+
+
+logger = logging.getLogger(__name__)
+
+
+class MessageRejected(Exception):
+    """Raised by `send` for a message that can never be sent, so that it is not retried."""
+
+
+class Outbox:
+    """Durable redis-backed queue of GOV.UK Notify emails.
+
+    `enqueue_email` persists the email and returns immediately, so the request
+    does not wait on forms-api. The emails are sent out of band by
+    `./manage.py drain_outbox`. Subclasses can queue other work by overriding
+    `send` and calling `enqueue`.
+
+    While a message is being sent it is held in a processing list owned by
+    the worker, so it is not lost if the worker dies. Workers refresh a
+    heartbeat that expires after `worker_timeout` seconds, and only the
+    processing lists of workers whose heartbeat has expired are recovered.
+    Failed sends are retried with exponential backoff. After `max_attempts`,
+    or straight away if `send` raises `MessageRejected`, the message is moved
+    to a failed list, which keeps the latest
+    `failed_max_length` messages for `status_timeout` seconds. Each message's
+    delivery status is kept for `status_timeout` seconds.
+
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_RETRYING = 'retrying'
+    STATUS_FAILED = 'failed'
+
+    def __init__(
+        self, name, max_attempts, retry_backoff, status_timeout, worker_timeout, failed_max_length, counter
+    ):
+        self.queue_key = f'OUTBOX-{name}'
+        self.workers_key = f'{self.queue_key}-WORKERS'
+        self.worker_id = uuid.uuid4().hex
+        self.delayed_key = f'{self.queue_key}-DELAYED'
+        self.failed_key = f'{self.queue_key}-FAILED'
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.status_timeout = status_timeout
+        self.worker_timeout = worker_timeout
+        self.failed_max_length = failed_max_length
+        self.counter = counter
+
+    @property
+    def connection(self):
+        return get_redis_connection('default')
+
+    @property
+    def processing_key(self):
+        return self.build_processing_key(self.worker_id)
+
+    def build_processing_key(self, worker_id):
+        return f'{self.queue_key}-PROCESSING-{worker_id}'
+
+    def build_heartbeat_key(self, worker_id):
+        return f'{self.queue_key}-HEARTBEAT-{worker_id}'
+
+    def build_status_key(self, message_id):
+        return f'{self.queue_key}-STATUS-{message_id}'
+
+    def get_status(self, message_id):
+        status = self.connection.get(self.build_status_key(message_id))
+        return status.decode() if status is not None else None
+
+    def enqueue(self, **fields):
+        message = {'id': str(uuid.uuid4()), 'attempts': 0, **fields}
+        pipeline = self.connection.pipeline()
+        pipeline.set(self.build_status_key(message['id']), self.STATUS_PENDING, ex=self.status_timeout)
+        pipeline.lpush(self.queue_key, json.dumps(message))
+        pipeline.execute()
+        return message['id']
+
+    def enqueue_email(self, template_id, email_address, form_url, data):
+        return self.enqueue(template_id=template_id, email_address=email_address, form_url=form_url, data=data)
+
+    def heartbeat(self):
+        pipeline = self.connection.pipeline()
+        pipeline.sadd(self.workers_key, self.worker_id)
+        pipeline.set(self.build_heartbeat_key(self.worker_id), 1, ex=self.worker_timeout)
+        pipeline.execute()
+
+    def recover(self):
+        # requeue messages that dead workers were part way through sending
+        connection = self.connection
+        for worker_id in connection.smembers(self.workers_key):
+            worker_id = worker_id.decode()
+            if connection.exists(self.build_heartbeat_key(worker_id)):
+                continue
+            processing_key = self.build_processing_key(worker_id)
+            while connection.rpoplpush(processing_key, self.queue_key) is not None:
+                pass
+            connection.srem(self.workers_key, worker_id)
+
+    def promote_due(self):
+        # requeue retries whose backoff has elapsed
+        connection = self.connection
+        for raw in connection.zrangebyscore(self.delayed_key, 0, time.time()):
+            if connection.zrem(self.delayed_key, raw):
+                connection.lpush(self.queue_key, raw)
+
+    def process_one(self, block_timeout=None):
+        connection = self.connection
+        self.heartbeat()
+        if block_timeout is None:
+            raw = connection.rpoplpush(self.queue_key, self.processing_key)
+        else:
+            raw = connection.brpoplpush(self.queue_key, self.processing_key, timeout=block_timeout)
+        if raw is None:
+            return False
+        message = json.loads(raw)
+        pipeline = connection.pipeline()
+        try:
+            self.send(message)
+        except MessageRejected:
+            self.handle_failure(message=message, pipeline=pipeline, retry=False)
+        except Exception:
+            self.handle_failure(message=message, pipeline=pipeline)
+        else:
+            self.set_status(message_id=message['id'], status=self.STATUS_SENT, pipeline=pipeline)
+        pipeline.lrem(self.processing_key, 1, raw)
+        pipeline.execute()
+        return True
+
+    def drain(self):
+        """Send every message that is currently due. Returns the number processed."""
+        self.recover()
+        self.promote_due()
+        count = 0
+        while self.process_one():
+            count += 1
+        return count
+
+    def send(self, message):
+        action = actions.GovNotifyEmailAction(
+            template_id=message['template_id'],
+            email_address=message['email_address'],
+            form_url=message['form_url'],
+        )
+        response = upstream.call(action.save, message['data'])
+        response.raise_for_status()
+
+    def handle_failure(self, message, pipeline, retry=True):
+        message = {**message, 'attempts': message['attempts'] + 1}
+        if not retry or message['attempts'] >= self.max_attempts:
+            logger.exception('Giving up sending outbox message %s', message['id'])
+            pipeline.lpush(self.failed_key, json.dumps(message))
+            # the messages hold email addresses and verification codes, so they are not kept indefinitely
+            pipeline.ltrim(self.failed_key, 0, self.failed_max_length - 1)
+            pipeline.expire(self.failed_key, self.status_timeout)
+            self.set_status(message_id=message['id'], status=self.STATUS_FAILED, pipeline=pipeline)
+        else:
+            logger.warning('Retrying outbox message %s', message['id'], exc_info=True)
+            retry_at = time.time() + self.retry_backoff * 2 ** (message['attempts'] - 1)
+            pipeline.zadd(self.delayed_key, {json.dumps(message): retry_at})
+            self.set_status(message_id=message['id'], status=self.STATUS_RETRYING, pipeline=pipeline)
+
+    def set_status(self, message_id, status, pipeline):
+        pipeline.set(self.build_status_key(message_id), status, ex=self.status_timeout)
+        self.counter.increment(status)
+
+
+email_outbox = Outbox(
+    name='EMAIL',
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retry_backoff=settings.OUTBOX_RETRY_BACKOFF,
+    status_timeout=settings.OUTBOX_STATUS_TIMEOUT,
+    worker_timeout=settings.OUTBOX_WORKER_TIMEOUT,
+    failed_max_length=settings.OUTBOX_FAILED_MAX_LENGTH,
+    counter=metrics.email_outbox,
+)
@@ -0,0 +1,61 @@
+dit = window.dit || {};
+dit.components = dit.components || {};
+
+dit.components.directUpload = (function() {
+  function DirectUpload(options) {
+
+    var fileInput = options.fileInput;
+    var keyInput = options.keyInput;
+    var policyUrl = options.policyUrl;
+    var csrfToken = options.csrfToken;
+
+    fileInput.addEventListener('change', function() {
+      var file = fileInput.files[0];
+      keyInput.value = '';
+      fileInput.setAttribute('name', fileInput.getAttribute('data-name') || fileInput.name);
+      if (file) {
+        requestPolicy(file);
+      }
+    });
+
+    function requestPolicy(file) {
+      var data = new FormData();
+      data.append('filename', file.name);
+      data.append('content_type', file.type);
+      var request = new XMLHttpRequest();
+      request.open('POST', policyUrl);
+      request.setRequestHeader('X-CSRFToken', csrfToken);
+      request.onload = function() {
+        if (request.status === 200) {
+          upload(file, JSON.parse(request.responseText));
+        }
+      };
+      request.send(data);
+    }
+
+    function upload(file, policy) {
+      var data = new FormData();
+      Object.keys(policy.fields).forEach(function(name) {
+        data.append(name, policy.fields[name]);
+      });
+      data.append('Content-Type', file.type);
+      data.append('file', file);
+      var request = new XMLHttpRequest();
+      request.open('POST', policy.url);
+      request.onload = function() {
+        if (request.status >= 200 && request.status < 300) {
+          keyInput.value = policy.key;
+          // the file is in the bucket, so stop the form posting it to us as well
+          fileInput.setAttribute('data-name', fileInput.name);
+          fileInput.removeAttribute('name');
+        }
+      };
+      // if anything fails the file is posted with the form as normal
+      request.send(data);
+    }
+  }
+
+  return function(options) {
+    return new DirectUpload(options);
+  };
+})();
@@ -1,7 +1,9 @@
 from importlib import import_module, reload
+from io import BytesIO
 import sys
 
 from formtools.wizard.views import normalize_name
+from PIL import Image
 import requests
 
 from django.conf import settings
@@ -16,6 +18,13 @@ def create_response(json_body={}, status_code=200, content=None):
     return response
 
 
+def create_image(image_format='PNG', size=(30, 20), mode='RGB', **options):
+    output = BytesIO()
+    Image.new(mode, size).save(output, image_format, **options)
+    output.seek(0)
+    return output
+
+
 def submit_step_factory(client, url_name, view_class):
     step_names = iter([name for name, form in view_class.form_list])
     view_name = normalize_name(view_class.__name__)
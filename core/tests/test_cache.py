@@ -0,0 +1,158 @@
+from concurrent import futures
+import threading
+from unittest import mock
+
+import pytest
+
+from django.core.cache import cache
+
+from core.cache import LRUCache, RequestCache, SingleFlight
+
+
+@pytest.fixture
+def request_cache():
+    return RequestCache()
+
+
+def test_request_cache_inactive_does_not_memoize(request_cache):
+    method = mock.Mock()
+
+    request_cache.call(method, 1, two=2)
+    request_cache.call(method, 1, two=2)
+
+    assert method.call_count == 2
+
+
+def test_request_cache_active_memoizes(request_cache):
+    method = mock.Mock()
+    request_cache.activate()
+
+    first = request_cache.call(method, 1, two=2)
+    second = request_cache.call(method, 1, two=2)
+
+    assert method.call_count == 1
+    assert first is second
+
+
+def test_request_cache_keyed_on_args(request_cache):
+    method = mock.Mock()
+    request_cache.activate()
+
+    request_cache.call(method, 1)
+    request_cache.call(method, 2)
+    request_cache.call(method, 1, two=2)
+
+    assert method.call_count == 3
+
+
+def test_request_cache_clear(request_cache):
+    method = mock.Mock()
+    request_cache.activate()
+
+    request_cache.call(method, 1)
+    request_cache.clear()
+    request_cache.call(method, 1)
+
+    assert method.call_count == 2
+
+
+def test_request_cache_deactivate(request_cache):
+    request_cache.activate()
+    request_cache.deactivate()
+
+    assert request_cache.is_active is False
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+
+    lru.set('one', 1)
+    lru.set('two', 2)
+    lru.get('one')
+    lru.set('three', 3)
+
+    assert lru.get('one') == 1
+    assert lru.get('two') is None
+    assert lru.get('three') == 3
+
+
+@pytest.fixture
+def single_flight():
+    return SingleFlight(lock_timeout=10, wait_timeout=5, poll_interval=0.01)
+
+
+def test_single_flight_coalesces_within_process(single_flight):
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(timeout=5)
+        cache.set('thing', 1)
+        return 1
+
+    fetch = mock.Mock(side_effect=fetch)
+
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        leader = executor.submit(single_flight.do, 'thing', fetch)
+        started.wait(timeout=5)
+        followers = [executor.submit(single_flight.do, 'thing', fetch) for _ in range(2)]
+        release.set()
+
+        assert [leader.result()] + [follower.result() for follower in followers] == [1, 1, 1]
+
+    assert fetch.call_count == 1
+    assert single_flight.flights == {}
+
+
+def test_single_flight_shares_error_within_process(single_flight):
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(timeout=5)
+        raise ValueError()
+
+    fetch = mock.Mock(side_effect=fetch)
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(single_flight.do, 'thing', fetch)
+        started.wait(timeout=5)
+        follower = executor.submit(single_flight.do, 'thing', fetch)
+        release.set()
+
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
+
+    assert fetch.call_count == 1
+
+
+def test_single_flight_waits_for_other_process(single_flight):
+    # another process holds the lock and stores its result shortly afterwards
+    cache.set('thing-SINGLE-FLIGHT', True)
+    timer = threading.Timer(0.05, cache.set, args=['thing', 2])
+    timer.start()
+    fetch = mock.Mock()
+
+    assert single_flight.do('thing', fetch) == 2
+    assert fetch.call_count == 0
+
+
+def test_single_flight_other_process_failed(single_flight):
+    # another process holds the lock and releases it without storing a result
+    cache.set('thing-SINGLE-FLIGHT', True)
+    timer = threading.Timer(0.05, cache.delete, args=['thing-SINGLE-FLIGHT'])
+    timer.start()
+    fetch = mock.Mock(return_value=3)
+
+    assert single_flight.do('thing', fetch) == 3
+    assert fetch.call_count == 1
+
+
+def test_single_flight_releases_lock(single_flight):
+    single_flight.do('thing', mock.Mock(return_value=1))
+
+    assert cache.get('thing-SINGLE-FLIGHT') is None
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from freezegun import freeze_time
+import pytest
+from requests.exceptions import ConnectionError
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from core import circuit_breaker, middleware, upstream
+from core.tests.helpers import create_response
+
+
+@pytest.fixture
+def breaker():
+    return circuit_breaker.CircuitBreaker(name='TEST', failure_threshold=2, failure_window=30, reset_timeout=10)
+
+
+def fail(breaker):
+    with pytest.raises(ConnectionError):
+        breaker.call(mock.Mock(side_effect=ConnectionError))
+
+
+def test_circuit_breaker_closed(breaker):
+    method = mock.Mock(return_value=create_response(status_code=200))
+
+    assert breaker.call(method, 1, a=2).status_code == 200
+    assert method.call_args == mock.call(1, a=2)
+
+
+def test_circuit_breaker_opens_after_failures(breaker):
+    fail(breaker)
+    breaker.call(mock.Mock(return_value=create_response(status_code=502)))
+
+    method = mock.Mock()
+    with pytest.raises(circuit_breaker.CircuitOpenError):
+        breaker.call(method)
+
+    assert method.call_count == 0
+
+
+def test_circuit_breaker_client_errors_not_failures(breaker):
+    breaker.call(mock.Mock(return_value=create_response(status_code=404)))
+    breaker.call(mock.Mock(return_value=create_response(status_code=400)))
+
+    assert breaker.call(mock.Mock(return_value=create_response(status_code=200))).status_code == 200
+
+
+def test_circuit_breaker_failures_outside_window(breaker):
+    fail(breaker)
+    # simulate the failure window expiring
+    circuit_breaker.cache.delete(breaker.failures_key)
+    fail(breaker)
+
+    assert breaker.call(mock.Mock(return_value=create_response(status_code=200))).status_code == 200
+
+
+def test_circuit_breaker_half_open_probe_success(breaker):
+    with freeze_time('2019-01-01 12:00:00'):
+        fail(breaker)
+        fail(breaker)
+
+    with freeze_time('2019-01-01 12:00:11'):
+        assert breaker.call(mock.Mock(return_value=create_response(status_code=200))).status_code == 200
+        # closed again
+        assert breaker.call(mock.Mock(return_value=create_response(status_code=200))).status_code == 200
+
+
+def test_circuit_breaker_half_open_probe_failure(breaker):
+    with freeze_time('2019-01-01 12:00:00'):
+        fail(breaker)
+        fail(breaker)
+
+    with freeze_time('2019-01-01 12:00:11'):
+        fail(breaker)
+        with pytest.raises(circuit_breaker.CircuitOpenError) as excinfo:
+            breaker.call(mock.Mock())
+
+    assert excinfo.value.retry_after == 10
+
+
+def test_circuit_breaker_half_open_single_probe(breaker):
+    with freeze_time('2019-01-01 12:00:00'):
+        fail(breaker)
+        fail(breaker)
+
+    with freeze_time('2019-01-01 12:00:11'):
+        # another worker is probing
+        assert breaker.before_call() is True
+        with pytest.raises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()
+
+
+def test_get_circuit_breaker():
+    from directory_api_client import api_client
+    from directory_ch_client import ch_search_api_client
+    from directory_sso_api_client import sso_api_client
+
+    breakers = circuit_breaker.circuit_breakers
+
+    assert circuit_breaker.get_circuit_breaker(api_client.company.profile_retrieve) is breakers['directory_api_client']
+    assert circuit_breaker.get_circuit_breaker(sso_api_client.user.create_user) is (
+        breakers['directory_sso_api_client']
+    )
+    assert circuit_breaker.get_circuit_breaker(ch_search_api_client.company.search_companies) is (
+        breakers['directory_ch_client']
+    )
+    assert circuit_breaker.get_circuit_breaker(mock.Mock()) is None
+
+
+@mock.patch.object(upstream, 'get_circuit_breaker')
+def test_upstream_call_circuit_open(mock_get_circuit_breaker, breaker):
+    mock_get_circuit_breaker.return_value = breaker
+    fail(breaker)
+    fail(breaker)
+    upstream.recorder.activate()
+
+    try:
+        with pytest.raises(circuit_breaker.CircuitOpenError):
+            upstream.call(mock.Mock(name='retrieve'))
+        assert [call.status for call in upstream.recorder.calls] == ['circuit-open']
+    finally:
+        upstream.recorder.deactivate()
+
+
+def test_circuit_open_middleware():
+    def get_response(request):
+        return HttpResponse()
+    request = RequestFactory().get('/')
+    instance = middleware.CircuitOpenMiddleware(get_response)
+
+    response = instance.process_exception(request, circuit_breaker.CircuitOpenError(name='TEST', retry_after=4.5))
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '5'
+    assert response.template_name == '500.html'
+    assert instance.process_exception(request, ValueError()) is None
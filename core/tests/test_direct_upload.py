@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+
+from django.core.management import call_command
+
+from core import direct_upload
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        self.response = {'Error': {'Code': code}}
+
+
+@pytest.fixture(autouse=True)
+def mock_client(settings):
+    settings.DIRECT_UPLOAD_BUCKET_NAME = 'bucket'
+    client = mock.Mock()
+    client.exceptions.ClientError = ClientError
+    # passing `new` stops mock inspecting, and so building, the lazily created real client
+    patch = mock.patch.object(direct_upload, 'client', new=client)
+    patch.start()
+    yield client
+    patch.stop()
+
+
+def test_build_key():
+    key = direct_upload.build_key(prefix='uploads/1', filename='../my image.png')
+
+    prefix, uuid, filename = key.rsplit('/', 2)
+    assert prefix == 'uploads/1'
+    assert len(uuid) == 36
+    assert filename == 'my_image.png'
+
+
+def test_create_presigned_post(mock_client, settings):
+    settings.DIRECT_UPLOAD_POLICY_EXPIRES = 60
+
+    result = direct_upload.create_presigned_post(key='a/b.png', max_size=10, content_types=['image/png', 'image/jpeg'])
+
+    assert result == mock_client.generate_presigned_post.return_value
+    assert mock_client.generate_presigned_post.call_args == mock.call(
+        Bucket='bucket',
+        Key='a/b.png',
+        Conditions=[['content-length-range', 1, 10], ['starts-with', '$Content-Type', 'image/']],
+        ExpiresIn=60,
+    )
+
+
+def test_get_metadata(mock_client):
+    mock_client.head_object.return_value = {'ContentLength': 10, 'ContentType': 'image/png'}
+
+    assert direct_upload.get_metadata('a/b.png') == {'size': 10, 'content_type': 'image/png'}
+    assert mock_client.head_object.call_args == mock.call(Bucket='bucket', Key='a/b.png')
+
+
+def test_get_metadata_not_found(mock_client):
+    mock_client.head_object.side_effect = ClientError('404')
+
+    assert direct_upload.get_metadata('a/b.png') is None
+
+
+def test_get_metadata_error(mock_client):
+    mock_client.head_object.side_effect = ClientError('403')
+
+    with pytest.raises(ClientError):
+        direct_upload.get_metadata('a/b.png')
+
+
+def test_open_object(mock_client):
+    mock_client.download_fileobj.side_effect = lambda Bucket, Key, Fileobj: Fileobj.write(b'data')
+
+    filename, file = direct_upload.open_object('a/b/c.png')
+
+    assert filename == 'c.png'
+    assert file.read() == b'data'
+
+
+def test_upload_object(mock_client):
+    file = mock.Mock()
+
+    direct_upload.upload_object(key='a/b.png', file=file, content_type='image/png')
+
+    assert mock_client.upload_fileobj.call_args == mock.call(
+        Fileobj=file, Bucket='bucket', Key='a/b.png', ExtraArgs={'ContentType': 'image/png'}
+    )
+
+
+def test_delete_objects(mock_client):
+    direct_upload.delete_objects(['a/b.png', 'a/c.png'])
+
+    assert mock_client.delete_objects.call_args == mock.call(
+        Bucket='bucket',
+        Delete={'Objects': [{'Key': 'a/b.png'}, {'Key': 'a/c.png'}], 'Quiet': True},
+    )
+
+
+def test_put_expiry_rules(mock_client):
+    direct_upload.put_expiry_rules(prefixes=['uploads'], days=2)
+
+    assert mock_client.put_bucket_lifecycle_configuration.call_args == mock.call(
+        Bucket='bucket',
+        LifecycleConfiguration={
+            'Rules': [
+                {
+                    'ID': 'expire-uploads',
+                    'Filter': {'Prefix': 'uploads/'},
+                    'Status': 'Enabled',
+                    'Expiration': {'Days': 2},
+                }
+            ]
+        },
+    )
+
+
+def test_configure_direct_upload_bucket_command(mock_client, settings):
+    settings.DIRECT_UPLOAD_KEY_PREFIX = 'case-studies'
+    settings.LOGO_UPLOAD_KEY_PREFIX = 'logos'
+    settings.DIRECT_UPLOAD_EXPIRY_DAYS = 3
+
+    call_command('configure_direct_upload_bucket')
+
+    rules = mock_client.put_bucket_lifecycle_configuration.call_args[1]['LifecycleConfiguration']['Rules']
+    assert [(rule['Filter']['Prefix'], rule['Expiration']['Days']) for rule in rules] == [
+        ('case-studies/', 3), ('logos/', 3)
+    ]
@@ -0,0 +1,60 @@
+import struct
+
+from directory_components import forms
+import pytest
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from core.forms import HeaderImageField
+from core import image_headers
+from core.tests.helpers import create_image
+
+
+class ImageForm(forms.Form):
+    image = HeaderImageField()
+
+
+def create_upload(content, name='image.png'):
+    return SimpleUploadedFile(name=name, content=content, content_type='application/octet-stream')
+
+
+@pytest.mark.parametrize('image_format,name,content_type', [
+    ('PNG', 'image.png', 'image/png'),
+    ('JPEG', 'image.jpg', 'image/jpeg'),
+])
+def test_header_image_field_valid(image_format, name, content_type):
+    form = ImageForm(files={'image': create_upload(create_image(image_format).read(), name=name)})
+
+    assert form.is_valid()
+    image = form.cleaned_data['image']
+    assert image.image_header == image_headers.ImageHeader(format=image_format, width=30, height=20)
+    assert image.content_type == content_type
+    assert image.tell() == 0
+
+
+def test_header_image_field_unsupported_format():
+    form = ImageForm(files={'image': create_upload(b'GIF89a', name='image.gif')})
+
+    assert form.is_valid() is False
+    assert form.errors['image'] == ['Invalid image format, allowed formats: PNG, JPG, JPEG']
+
+
+def test_header_image_field_malformed():
+    form = ImageForm(files={'image': create_upload(image_headers.PNG_SIGNATURE + b'junk')})
+
+    assert form.is_valid() is False
+    assert form.errors['image'] == [HeaderImageField.default_error_messages['invalid_image']]
+
+
+def test_header_image_field_too_many_pixels(settings):
+    settings.VALIDATOR_MAX_IMAGE_PIXELS = 100
+    ihdr = struct.pack('>I4sII', 13, b'IHDR', 11, 10)
+
+    form = ImageForm(files={'image': create_upload(image_headers.PNG_SIGNATURE + ihdr)})
+
+    assert form.is_valid() is False
+    assert form.errors['image'] == [HeaderImageField.default_error_messages['too_many_pixels']]
+
+
+def test_header_image_field_accept_attribute():
+    assert ImageForm()['image'].field.widget.attrs['accept'] == 'image/png,image/jpeg'
@@ -1,8 +1,11 @@
+from functools import partial
+import threading
 from unittest import mock
 
 import pytest
 
 from core import helpers
+from core.cache import request_cache
 from core.tests.helpers import create_response
 
 
@@ -52,3 +55,117 @@ def test_update_user_profile(mock_update_user_profile, mock_profile_update, stat
     assert mock_update_user_profile.call_args == mock.call(sso_session_id=1, data=data)
     assert mock_profile_update.call_count == 1
     assert mock_profile_update.call_args == mock.call(sso_session_id=1, data=profile_name_data)
+
+
+def test_prefetch_runs_calls_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    calls = [mock.Mock(side_effect=barrier.wait), mock.Mock(side_effect=barrier.wait)]
+    helpers.prefetch(*calls)
+
+    assert barrier.broken is False
+    assert calls[0].call_count == 1
+    assert calls[1].call_count == 1
+
+
+def test_prefetch_shares_request_cache():
+    method = mock.Mock()
+    request_cache.activate()
+    try:
+        helpers.prefetch(partial(request_cache.call, method, 1))
+        request_cache.call(method, 1)
+    finally:
+        request_cache.deactivate()
+
+    assert method.call_count == 1
+
+
+def test_prefetch_error_not_raised():
+    helpers.prefetch(mock.Mock(side_effect=ValueError))
+
+
+def test_run_concurrently_returns_results_and_errors_in_order():
+    error = ValueError()
+
+    results = helpers.run_concurrently(
+        mock.Mock(return_value=1), mock.Mock(side_effect=error), mock.Mock(return_value=3)
+    )
+
+    assert results == [(1, None), (None, error), (3, None)]
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_normalises_term(mock_search):
+    mock_search.return_value = create_response({'items': [{'title': 'SMASHING CORP'}]})
+
+    helpers.search_companies_house('  Smashing   Corp ')
+    items = helpers.search_companies_house('smashing corp')
+
+    assert items == [{'title': 'SMASHING CORP'}]
+    assert mock_search.call_count == 1
+    assert mock_search.call_args == mock.call(query='smashing corp')
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_redis_cache(mock_search):
+    mock_search.return_value = create_response({'items': [{'title': 'SMASHING CORP'}]})
+
+    helpers.search_companies_house('smashing')
+    helpers.companies_house_search_lru.clear()
+    items = helpers.search_companies_house('smashing')
+
+    assert items == [{'title': 'SMASHING CORP'}]
+    assert mock_search.call_count == 1
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_narrows_complete_prefix(mock_search):
+    mock_search.return_value = create_response({
+        'items': [{'title': 'SMASHING CORP'}, {'title': 'SMART LTD'}],
+        'total_results': 2,
+    })
+
+    helpers.search_companies_house('sma')
+    items = helpers.search_companies_house('smas')
+
+    assert items == [{'title': 'SMASHING CORP'}]
+    assert mock_search.call_count == 1
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_prefix_matched_other_fields(mock_search):
+    # the second company matched on a field other than its title, such as a previous name
+    mock_search.return_value = create_response({
+        'items': [{'title': 'SMASHING CORP'}, {'title': 'GREAT LTD'}],
+        'total_results': 2,
+    })
+
+    helpers.search_companies_house('sma')
+    helpers.search_companies_house('smas')
+
+    assert mock_search.call_count == 2
+    assert mock_search.call_args == mock.call(query='smas')
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_company_number_not_narrowed(mock_search):
+    mock_search.return_value = create_response({'items': [{'title': 'SMASHING 12 LTD'}], 'total_results': 1})
+
+    helpers.search_companies_house('smashing 1')
+    helpers.search_companies_house('smashing 12')
+
+    assert mock_search.call_count == 2
+
+
+@mock.patch.object(helpers.ch_search_api_client.company, 'search_companies')
+def test_search_companies_house_incomplete_prefix(mock_search):
+    mock_search.return_value = create_response({
+        'items': [{'title': 'SMASHING CORP'}, {'title': 'SMART LTD'}],
+        'total_results': 200,
+    })
+
+    helpers.search_companies_house('sma')
+    helpers.search_companies_house('smas')
+
+    assert mock_search.call_count == 2
+    assert mock_search.call_args == mock.call(query='smas')
@@ -0,0 +1,62 @@
+from io import BytesIO
+import struct
+
+from PIL import Image
+import pytest
+
+from core import image_headers
+from core.tests.helpers import create_image
+
+
+@pytest.mark.parametrize('image_format', ['PNG', 'JPEG'])
+def test_read_image_header(image_format):
+    header = image_headers.read_image_header(create_image(image_format))
+
+    assert header == image_headers.ImageHeader(format=image_format, width=30, height=20)
+
+
+def test_read_image_header_skips_jpeg_segments():
+    exif = Image.Exif()
+    exif[0x010f] = 'Camera maker' * 1000
+    file = create_image('JPEG', exif=exif.tobytes(), progressive=True)
+
+    assert image_headers.read_image_header(file) == image_headers.ImageHeader(format='JPEG', width=30, height=20)
+
+
+def test_read_image_header_does_not_read_image_data():
+    file = create_image('PNG', size=(2000, 2000))
+    size = len(file.getvalue())
+
+    image_headers.read_image_header(file)
+
+    assert file.tell() < size / 100
+
+
+def test_read_image_header_huge_dimensions():
+    # the header alone is enough: a decompression bomb is caught without decoding it
+    ihdr = struct.pack('>I4sIIBBBBB', 13, b'IHDR', 100000, 100000, 8, 6, 0, 0, 0)
+    file = BytesIO(image_headers.PNG_SIGNATURE + ihdr)
+
+    header = image_headers.read_image_header(file)
+
+    assert (header.width, header.height) == (100000, 100000)
+
+
+@pytest.mark.parametrize('content', [b'GIF89a some gif', b'', b'hello'])
+def test_read_image_header_unrecognised(content):
+    with pytest.raises(image_headers.UnrecognisedImageError):
+        image_headers.read_image_header(BytesIO(content))
+
+
+@pytest.mark.parametrize('content', [
+    image_headers.PNG_SIGNATURE,
+    image_headers.PNG_SIGNATURE + struct.pack('>I4sII', 13, b'IDAT', 1, 1),
+    image_headers.JPEG_SIGNATURE,
+    image_headers.JPEG_SIGNATURE + b'\x00\x00',
+    image_headers.JPEG_SIGNATURE + b'\xff\xda\x00\x08',
+    image_headers.JPEG_SIGNATURE + b'\xff\xe0\x00\x01',
+    image_headers.JPEG_SIGNATURE + b'\xff\xe0\x01\x00',
+])
+def test_read_image_header_malformed(content):
+    with pytest.raises(image_headers.MalformedImageError):
+        image_headers.read_image_header(BytesIO(content))
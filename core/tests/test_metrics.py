@@ -0,0 +1,27 @@
+from core import metrics
+
+
+def test_counter_increment():
+    counter = metrics.Counter(name='THING', labels=['one', 'two'])
+
+    counter.increment('one')
+    counter.increment('one')
+
+    assert counter.get_values() == {'one': 2, 'two': 0}
+
+
+def test_cache_counter_no_events():
+    counter = metrics.CacheCounter(name='THING')
+
+    assert counter.get_values() == {'hit': 0, 'miss': 0, 'hit_ratio': None}
+
+
+def test_cache_counter_hit_ratio():
+    counter = metrics.CacheCounter(name='THING')
+
+    counter.increment(counter.HIT)
+    counter.increment(counter.HIT)
+    counter.increment(counter.HIT)
+    counter.increment(counter.MISS)
+
+    assert counter.get_values() == {'hit': 3, 'miss': 1, 'hit_ratio': 0.75}
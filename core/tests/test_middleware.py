@@ -0,0 +1,151 @@
+from unittest import mock
+
+import pytest
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.generic import View
+
+from core import metrics, middleware, upstream
+from core.tests.helpers import create_response
+
+
+def get_response_factory(*calls):
+    def get_response(request):
+        for args in calls:
+            upstream.call(mock.Mock(name='retrieve', return_value=create_response()), *args)
+        return HttpResponse()
+    return get_response
+
+
+def make_request(rf, get_response):
+    budget_middleware = middleware.UpstreamCallBudgetMiddleware(get_response)
+    timing_middleware = middleware.UpstreamTimingMiddleware(budget_middleware)
+    request = rf.get('/')
+    return request, timing_middleware(request)
+
+
+def test_upstream_call_budget_ok(rf, settings):
+    settings.UPSTREAM_CALL_BUDGET = 2
+
+    request, response = make_request(rf, get_response_factory([1], [2]))
+
+    assert response.status_code == 200
+    assert [call.arguments for call in request.upstream_calls] == [
+        upstream.hash_arguments((1,), {}), upstream.hash_arguments((2,), {})
+    ]
+
+
+def test_upstream_call_budget_exceeded_strict(rf, settings):
+    settings.UPSTREAM_CALL_BUDGET = 2
+
+    with pytest.raises(middleware.UpstreamCallBudgetExceeded):
+        make_request(rf, get_response_factory([1], [2], [3]))
+
+
+def test_upstream_call_identical_calls_strict(rf):
+    with pytest.raises(middleware.UpstreamCallBudgetExceeded):
+        make_request(rf, get_response_factory([1], [1]))
+
+
+@mock.patch.object(middleware.logger, 'warning')
+def test_upstream_call_budget_exceeded_not_strict(mock_warning, rf, settings):
+    settings.UPSTREAM_CALL_BUDGET = 2
+    settings.UPSTREAM_CALL_BUDGET_STRICT = False
+
+    request, response = make_request(rf, get_response_factory([1], [2], [2]))
+
+    assert response.status_code == 200
+    assert mock_warning.call_count == 1
+    assert mock_warning.call_args == mock.call(
+        '/: 3 upstream calls exceeds the budget of 2 (retrieve x3); '
+        f'retrieve called 2 times with identical arguments (digest {upstream.hash_arguments((2,), {})})'
+    )
+
+
+def test_upstream_call_budget_view_override(rf, settings):
+    settings.UPSTREAM_CALL_BUDGET = 2
+
+    class TestView(View):
+        upstream_call_budget = 3
+
+    budget_middleware = middleware.UpstreamCallBudgetMiddleware(get_response_factory([1], [2], [3]))
+    timing_middleware = middleware.UpstreamTimingMiddleware(budget_middleware)
+    request = rf.get('/')
+    budget_middleware.process_view(request, TestView.as_view(), [], {})
+
+    assert timing_middleware(request).status_code == 200
+
+
+def session_response_factory(value=None):
+    def get_response(request):
+        response = HttpResponse()
+        if value is not None:
+            response.set_cookie(settings.SESSION_COOKIE_NAME, value)
+        return response
+    return get_response
+
+
+def test_session_size_measures_cookie_set(rf, settings):
+    request = rf.get('/')
+    request.resolver_match = mock.Mock(url_name='enrolment')
+
+    middleware.SessionSizeMiddleware(session_response_factory('a' * 100))(request)
+
+    size = len(settings.SESSION_COOKIE_NAME) + 1 + 100
+    assert metrics.session_size.get_values()['enrolment']['count'] == 1
+    assert metrics.session_size.get_values()['enrolment']['mean'] == size
+
+
+def test_session_size_measures_cookie_sent(rf, settings):
+    request = rf.get('/')
+    request.COOKIES[settings.SESSION_COOKIE_NAME] = 'a' * 100
+
+    middleware.SessionSizeMiddleware(session_response_factory())(request)
+
+    assert metrics.session_size.get_values()['unknown']['count'] == 1
+
+
+def test_session_size_no_session(rf):
+    middleware.SessionSizeMiddleware(session_response_factory())(rf.get('/'))
+
+    assert metrics.session_size.get_values() == {}
+
+
+def test_session_size_budget_exceeded_strict(rf, settings):
+    settings.SESSION_SIZE_BUDGET = 100
+
+    with pytest.raises(middleware.SessionSizeBudgetExceeded):
+        middleware.SessionSizeMiddleware(session_response_factory('a' * 100))(rf.get('/'))
+
+
+@mock.patch.object(middleware.logger, 'warning')
+def test_session_size_budget_exceeded_not_strict(mock_warning, rf, settings):
+    settings.SESSION_SIZE_BUDGET = 100
+    settings.SESSION_SIZE_BUDGET_STRICT = False
+
+    response = middleware.SessionSizeMiddleware(session_response_factory('a' * 100))(rf.get('/'))
+
+    size = len(settings.SESSION_COOKIE_NAME) + 1 + 100
+    assert response.status_code == 200
+    assert mock_warning.call_args == mock.call(f'/: session cookie of {size} bytes exceeds the budget of 100 bytes')
+
+
+def test_metrics_batch_written_in_one_round_trip(rf, settings):
+    def get_response(request):
+        upstream.call(mock.Mock(name='retrieve', return_value=create_response()))
+        assert metrics.batch.is_active
+        return session_response_factory('a' * 100)(request)
+
+    session_middleware = middleware.SessionSizeMiddleware(get_response)
+    batch_middleware = middleware.MetricsBatchMiddleware(middleware.UpstreamTimingMiddleware(session_middleware))
+    request = rf.get('/')
+
+    with mock.patch.object(metrics, 'get_redis_connection', wraps=metrics.get_redis_connection) as mock_connection:
+        response = batch_middleware(request)
+
+    assert response.status_code == 200
+    assert mock_connection.call_count == 1
+    assert metrics.upstream_latency.get_values()['retrieve 200']['count'] == 1
+    assert metrics.session_size.get_values()['unknown']['count'] == 1
+    assert metrics.batch.is_active is False
@@ -0,0 +1,170 @@
+import json
+from unittest import mock
+
+from freezegun import freeze_time
+import pytest
+
+from django.core.management import call_command
+
+from core import metrics
+from core.outbox import email_outbox, MessageRejected, Outbox
+from core.tests.helpers import create_response
+
+
+@pytest.fixture(autouse=True)
+def mock_submit():
+    patched = mock.patch(
+        'directory_forms_api_client.client.forms_api_client.submit_generic',
+        return_value=create_response(status_code=201),
+    )
+    yield patched.start()
+    patched.stop()
+
+
+def create_outbox(**kwargs):
+    return Outbox(**{
+        'name': 'TEST',
+        'max_attempts': 2,
+        'retry_backoff': 0,
+        'status_timeout': 60,
+        'worker_timeout': 60,
+        'failed_max_length': 10,
+        'counter': metrics.email_outbox,
+        **kwargs,
+    })
+
+
+def enqueue_email():
+    return email_outbox.enqueue_email(
+        template_id='123',
+        email_address='jim@example.com',
+        form_url='/the/form/',
+        data={'name': 'Jim'},
+    )
+
+
+def test_enqueue_email_does_not_send(mock_submit):
+    message_id = enqueue_email()
+
+    assert mock_submit.call_count == 0
+    assert email_outbox.get_status(message_id) == Outbox.STATUS_PENDING
+
+
+def test_drain_sends(mock_submit):
+    message_id = enqueue_email()
+
+    assert email_outbox.drain() == 1
+
+    assert mock_submit.call_count == 1
+    assert mock_submit.call_args == mock.call({
+        'data': {'name': 'Jim'},
+        'meta': {
+            'action_name': 'gov-notify-email',
+            'form_url': '/the/form/',
+            'sender': {},
+            'spam_control': {},
+            'template_id': '123',
+            'email_address': 'jim@example.com',
+        }
+    })
+    assert email_outbox.get_status(message_id) == Outbox.STATUS_SENT
+    assert email_outbox.connection.llen(email_outbox.processing_key) == 0
+    assert metrics.email_outbox.get_values()['sent'] == 1
+
+
+def test_drain_retries_with_backoff(mock_submit):
+    mock_submit.return_value = create_response(status_code=500)
+
+    with freeze_time('2019-01-01 12:00:00'):
+        message_id = enqueue_email()
+        assert email_outbox.drain() == 1
+        assert email_outbox.get_status(message_id) == Outbox.STATUS_RETRYING
+        # not due until the backoff has elapsed
+        assert email_outbox.drain() == 0
+
+    mock_submit.return_value = create_response(status_code=201)
+
+    with freeze_time('2019-01-01 12:00:31'):
+        assert email_outbox.drain() == 1
+
+    assert mock_submit.call_count == 2
+    assert email_outbox.get_status(message_id) == Outbox.STATUS_SENT
+
+
+def test_drain_gives_up(mock_submit, settings):
+    mock_submit.return_value = create_response(status_code=500)
+    outbox = create_outbox(max_attempts=2)
+    message_id = outbox.enqueue_email(template_id='123', email_address='a@b.com', form_url='/', data={})
+
+    outbox.drain()
+    outbox.drain()
+
+    assert mock_submit.call_count == 2
+    assert outbox.get_status(message_id) == Outbox.STATUS_FAILED
+    failed = [json.loads(raw) for raw in outbox.connection.lrange(outbox.failed_key, 0, -1)]
+    assert [(message['id'], message['attempts']) for message in failed] == [(message_id, 2)]
+    assert outbox.drain() == 0
+
+
+def test_drain_rejected_message_not_retried(mock_submit):
+    outbox = create_outbox(max_attempts=5)
+    outbox.send = mock.Mock(side_effect=MessageRejected)
+    message_id = outbox.enqueue_email(template_id='123', email_address='a@b.com', form_url='/', data={})
+
+    assert outbox.drain() == 1
+
+    assert outbox.get_status(message_id) == Outbox.STATUS_FAILED
+    assert outbox.connection.llen(outbox.failed_key) == 1
+    assert outbox.drain() == 0
+
+
+def test_drain_failed_list_capped(mock_submit):
+    mock_submit.return_value = create_response(status_code=500)
+    outbox = create_outbox(max_attempts=1, failed_max_length=2)
+    message_ids = [
+        outbox.enqueue_email(template_id='123', email_address='a@b.com', form_url='/', data={}) for _ in range(3)
+    ]
+
+    outbox.drain()
+
+    failed = [json.loads(raw)['id'] for raw in outbox.connection.lrange(outbox.failed_key, 0, -1)]
+    assert sorted(failed) == sorted(message_ids[1:])
+    assert 0 < outbox.connection.ttl(outbox.failed_key) <= 60
+
+
+def test_recover_requeues_messages_of_dead_worker(mock_submit):
+    dead_worker = create_outbox()
+    outbox = create_outbox()
+    outbox.enqueue_email(template_id='123', email_address='a@b.com', form_url='/', data={})
+    connection = outbox.connection
+    # simulate a worker that died after picking up the message
+    dead_worker.heartbeat()
+    connection.rpoplpush(outbox.queue_key, dead_worker.processing_key)
+    connection.delete(dead_worker.build_heartbeat_key(dead_worker.worker_id))
+
+    assert outbox.drain() == 1
+    assert mock_submit.call_count == 1
+    assert connection.llen(dead_worker.processing_key) == 0
+    assert connection.smembers(outbox.workers_key) == {outbox.worker_id.encode()}
+
+
+def test_recover_leaves_messages_of_live_worker(mock_submit):
+    live_worker = create_outbox()
+    outbox = create_outbox()
+    outbox.enqueue_email(template_id='123', email_address='a@b.com', form_url='/', data={})
+    connection = outbox.connection
+    live_worker.heartbeat()
+    connection.rpoplpush(outbox.queue_key, live_worker.processing_key)
+
+    assert outbox.drain() == 0
+    assert mock_submit.call_count == 0
+    assert connection.llen(live_worker.processing_key) == 1
+
+
+def test_drain_outbox_command_once(mock_submit):
+    enqueue_email()
+    enqueue_email()
+
+    call_command('drain_outbox', once=True)
+
+    assert mock_submit.call_count == 2
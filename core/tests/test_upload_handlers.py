@@ -0,0 +1,42 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.test import RequestFactory
+
+from core.upload_handlers import MaxSizeUploadHandler
+
+
+def parse_upload(files):
+    request = RequestFactory().post('/', files)
+    request.upload_handlers = [MaxSizeUploadHandler(request), TemporaryFileUploadHandler(request)]
+    return request, request.FILES
+
+
+def test_max_size_upload_handler_abandons_oversized_file(settings):
+    settings.UPLOAD_MAX_SIZE_BYTES = {'logo': 10}
+
+    request, files = parse_upload({'logo': SimpleUploadedFile('logo.png', b'x' * 11)})
+
+    assert 'logo' not in files
+    assert request.oversized_uploads == {'logo'}
+
+
+def test_max_size_upload_handler_matches_prefixed_field_name(settings):
+    settings.UPLOAD_MAX_SIZE_BYTES = {'image_one': 10}
+
+    request, files = parse_upload({
+        'media-image_one': SimpleUploadedFile('one.png', b'x' * 11),
+        'media-image_two': SimpleUploadedFile('two.png', b'x' * 11),
+    })
+
+    assert list(files) == ['media-image_two']
+    assert request.oversized_uploads == {'media-image_one'}
+
+
+def test_max_size_upload_handler_writes_file_to_disk(settings):
+    settings.UPLOAD_MAX_SIZE_BYTES = {'logo': 10}
+
+    request, files = parse_upload({'logo': SimpleUploadedFile('logo.png', b'x' * 10)})
+
+    assert files['logo'].read() == b'x' * 10
+    assert files['logo'].temporary_file_path()
+    assert request.oversized_uploads == set()
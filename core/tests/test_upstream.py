@@ -0,0 +1,163 @@
+from unittest import mock
+
+import pytest
+
+from django.urls import reverse
+
+from core import metrics, upstream
+from core.cache import request_cache
+from core.tests.helpers import create_response
+
+
+@pytest.fixture
+def recorder():
+    upstream.recorder.activate()
+    yield upstream.recorder
+    upstream.recorder.deactivate()
+
+
+def test_call_records_status(recorder):
+    method = mock.Mock(name='retrieve', return_value=create_response(status_code=404))
+
+    response = upstream.call(method, 1, a=2)
+
+    assert response.status_code == 404
+    assert method.call_args == mock.call(1, a=2)
+    assert [(call.endpoint, call.status) for call in recorder.calls] == [('retrieve', '404')]
+
+
+def test_call_records_error(recorder):
+    method = mock.Mock(side_effect=ValueError)
+
+    with pytest.raises(ValueError):
+        upstream.call(method)
+
+    assert [call.status for call in recorder.calls] == ['error']
+
+
+def test_call_does_not_record_arguments(recorder):
+    upstream.call(mock.Mock(return_value=create_response()), sso_session_id='secret-session-id')
+    upstream.call(mock.Mock(return_value=create_response()), sso_session_id='secret-session-id')
+
+    first, second = recorder.calls
+    assert first.arguments == second.arguments
+    assert 'secret-session-id' not in first.arguments
+
+
+def test_call_outside_request_observed_immediately():
+    upstream.call(mock.Mock(name='retrieve', return_value=create_response(status_code=200)))
+
+    assert metrics.upstream_latency.get_values()['retrieve 200']['count'] == 1
+
+
+def test_build_server_timing():
+    calls = [
+        upstream.UpstreamCall(endpoint='CompanyAPIClient.profile_retrieve', arguments='', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='SupplierAPIClient.retrieve_profile', arguments='', status='200', duration=0.02),
+        upstream.UpstreamCall(endpoint='CompanyAPIClient.profile_retrieve', arguments='', status='200', duration=0.03),
+    ]
+
+    assert upstream.build_server_timing(calls) == (
+        'upstream;dur=60.0;desc="3 calls", '
+        'CompanyAPIClient.profile_retrieve;dur=40.0;desc="2 calls", '
+        'SupplierAPIClient.retrieve_profile;dur=20.0;desc="1 calls"'
+    )
+
+
+def test_histogram():
+    histogram = metrics.Histogram('THING')
+
+    histogram.observe_many([('a', 0.01), ('a', 0.2), ('a', 20), ('b', 1)])
+
+    values = histogram.get_values()
+    assert values['a']['count'] == 3
+    assert values['a']['mean'] == pytest.approx(20.21 / 3)
+    assert values['a']['p50'] == '0.25'
+    assert values['a']['p95'] == '+Inf'
+    assert values['a']['buckets']['0.025'] == 1
+    assert values['a']['buckets']['0.25'] == 2
+    assert values['a']['buckets']['+Inf'] == 3
+    assert values['b']['count'] == 1
+
+
+@mock.patch('core.helpers.ch_search_api_client.company.search_companies')
+def test_upstream_timing_middleware(mock_search, client, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'SERVER_TIMING_HEADER_ON': True}
+    mock_search.return_value = create_response({'items': [], 'total_results': 0})
+
+    response = client.get(reverse('api:companies-house-search'), data={'term': 'thing'})
+
+    assert response['Server-Timing'].startswith('upstream;dur=')
+    assert 'search_companies;dur=' in response['Server-Timing']
+    assert metrics.upstream_latency.get_values()['search_companies 200']['count'] == 1
+
+    response = client.get(reverse('healthcheck:metrics'), {'token': settings.DIRECTORY_HEALTHCHECK_TOKEN})
+
+    assert response.json()['UPSTREAM_LATENCY']['search_companies 200']['count'] == 1
+
+
+@mock.patch('core.helpers.ch_search_api_client.company.search_companies')
+def test_upstream_timing_middleware_header_off(mock_search, client, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'SERVER_TIMING_HEADER_ON': False}
+    mock_search.return_value = create_response({'items': [], 'total_results': 0})
+
+    response = client.get(reverse('api:companies-house-search'), data={'term': 'thing'})
+
+    assert 'Server-Timing' not in response
+    assert metrics.upstream_latency.get_values()['search_companies 200']['count'] == 1
+
+
+def test_upstream_timing_middleware_no_calls(client):
+    response = client.get(reverse('healthcheck:metrics'))
+
+    assert 'Server-Timing' not in response
+
+
+def test_find_problems_within_budget():
+    calls = [
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='retrieve', arguments='2', status='200', duration=0.01),
+    ]
+
+    assert upstream.find_problems(calls, budget=2) == []
+
+
+def test_find_problems_over_budget():
+    calls = [
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='retrieve', arguments='2', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='list', arguments='1', status='200', duration=0.01),
+    ]
+
+    assert upstream.find_problems(calls, budget=2) == [
+        '3 upstream calls exceeds the budget of 2 (retrieve x2, list x1)'
+    ]
+
+
+def test_find_problems_identical_calls():
+    calls = [
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+    ]
+
+    assert upstream.find_problems(calls, budget=10) == [
+        'retrieve called 2 times with identical arguments (digest 1)'
+    ]
+
+
+def test_find_problems_identical_calls_after_write():
+    calls = [
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='update', arguments='1', status='200', duration=0.01),
+        upstream.UpstreamCall(endpoint='retrieve', arguments='1', status='200', duration=0.01),
+    ]
+
+    assert upstream.find_problems(calls, budget=10, invalidations=[2]) == []
+
+
+def test_request_cache_clear_marks_invalidated(recorder):
+    upstream.call(mock.Mock(return_value=create_response()))
+
+    request_cache.clear()
+
+    assert recorder.invalidations == [1]
@@ -17,7 +17,7 @@ def test_companies_house_search_validation_error(client, settings):
     assert response.status_code == 400
 
 
-@mock.patch('core.views.ch_search_api_client.company.search_companies')
+@mock.patch('core.helpers.ch_search_api_client.company.search_companies')
 def test_companies_house_search_api_error(mock_search, client, settings):
 
     mock_search.return_value = create_response(status_code=400)
@@ -27,7 +27,7 @@ def test_companies_house_search_api_error(mock_search, client, settings):
         client.get(url, data={'term': 'thing'})
 
 
-@mock.patch('core.views.ch_search_api_client.company.search_companies')
+@mock.patch('core.helpers.ch_search_api_client.company.search_companies')
 def test_companies_house_search_api_success(mock_search, client, settings):
 
     mock_search.return_value = create_response({'items': [{'name': 'Smashing corp'}]})
@@ -39,7 +39,7 @@ def test_companies_house_search_api_success(mock_search, client, settings):
     assert response.content == b'[{"name":"Smashing corp"}]'
 
 
-@mock.patch('core.views.ch_search_api_client.company.search_companies')
+@mock.patch('core.helpers.ch_search_api_client.company.search_companies')
 def test_companies_house_search(mock_search, client, settings):
 
     mock_search.return_value = create_response({'items': [{'name': 'Smashing corp'}]})
@@ -51,7 +51,7 @@ def test_companies_house_search(mock_search, client, settings):
     assert response.content == b'[{"name":"Smashing corp"}]'
 
 
-@mock.patch('core.views.requests.get')
+@mock.patch('core.helpers.address_search_session.get')
 def test_address_lookup_bad_postcode(mock_get, client):
     mock_get.return_value = create_response(status_code=400)
     url = reverse('api:postcode-search')
@@ -62,7 +62,7 @@ def test_address_lookup_bad_postcode(mock_get, client):
     assert response.content == b'[]'
 
 
-@mock.patch('core.views.requests.get')
+@mock.patch('core.helpers.address_search_session.get')
 def test_address_lookup_not_ok(mock_get, client):
     mock_get.return_value = create_response(status_code=500)
     url = reverse('api:postcode-search')
@@ -71,7 +71,7 @@ def test_address_lookup_not_ok(mock_get, client):
         client.get(url, data={'postcode': '21313'})
 
 
-@mock.patch('core.views.requests.get')
+@mock.patch('core.helpers.address_search_session.get')
 def test_address_lookup_ok(mock_get, client):
     mock_get.return_value = create_response({'addresses': ['1 A road, , , , Ashire', '2 B road, , , , Bshire']})
     url = reverse('api:postcode-search')
@@ -97,3 +97,47 @@ def test_not_signed_in_does_not_display_email(client):
 
     assert 'You are signed in as' not in str(response.content)
     assert SIGN_OUT_LABEL not in str(response.content)
+
+
+@mock.patch('core.helpers.address_search_session.get')
+def test_address_lookup_cached(mock_get, client):
+    mock_get.return_value = create_response({'addresses': ['1 A road, , , , Ashire']})
+    url = reverse('api:postcode-search')
+
+    client.get(url, data={'postcode': 'sw1a 1aa'})
+    response = client.get(url, data={'postcode': 'SW1A1AA'})
+
+    assert response.status_code == 200
+    assert mock_get.call_count == 1
+    assert mock_get.call_args == mock.call('https://api.getAddress.io/find/SW1A1AA/', timeout=10)
+    assert response.content == b'[{"text":"1 A road, Ashire","value":"1 A road, Ashire, SW1A1AA"}]'
+
+
+@mock.patch('core.helpers.address_search_session.get')
+def test_address_lookup_bad_postcode_cached(mock_get, client):
+    mock_get.return_value = create_response(status_code=400)
+    url = reverse('api:postcode-search')
+
+    client.get(url, data={'postcode': '21313'})
+    response = client.get(url, data={'postcode': '21313'})
+
+    assert response.content == b'[]'
+    assert mock_get.call_count == 1
+
+
+def test_metrics_no_token(client):
+    response = client.get(reverse('healthcheck:metrics'))
+
+    assert response.status_code == 403
+
+
+@mock.patch('core.helpers.address_search_session.get')
+def test_metrics(mock_get, client, settings):
+    mock_get.return_value = create_response(status_code=400)
+    client.get(reverse('api:postcode-search'), data={'postcode': '21313'})
+    client.get(reverse('api:postcode-search'), data={'postcode': '21313'})
+
+    response = client.get(reverse('healthcheck:metrics'), {'token': settings.DIRECTORY_HEALTHCHECK_TOKEN})
+
+    assert response.status_code == 200
+    assert response.json()['ADDRESS_SEARCH_CACHE'] == {'hit': 1, 'miss': 1, 'hit_ratio': 0.5}
@@ -0,0 +1,96 @@
+from importlib import import_module
+
+import pytest
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from core import wizard_storage
+
+
+@pytest.fixture
+def request_factory(rf):
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+
+    def inner():
+        request = rf.get('/')
+        request.session = session
+        return request
+    return inner
+
+
+def create_storage(request):
+    return wizard_storage.RedisStorage(prefix='wizard', request=request)
+
+
+def test_serialize_round_trip():
+    data = {'step': 'one', 'step_data': {'one': {'one-name': ['Jim']}}, 'step_files': {}, 'extra_data': {}}
+
+    raw = wizard_storage.serialize(data)
+
+    assert isinstance(raw, bytes)
+    assert wizard_storage.deserialize(raw) == data
+
+
+def test_storage_persists_between_requests(request_factory):
+    storage = create_storage(request_factory())
+    storage.current_step = 'one'
+    storage.set_step_data('one', {'one-name': ['Jim']})
+    storage.extra_data['thing'] = True
+    storage.update_response(HttpResponse())
+
+    storage = create_storage(request_factory())
+
+    assert storage.current_step == 'one'
+    assert storage.get_step_data('one')['one-name'] == 'Jim'
+    assert storage.extra_data == {'thing': True}
+
+
+def test_storage_keeps_only_id_in_session(request_factory):
+    request = request_factory()
+    storage = create_storage(request)
+    storage.set_step_data('one', {'one-name': ['Jim']})
+    storage.update_response(HttpResponse())
+
+    assert list(request.session.keys()) == [wizard_storage.SESSION_KEY_WIZARD_STORAGE_ID]
+    assert len(request.session[wizard_storage.SESSION_KEY_WIZARD_STORAGE_ID]) == 32
+
+
+def test_storage_expires(request_factory, settings):
+    settings.WIZARD_STORAGE_TIMEOUT = 60
+    storage = create_storage(request_factory())
+    storage.current_step = 'one'
+    storage.update_response(HttpResponse())
+
+    assert 0 < storage.connection.ttl(storage.key) <= 60
+
+
+def test_storage_not_saved_if_empty(request_factory):
+    request = request_factory()
+    storage = create_storage(request)
+    storage.update_response(HttpResponse())
+
+    assert wizard_storage.SESSION_KEY_WIZARD_STORAGE_ID not in request.session
+
+
+def test_storage_deleted_once_reset(request_factory):
+    storage = create_storage(request_factory())
+    storage.current_step = 'one'
+    storage.update_response(HttpResponse())
+
+    storage = create_storage(request_factory())
+    storage.reset()
+    storage.update_response(HttpResponse())
+
+    assert storage.connection.exists(storage.key) == 0
+
+
+def test_storage_carries_over_session_data(request_factory):
+    request = request_factory()
+    data = {'step': 'two', 'step_data': {}, 'step_files': {}, 'extra_data': {}}
+    request.session['wizard_wizard'] = data
+
+    storage = create_storage(request)
+
+    assert storage.current_step == 'two'
+    assert 'wizard_wizard' not in request.session
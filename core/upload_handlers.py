@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """Abandon an uploaded file as soon as it exceeds the size allowed for its field.
+
+    Must be listed before the handler that stores the file, so that the rest
+    of an oversized file is discarded as it is read rather than written out
+    in full. The limits are in UPLOAD_MAX_SIZE_BYTES, keyed on the field name
+    without the form prefix. The names of the abandoned fields are added to
+    `request.oversized_uploads`.
+
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request=request)
+        if request is not None:
+            request.oversized_uploads = set()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        self.max_size = settings.UPLOAD_MAX_SIZE_BYTES.get(field_name.split('-')[-1])
+        if self.content_length and self.max_size is not None and self.content_length > self.max_size:
+            self.skip()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.max_size is not None and self.received > self.max_size:
+            self.skip()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def skip(self):
+        if self.request is not None:
+            self.request.oversized_uploads.add(self.field_name)
+        raise SkipFile()
@@ -0,0 +1,117 @@
+import bisect
+import collections
+import hashlib
+import threading
+from time import monotonic
+
+from core import metrics
+from core.circuit_breaker import CircuitOpenError, get_circuit_breaker
+
+
+UpstreamCall = collections.namedtuple('UpstreamCall', ['endpoint', 'arguments', 'status', 'duration'])
+
+
+class RequestRecorder(threading.local):
+    """Collect the upstream calls made while handling the current request.
+
+    `core.middleware.UpstreamTimingMiddleware` calls `activate` and
+    `deactivate` around every request. Calls made outside of a request are
+    sent straight to the latency histogram. `core.cache.request_cache`
+    calls `mark_invalidated` after every write, so that reads repeated to see
+    the change are not taken for missed memoization.
+
+    """
+
+    calls = None
+    invalidations = None
+
+    @property
+    def is_active(self):
+        return self.calls is not None
+
+    def activate(self, calls=None):
+        self.calls = [] if calls is None else calls
+        self.invalidations = []
+
+    def deactivate(self):
+        self.calls = None
+        self.invalidations = None
+
+    def mark_invalidated(self):
+        if self.is_active:
+            self.invalidations.append(len(self.calls))
+
+
+recorder = RequestRecorder()
+
+
+def get_endpoint_name(method):
+    # mocked client methods do not have a __qualname__
+    return getattr(method, '__qualname__', None) or getattr(method, '_mock_name', None) or repr(method)
+
+
+def hash_arguments(args, kwargs):
+    # the arguments include credentials such as sso_session_id, so only a digest is kept for comparing calls
+    return hashlib.sha256(repr((args, sorted(kwargs.items()))).encode()).hexdigest()[:12]
+
+
+def call(method, *args, **kwargs):
+    """Call an upstream API client method through its circuit breaker and time it."""
+    status = 'error'
+    start = monotonic()
+    circuit_breaker = get_circuit_breaker(method)
+    try:
+        if circuit_breaker:
+            response = circuit_breaker.call(method, *args, **kwargs)
+        else:
+            response = method(*args, **kwargs)
+        status = getattr(response, 'status_code', 'ok')
+        return response
+    except CircuitOpenError:
+        status = 'circuit-open'
+        raise
+    finally:
+        upstream_call = UpstreamCall(
+            endpoint=get_endpoint_name(method),
+            arguments=hash_arguments(args, kwargs),
+            status=str(status),
+            duration=monotonic() - start,
+        )
+        if recorder.is_active:
+            recorder.calls.append(upstream_call)
+        else:
+            observe([upstream_call])
+
+
+def observe(calls):
+    metrics.upstream_latency.observe_many(
+        (f'{upstream_call.endpoint} {upstream_call.status}', upstream_call.duration) for upstream_call in calls
+    )
+
+
+def build_server_timing(calls):
+    durations = collections.OrderedDict()
+    for upstream_call in calls:
+        durations.setdefault(upstream_call.endpoint, []).append(upstream_call.duration)
+    total = sum(upstream_call.duration for upstream_call in calls)
+    entries = [f'upstream;dur={total * 1000:.1f};desc="{len(calls)} calls"']
+    for endpoint, values in durations.items():
+        entries.append(f'{endpoint};dur={sum(values) * 1000:.1f};desc="{len(values)} calls"')
+    return ', '.join(entries)
+
+
+def find_problems(calls, budget, invalidations=()):
+    problems = []
+    if len(calls) > budget:
+        endpoints = collections.Counter(upstream_call.endpoint for upstream_call in calls)
+        summary = ', '.join(f'{endpoint} x{count}' for endpoint, count in endpoints.most_common())
+        problems.append(f'{len(calls)} upstream calls exceeds the budget of {budget} ({summary})')
+    # calls are only identical if no write came between them: `invalidations` are the indexes of the calls after writes
+    repeated = collections.Counter(
+        (bisect.bisect_right(invalidations, index), upstream_call.endpoint, upstream_call.arguments)
+        for index, upstream_call in enumerate(calls)
+    )
+    for (_, endpoint, arguments), count in repeated.items():
+        if count > 1:
+            problems.append(f'{endpoint} called {count} times with identical arguments (digest {arguments})')
+    return problems
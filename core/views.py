@@ -1,13 +1,14 @@
-from directory_ch_client.client import ch_search_api_client
-import requests
-from requests.auth import HTTPBasicAuth
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 
-from django.views.generic import RedirectView, TemplateView
 from django.conf import settings
+from django.http import HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+from django.views.decorators.cache import never_cache
+from django.views.generic import RedirectView, TemplateView
 
-from core import serializers
+from core import helpers, metrics, serializers
 
 
 class CompaniesHouseSearchAPIView(GenericAPIView):
@@ -18,11 +19,8 @@ class CompaniesHouseSearchAPIView(GenericAPIView):
     def get(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.GET)
         serializer.is_valid(raise_exception=True)
-        response = ch_search_api_client.company.search_companies(
-            query=serializer.validated_data['term']
-        )
-        response.raise_for_status()
-        return Response(response.json()['items'])
+        items = helpers.search_companies_house(serializer.validated_data['term'])
+        return Response(items)
 
 
 class AddressSearchAPIView(GenericAPIView):
@@ -34,23 +32,10 @@ class AddressSearchAPIView(GenericAPIView):
         serializer = self.get_serializer(data=request.GET)
         serializer.is_valid(raise_exception=True)
         postcode = serializer.validated_data['postcode']
-        response = requests.get(
-            f'https://api.getAddress.io/find/{postcode}/',
-            auth=HTTPBasicAuth('api-key', settings.GET_ADDRESS_API_KEY),
-            timeout=10,
-        )
-        if response.ok:
-            data = [
-                {
-                    'text': address.replace(' ,', ''),
-                    'value': address.replace(' ,', '') + ', ' + postcode,
-                }
-                for address in response.json()['addresses']
-            ]
-        elif response.status_code == 400:
-            data = []
-        else:
-            response.raise_for_status()
+        data = [
+            {'text': address, 'value': address + ', ' + postcode}
+            for address in helpers.search_address(postcode)
+        ]
         return Response(data)
 
 
@@ -65,3 +50,15 @@ class AboutView(TemplateView):
         return {
             'about_tab_classes': 'active'
         }
+
+
+class MetricsView(View):
+
+    def has_permission(self):
+        return constant_time_compare(self.request.GET.get('token'), settings.DIRECTORY_HEALTHCHECK_TOKEN)
+
+    @never_cache
+    def get(self, *args, **kwargs):
+        if not self.has_permission():
+            return HttpResponseForbidden()
+        return JsonResponse(metrics.get_stats())
@@ -0,0 +1,69 @@
+import json
+import uuid
+import zlib
+
+from django_redis import get_redis_connection
+from formtools.wizard.storage.base import BaseStorage
+
+from django.conf import settings
+
+
+SESSION_KEY_WIZARD_STORAGE_ID = 'WIZARD_STORAGE_ID'
+
+
+def serialize(data):
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode())
+
+
+def deserialize(raw):
+    return json.loads(zlib.decompress(raw).decode())
+
+
+class RedisStorage(BaseStorage):
+    """Keep wizard data in redis rather than in the signed cookie session.
+
+    The session holds only a short id, shared by all of the user's wizards.
+    The data is read once per request and written back when the response is
+    returned, as compressed compact JSON. It expires WIZARD_STORAGE_TIMEOUT
+    seconds after the wizard was last used.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        raw = None
+        if self.storage_id:
+            raw = self.connection.get(self.key)
+        if raw is not None:
+            self.data = deserialize(raw)
+        elif self.prefix in self.request.session:
+            # carry over a wizard that was started while its data was kept in the session
+            self.data = self.request.session.pop(self.prefix)
+        else:
+            self.init_data()
+
+    @property
+    def connection(self):
+        return get_redis_connection('default')
+
+    @property
+    def storage_id(self):
+        return self.request.session.get(SESSION_KEY_WIZARD_STORAGE_ID)
+
+    @property
+    def key(self):
+        return f'WIZARD-{self.storage_id}-{self.prefix}'
+
+    @property
+    def is_empty(self):
+        return not any(self.data.values())
+
+    def update_response(self, response):
+        super().update_response(response)
+        if self.is_empty:
+            if self.storage_id:
+                self.connection.delete(self.key)
+            return
+        if not self.storage_id:
+            self.request.session[SESSION_KEY_WIZARD_STORAGE_ID] = uuid.uuid4().hex
+        self.connection.set(self.key, serialize(self.data), ex=settings.WIZARD_STORAGE_TIMEOUT)
@@ -1,11 +1,11 @@
 import collections
 from http import cookies
+import random
 import re
 
 from directory_api_client import api_client
 from directory_ch_client import ch_search_api_client
 from directory_constants import choices, urls, user_roles
-from directory_forms_api_client import actions
 from directory_sso_api_client import sso_api_client
 import directory_components
 
@@ -14,12 +14,19 @@ from django.utils import formats
 from django.utils.dateparse import parse_datetime
 from django.conf import settings
 
+from core import upstream
+from core.cache import request_cache, single_flight
+from core.outbox import email_outbox
 from enrolment import constants
 
 
 COMPANIES_HOUSE_DATE_FORMAT = '%Y-%m-%d'
 CACHE_KEY_COMPANY_PROFILE = 'COMPANY_PROFILE'
 CACHE_KEY_IS_ENROLLED = 'IS_ENROLLED'
+CACHE_TIMEOUT = 60 * 60
+CACHE_TIMEOUT_JITTER = 0.1
+CACHE_STALE_TIMEOUT = 60 * 60
+CACHE_LOCK_TIMEOUT = 30
 
 ProgressIndicatorConf = collections.namedtuple(
     'ProgressIndicatorConf',
@@ -28,7 +35,7 @@ ProgressIndicatorConf = collections.namedtuple(
 
 
 def retrieve_preverified_company(enrolment_key):
-    response = api_client.enrolment.retrieve_prepeveried_company(enrolment_key)
+    response = request_cache.call(api_client.enrolment.retrieve_prepeveried_company, enrolment_key)
     if response.status_code == 404:
         return None
     response.raise_for_status()
@@ -36,27 +43,60 @@ def retrieve_preverified_company(enrolment_key):
 
 
 def claim_company(enrolment_key, personal_name, sso_session_id):
-    response = api_client.enrolment.claim_prepeveried_company(
+    response = upstream.call(
+        api_client.enrolment.claim_prepeveried_company,
         data={'name': personal_name},
         key=enrolment_key,
         sso_session_id=sso_session_id,
     )
+    request_cache.clear()
     response.raise_for_status()
 
 
+def get_or_refresh_cache(key, fetch, timeout=CACHE_TIMEOUT):
+    """Return the cached value for `key`, calling `fetch` to populate it.
+
+    Any value - including `False` and empty values - is a cache hit. Once
+    `timeout` (jittered so that keys do not expire together) has elapsed the
+    value is stale: one worker takes a lock and refreshes it while the others
+    keep serving the stale value for up to CACHE_STALE_TIMEOUT seconds.
+
+    """
+
+    fresh_key = f'{key}-FRESH'
+    lock_key = f'{key}-LOCK'
+
+    def refresh():
+        value = fetch()
+        jittered_timeout = int(timeout * random.uniform(1 - CACHE_TIMEOUT_JITTER, 1 + CACHE_TIMEOUT_JITTER))
+        cache.set(key=key, value=value, timeout=jittered_timeout + CACHE_STALE_TIMEOUT)
+        cache.set(key=fresh_key, value=True, timeout=jittered_timeout)
+        return value
+
+    entries = cache.get_many([key, fresh_key])
+    if key not in entries:
+        # nothing to serve while waiting, so concurrent callers share one fetch
+        return single_flight.do(key=key, fetch=refresh)
+    if fresh_key in entries or not cache.add(key=lock_key, value=True, timeout=CACHE_LOCK_TIMEOUT):
+        return entries[key]
+    try:
+        return refresh()
+    except Exception:
+        return entries[key]
+    finally:
+        cache.delete(lock_key)
+
+
 def get_companies_house_profile(number):
-    key = f'{CACHE_KEY_COMPANY_PROFILE}-{number}'
-    value = cache.get(key)
-    if not value:
-        response = ch_search_api_client.company.get_company_profile(number)
+    def fetch():
+        response = request_cache.call(ch_search_api_client.company.get_company_profile, number)
         response.raise_for_status()
-        value = response.json()
-        cache.set(key=key, value=value, timeout=60*60)
-    return value
+        return response.json()
+    return get_or_refresh_cache(key=f'{CACHE_KEY_COMPANY_PROFILE}-{number}', fetch=fetch)
 
 
 def user_has_company(sso_session_id):
-    response = api_client.company.profile_retrieve(sso_session_id)
+    response = request_cache.call(api_client.company.profile_retrieve, sso_session_id)
     if response.status_code == 404:
         return False
     elif response.status_code == 200:
@@ -64,65 +104,68 @@ def user_has_company(sso_session_id):
     response.raise_for_status()
 
 
+def build_is_enrolled_cache_key(company_number):
+    return f'{CACHE_KEY_IS_ENROLLED}-{company_number}'
+
+
 def get_is_enrolled(company_number):
-    key = f'{CACHE_KEY_IS_ENROLLED}-{company_number}'
-    value = cache.get(key)
-    if not value:
-        response = api_client.company.validate_company_number(company_number)
+    def fetch():
+        response = request_cache.call(api_client.company.validate_company_number, company_number)
         if response.status_code == 400:
-            value = True
-        else:
-            response.raise_for_status()
-            value = False
-        cache.set(key=key, value=value, timeout=60*60)
-    return value
+            return True
+        response.raise_for_status()
+        return False
+    return get_or_refresh_cache(key=build_is_enrolled_cache_key(company_number), fetch=fetch)
+
+
+def clear_cached_is_enrolled(company_number):
+    key = build_is_enrolled_cache_key(company_number)
+    cache.delete_many([key, f'{key}-FRESH'])
+    request_cache.clear()
 
 
 def create_company_profile(data):
-    response = api_client.enrolment.send_form(data)
+    response = upstream.call(api_client.enrolment.send_form, data)
+    request_cache.clear()
+    if data.get('company_number'):
+        # the company may have been cached as not enrolled
+        clear_cached_is_enrolled(data['company_number'])
     response.raise_for_status()
     return response
 
 
 def send_verification_code_email(email, verification_code, form_url, verification_link):
-    action = actions.GovNotifyEmailAction(
-        template_id=settings.CONFIRM_VERIFICATION_CODE_TEMPLATE_ID,
-        email_address=email,
-        form_url=form_url,
-    )
-
     expiry_date = parse_datetime(verification_code['expiration_date'])
     formatted_expiry_date = formats.date_format(
         expiry_date, "DATETIME_FORMAT"
     )
-    response = action.save({
-        'code': verification_code['code'],
-        'expiry_date': formatted_expiry_date,
-        'verification_link': verification_link
-    })
-    response.raise_for_status()
-    return response
+    return email_outbox.enqueue_email(
+        template_id=settings.CONFIRM_VERIFICATION_CODE_TEMPLATE_ID,
+        email_address=email,
+        form_url=form_url,
+        data={
+            'code': verification_code['code'],
+            'expiry_date': formatted_expiry_date,
+            'verification_link': verification_link
+        },
+    )
 
 
 def notify_already_registered(email, form_url):
-    action = actions.GovNotifyEmailAction(
+    return email_outbox.enqueue_email(
         email_address=email,
         template_id=settings.GOV_NOTIFY_ALREADY_REGISTERED_TEMPLATE_ID,
         form_url=form_url,
+        data={
+            'login_url': settings.SSO_PROXY_LOGIN_URL,
+            'password_reset_url': settings.SSO_PROXY_PASSWORD_RESET_URL,
+            'contact_us_url': urls.domestic.FEEDBACK,
+        },
     )
 
-    response = action.save({
-        'login_url': settings.SSO_PROXY_LOGIN_URL,
-        'password_reset_url': settings.SSO_PROXY_PASSWORD_RESET_URL,
-        'contact_us_url': urls.domestic.FEEDBACK,
-    })
-
-    response.raise_for_status()
-    return response
-
 
 def confirm_verification_code(email, verification_code):
-    response = sso_api_client.user.verify_verification_code({
+    response = upstream.call(sso_api_client.user.verify_verification_code, {
         'email': email,
         'code': verification_code,
     })
@@ -131,7 +174,7 @@ def confirm_verification_code(email, verification_code):
 
 
 def regenerate_verification_code(email):
-    response = sso_api_client.user.regenerate_verification_code({
+    response = upstream.call(sso_api_client.user.regenerate_verification_code, {
         'email': email,
     })
     if response.status_code == 400 or response.status_code == 404:
@@ -143,31 +186,34 @@ def regenerate_verification_code(email):
 
 
 def get_company_admins(sso_session_id):
-    response = api_client.company.collaborator_list(sso_session_id=sso_session_id)
+    response = request_cache.call(api_client.company.collaborator_list, sso_session_id=sso_session_id)
     response.raise_for_status()
     collaborators = response.json()
     return [collaborator for collaborator in collaborators if collaborator['role'] == user_roles.ADMIN]
 
 
 def create_company_member(sso_session_id, data):
-    response = api_client.company.collaborator_create(
+    response = upstream.call(
+        api_client.company.collaborator_create,
         sso_session_id=sso_session_id,
         data={**data, 'role': user_roles.MEMBER}
     )
+    request_cache.clear()
     response.raise_for_status()
 
 
 def notify_company_admins_member_joined(sso_session_id, email_data, form_url):
     company_admins = get_company_admins(sso_session_id)
     assert company_admins, f"No admin found for {email_data['company_name']}"
-    for admin in company_admins:
-        action = actions.GovNotifyEmailAction(
+    return [
+        email_outbox.enqueue_email(
             email_address=admin['company_email'],
             template_id=settings.GOV_NOTIFY_NEW_MEMBER_REGISTERED_TEMPLATE_ID,
-            form_url=form_url
+            form_url=form_url,
+            data=email_data,
         )
-        response = action.save(email_data)
-        response.raise_for_status()
+        for admin in company_admins
+    ]
 
 
 class CompanyParser(directory_components.helpers.CompanyParser):
@@ -214,13 +260,16 @@ def parse_set_cookie_header(cookie_header):
 
 
 def collaborator_invite_retrieve(invite_key):
-    response = api_client.company.collaborator_invite_retrieve(invite_key=invite_key)
+    response = request_cache.call(api_client.company.collaborator_invite_retrieve, invite_key=invite_key)
     if response.status_code == 200:
         return response.json()
 
 
 def collaborator_invite_accept(sso_session_id, invite_key):
-    response = api_client.company.collaborator_invite_accept(sso_session_id=sso_session_id, invite_key=invite_key)
+    response = upstream.call(
+        api_client.company.collaborator_invite_accept, sso_session_id=sso_session_id, invite_key=invite_key
+    )
+    request_cache.clear()
     response.raise_for_status()
 
 
@@ -1,4 +1,5 @@
 import abc
+from collections import OrderedDict
 from urllib.parse import unquote
 
 from requests.exceptions import HTTPError
@@ -9,9 +10,12 @@ from django.http import QueryDict
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
 
+from core import upstream
 from enrolment import helpers, constants
 from directory_sso_api_client import sso_api_client
+from profile.business_profile import helpers as business_profile_helpers
 import directory_components.mixins
 
 
@@ -76,19 +80,28 @@ class StepsListMixin(abc.ABC):
         else:
             return self.request.user.is_anonymous
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # the abstract property until a subclass sets the labels
+        if isinstance(cls.steps_list_labels, list):
+            cls.step_labels_table = cls.build_step_labels_table(cls.steps_list_labels)
+
+    @staticmethod
+    def build_step_labels_table(labels):
+        """Return the labels to show keyed on (show anon progress indicator, has user profile)."""
+        account_labels = [constants.PROGRESS_STEP_LABEL_USER_ACCOUNT, constants.PROGRESS_STEP_LABEL_VERIFICATION]
+        user_labels = [label for label in labels if label not in account_labels]
+        return {
+            (True, False): labels,
+            (False, False): user_labels,
+            (False, True): [label for label in user_labels if label != constants.PROGRESS_STEP_LABEL_PERSONAL_INFO],
+        }
+
     @property
     def step_labels(self):
-        labels = self.steps_list_labels[:]
-        if not self.should_show_anon_progress_indicator():
-            self.remove_label(labels=labels, label=constants.PROGRESS_STEP_LABEL_USER_ACCOUNT)
-            self.remove_label(labels=labels, label=constants.PROGRESS_STEP_LABEL_VERIFICATION)
-            if self.request.user.has_user_profile:
-                self.remove_label(labels=labels, label=constants.PROGRESS_STEP_LABEL_PERSONAL_INFO)
-        return labels
-
-    def remove_label(self, labels, label):
-        if label in labels:
-            labels.remove(label)
+        show_anon_progress_indicator = bool(self.should_show_anon_progress_indicator())
+        has_user_profile = not show_anon_progress_indicator and bool(self.request.user.has_user_profile)
+        return self.step_labels_table[(show_anon_progress_indicator, has_user_profile)]
 
     def get_context_data(self, *args, **kwargs):
         return super().get_context_data(
@@ -99,6 +112,65 @@ class StepsListMixin(abc.ABC):
         )
 
 
+class StepRoutingTableMixin:
+    """
+    Route between the wizard's steps using a table compiled when the class is
+    created.
+
+    formtools evaluates every condition in `condition_dict` each time it
+    needs the form list - many times per request - and conditions that look
+    at earlier steps revalidate those steps' forms each time. Instead the
+    form list for every combination of condition outcomes is built up front,
+    keyed by a bitmask of the outcomes, and the cleaned data of each step is
+    reused until the stored step data changes.
+
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.form_list:
+            cls.step_conditions, cls.form_list_table = cls.build_form_list_table(
+                form_list=OrderedDict(cls.form_list), condition_dict=cls.condition_dict or {},
+            )
+
+    @staticmethod
+    def build_form_list_table(form_list, condition_dict):
+        conditional_steps = [step for step in form_list if step in condition_dict]
+        table = []
+        for mask in range(2 ** len(conditional_steps)):
+            hidden_steps = {step for bit, step in enumerate(conditional_steps) if not mask & (1 << bit)}
+            table.append(OrderedDict(item for item in form_list.items() if item[0] not in hidden_steps))
+        return [condition_dict[step] for step in conditional_steps], table
+
+    def get_condition_mask(self):
+        mask = 0
+        for bit, condition in enumerate(self.step_conditions):
+            if condition(self) if callable(condition) else condition:
+                mask |= 1 << bit
+        return mask
+
+    def get_form_list(self):
+        return self.form_list_table[self.get_condition_mask()]
+
+    @cached_property
+    def cleaned_data_cache(self):
+        return {}
+
+    def get_cleaned_data_for_step(self, step):
+        # a step's data is replaced rather than mutated when it is stored, so
+        # an unchanged snapshot of the values means the cleaned data still holds
+        snapshot = list(self.storage.data[self.storage.step_data_key].items())
+        cached = self.cleaned_data_cache.get(step)
+        if cached and len(cached[0]) == len(snapshot) and all(
+            name == cached_name and data is cached_data
+            for (name, data), (cached_name, cached_data) in zip(snapshot, cached[0])
+        ):
+            return cached[1]
+        cleaned_data = super().get_cleaned_data_for_step(step)
+        self.cleaned_data_cache[step] = (snapshot, cleaned_data)
+        return cleaned_data
+
+
 class ProgressIndicatorMixin:
     """
     Anonymous users see different numbers next to the steps on the progress
@@ -183,10 +255,13 @@ class CreateUserAccountMixin:
         try:
             return super().dispatch(*args, **kwargs)
         except RemotePasswordValidationError as error:
-            return self.render_revalidation_failure(
+            response = self.render_revalidation_failure(
                 failed_step=constants.USER_ACCOUNT,
                 form=error.form
             )
+            # the exception skipped the wizard saving its storage
+            self.storage.update_response(response)
+            return response
 
     def get_form_initial(self, step):
         form_initial = super().get_form_initial(step)
@@ -198,7 +273,8 @@ class CreateUserAccountMixin:
 
     def process_step(self, form):
         if form.prefix == constants.USER_ACCOUNT:
-            response = sso_api_client.user.create_user(
+            response = upstream.call(
+                sso_api_client.user.create_user,
                 email=form.cleaned_data['email'],
                 password=form.cleaned_data['password'],
             )
@@ -303,6 +379,7 @@ class CreateBusinessProfileMixin:
             'name': user.full_name,
             **data,
         })
+        business_profile_helpers.clear_cached_company_profile(user.id)
 
     # For user that started their journey from sso-profile, take them directly
     # to their business profile, otherwise show them the success page.
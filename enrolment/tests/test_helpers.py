@@ -1,3 +1,4 @@
+import threading
 from unittest import mock
 
 from directory_constants import urls
@@ -7,6 +8,7 @@ from requests.exceptions import HTTPError
 from django.conf import settings
 from django.core.cache import cache
 
+from core.outbox import email_outbox
 from enrolment import helpers
 from core.tests.helpers import create_response
 from directory_constants import user_roles
@@ -67,13 +69,18 @@ def test_send_verification_code_email(mock_submit):
     verification_link = 'test/url/'
 
     mock_submit.return_value = create_response(status_code=201)
-    helpers.send_verification_code_email(
+    message_id = helpers.send_verification_code_email(
         email=email,
         verification_code=verification_code,
         form_url=form_url,
         verification_link=verification_link
     )
 
+    assert mock_submit.call_count == 0
+    assert email_outbox.get_status(message_id) == email_outbox.STATUS_PENDING
+
+    email_outbox.drain()
+
     expected = {
         'data': {
             'code': 12345,
@@ -129,6 +136,10 @@ def test_notify_already_registered(mock_submit):
         form_url=form_url,
     )
 
+    assert mock_submit.call_count == 0
+
+    email_outbox.drain()
+
     expected = {
         'data': {
             'login_url': settings.SSO_PROXY_LOGIN_URL,
@@ -202,6 +213,11 @@ def test_notify_company_admins_member_joined_ok(mock_get_company_admins, mock_su
         },
         form_url='the/form/url')
 
+    assert mock_submit.call_count == 0
+
+    email_outbox.drain()
+
+    assert mock_submit.call_count == 1
     assert mock_submit.call_args == mock.call({
         'data': {
             'company_name': 'XYZ corp',
@@ -259,3 +275,92 @@ def test_add_collaborator(mock_add_collaborator):
         'mobile_number': '9876543210',
         'role': user_roles.MEMBER
     })
+
+
+@mock.patch.object(helpers.api_client.company, 'validate_company_number')
+def test_get_is_enrolled_caches_false(mock_validate_company_number):
+    mock_validate_company_number.return_value = create_response(status_code=200)
+
+    assert helpers.get_is_enrolled('123456') is False
+    assert helpers.get_is_enrolled('123456') is False
+    assert mock_validate_company_number.call_count == 1
+
+
+@mock.patch.object(helpers.api_client.enrolment, 'send_form')
+@mock.patch.object(helpers.api_client.company, 'validate_company_number')
+def test_create_company_profile_clears_cached_is_enrolled(mock_validate_company_number, mock_send_form):
+    mock_validate_company_number.return_value = create_response(status_code=200)
+    mock_send_form.return_value = create_response(status_code=201)
+
+    assert helpers.get_is_enrolled('123456') is False
+
+    helpers.create_company_profile({'company_number': '123456'})
+    mock_validate_company_number.return_value = create_response(status_code=400)
+
+    assert helpers.get_is_enrolled('123456') is True
+    assert mock_validate_company_number.call_count == 2
+
+
+def test_get_or_refresh_cache_fresh():
+    fetch = mock.Mock(return_value=False)
+
+    assert helpers.get_or_refresh_cache(key='thing', fetch=fetch) is False
+    assert helpers.get_or_refresh_cache(key='thing', fetch=fetch) is False
+    assert fetch.call_count == 1
+
+
+def test_get_or_refresh_cache_stale_refreshed():
+    cache.set('thing', 'stale')
+
+    value = helpers.get_or_refresh_cache(key='thing', fetch=mock.Mock(return_value='fresh'))
+
+    assert value == 'fresh'
+    assert cache.get('thing') == 'fresh'
+    assert cache.get('thing-LOCK') is None
+
+
+def test_get_or_refresh_cache_stale_served_while_refreshing():
+    cache.set('thing', 'stale')
+    cache.set('thing-LOCK', True)
+    fetch = mock.Mock(return_value='fresh')
+
+    value = helpers.get_or_refresh_cache(key='thing', fetch=fetch)
+
+    assert value == 'stale'
+    assert fetch.call_count == 0
+
+
+def test_get_or_refresh_cache_stale_served_on_error():
+    cache.set('thing', 'stale')
+
+    value = helpers.get_or_refresh_cache(key='thing', fetch=mock.Mock(side_effect=HTTPError))
+
+    assert value == 'stale'
+
+
+def test_get_or_refresh_cache_miss_error():
+    with pytest.raises(HTTPError):
+        helpers.get_or_refresh_cache(key='thing', fetch=mock.Mock(side_effect=HTTPError))
+
+
+def test_get_or_refresh_cache_miss_waits_for_other_process():
+    # another process is fetching the value and stores it shortly afterwards
+    cache.set('thing-SINGLE-FLIGHT', True)
+    threading.Timer(0.05, cache.set, args=['thing', 'fetched']).start()
+    fetch = mock.Mock(return_value='fresh')
+
+    value = helpers.get_or_refresh_cache(key='thing', fetch=fetch)
+
+    assert value == 'fetched'
+    assert fetch.call_count == 0
+
+
+@mock.patch.object(helpers.random, 'uniform', return_value=1.1)
+def test_get_or_refresh_cache_jittered_timeout(mock_uniform):
+    with mock.patch.object(helpers.cache, 'set') as mock_set:
+        helpers.get_or_refresh_cache(key='thing', fetch=mock.Mock(return_value=1), timeout=100)
+
+    assert mock_set.call_args_list == [
+        mock.call(key='thing', value=1, timeout=110 + helpers.CACHE_STALE_TIMEOUT),
+        mock.call(key='thing-FRESH', value=True, timeout=110),
+    ]
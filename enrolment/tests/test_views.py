@@ -1,19 +1,25 @@
+from collections import OrderedDict
 from unittest import mock
 
 from directory_constants import user_roles, urls
+from formtools.wizard.storage import get_storage
 from formtools.wizard.views import NamedUrlSessionWizardView
 from freezegun import freeze_time
 from requests.exceptions import HTTPError
 import pytest
 
+from django import forms as django_forms
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sessions.backends import signed_cookies
+from django.core.cache import cache
 from django.utils import translation
 from django.urls import resolve, reverse
 from django.views.generic import TemplateView
 
+from core.outbox import email_outbox
 from core.tests.helpers import create_response, submit_step_factory
 from enrolment import constants, forms, helpers, views, mixins
+from profile.business_profile import helpers as business_profile_helpers
 
 
 enrolment_urls = (
@@ -254,6 +260,16 @@ def mock_get_company_admins(client):
     patch.stop()
 
 
+@pytest.fixture(autouse=True)
+def mock_collaborator_list(mock_get_company_admins):
+    patch = mock.patch.object(
+        helpers.api_client.company, 'collaborator_list',
+        return_value=create_response(mock_get_company_admins.return_value)
+    )
+    yield patch.start()
+    patch.stop()
+
+
 @pytest.fixture(autouse=True)
 def mock_enrolment_send(client):
     patch = mock.patch.object(
@@ -967,6 +983,10 @@ def test_companies_house_enrolment_submit_end_to_end_company_has_account(
         })
 
     assert mock_get_company_admins.call_count == 1
+    assert mock_gov_notify.call_count == 0
+
+    email_outbox.drain()
+
     assert mock_gov_notify.call_count == 2
 
 
@@ -1028,6 +1048,10 @@ def test_companies_house_enrolment_submit_end_to_end_company_second_user(
         })
 
     assert mock_get_company_admins.call_count == 1
+    assert mock_gov_notify.call_count == 0
+
+    email_outbox.drain()
+
     assert mock_gov_notify.call_count == 2
 
 
@@ -1045,6 +1069,8 @@ def test_companies_house_enrolment_submit_end_to_end_company_has_user_profile(
     user.last_name = 'Bar'
 
     mock_user_role.return_value = user_roles.ADMIN
+    admin_directory_key = business_profile_helpers.build_collaborator_directory_cache_key('12345678')
+    cache.set(admin_directory_key, [])
 
     client.force_login(user)
 
@@ -1063,6 +1089,7 @@ def test_companies_house_enrolment_submit_end_to_end_company_has_user_profile(
     response = client.get(response.url)
 
     assert response.status_code == 302
+    assert cache.get(admin_directory_key) is None
     assert mock_enrolment_send.call_count == 0
     assert mock_add_collaborator.call_count == 1
     assert mock_add_collaborator.call_args == mock.call(
@@ -1076,6 +1103,10 @@ def test_companies_house_enrolment_submit_end_to_end_company_has_user_profile(
         })
 
     assert mock_get_company_admins.call_count == 1
+    assert mock_gov_notify.call_count == 0
+
+    email_outbox.drain()
+
     assert mock_gov_notify.call_count == 2
 
 
@@ -1117,6 +1148,18 @@ def test_user_has_no_company_redirect_on_start(
     assert response.status_code == 200
 
 
+def test_user_has_company_retrieved_once_per_request(
+    client, mock_user_has_company, user
+):
+    client.force_login(user)
+    mock_user_has_company.return_value = create_response(status_code=404)
+
+    response = client.get(reverse('enrolment-start'))
+
+    assert mock_user_has_company.call_count == 1
+    assert len(response.wsgi_request.upstream_calls) == 1
+
+
 @pytest.mark.parametrize('company_type', company_types)
 def test_create_user_enrolment(
     client, steps_data, submit_step_builder, company_type
@@ -1883,6 +1926,32 @@ def test_claim_preverified_success(
     )
 
 
+def test_claim_preverified_carries_over_session_data(
+    submit_pre_verified_step, mock_claim_company, client, steps_data, preverified_company_data, user, settings
+):
+    # an enrolment started while the company was kept in the session
+    client.force_login(user)
+    session = client.session
+    session[constants.SESSION_KEY_COMPANY_DATA] = preverified_company_data
+    session[constants.SESSION_KEY_ENROL_KEY] = 'some-key'
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    response = client.get(reverse('enrolment-pre-verified', kwargs={'step': constants.PERSONAL_INFO}))
+
+    assert response.status_code == 200
+    assert response.context_data['company'] == preverified_company_data
+    assert constants.SESSION_KEY_COMPANY_DATA not in client.session
+
+    response = submit_pre_verified_step(
+        {**steps_data[constants.PERSONAL_INFO], 'terms_agreed': True}, step_name=constants.PERSONAL_INFO
+    )
+    client.get(response.url)
+
+    assert mock_claim_company.call_count == 1
+    assert mock_claim_company.call_args[1]['key'] == 'some-key'
+
+
 def test_claim_preverified_failure(
     submit_pre_verified_step, mock_claim_company, client, steps_data,
     user
@@ -1948,6 +2017,67 @@ def test_steps_list_mixin(is_anon, expected, rf, settings, user):
     assert response.context_data['step_labels'] == expected
 
 
+def test_steps_list_mixin_labels_table():
+    table = mixins.StepsListMixin.build_step_labels_table([
+        constants.PROGRESS_STEP_LABEL_BUSINESS_TYPE,
+        constants.PROGRESS_STEP_LABEL_USER_ACCOUNT,
+        constants.PROGRESS_STEP_LABEL_VERIFICATION,
+        constants.PROGRESS_STEP_LABEL_PERSONAL_INFO,
+    ])
+
+    assert table[(False, False)] == [
+        constants.PROGRESS_STEP_LABEL_BUSINESS_TYPE,
+        constants.PROGRESS_STEP_LABEL_PERSONAL_INFO,
+    ]
+    assert table[(False, True)] == [constants.PROGRESS_STEP_LABEL_BUSINESS_TYPE]
+
+
+class StepForm(django_forms.Form):
+    name = django_forms.CharField()
+
+
+def test_step_routing_table_mixin_form_list_table():
+    def condition_one(view):
+        return True
+
+    def condition_three(view):
+        return True
+
+    conditions, table = mixins.StepRoutingTableMixin.build_form_list_table(
+        form_list=OrderedDict([('one', StepForm), ('two', StepForm), ('three', StepForm)]),
+        condition_dict={'three': condition_three, 'one': condition_one},
+    )
+
+    assert conditions == [condition_one, condition_three]
+    assert [list(form_list) for form_list in table] == [
+        ['two'], ['one', 'two'], ['two', 'three'], ['one', 'two', 'three'],
+    ]
+
+
+def test_step_routing_table_mixin_reuses_cleaned_data(rf, client):
+    class TestView(mixins.StepRoutingTableMixin, NamedUrlSessionWizardView):
+        form_list = (('one', StepForm), ('two', StepForm))
+        condition_dict = {'two': lambda view: bool(view.get_cleaned_data_for_step('one'))}
+
+    request = rf.get('/')
+    request.session = client.session
+    view = TestView(**TestView.get_initkwargs(url_name='enrolment-companies-house'))
+    view.setup(request)
+    view.prefix = view.get_prefix(request)
+    view.storage = get_storage(view.storage_name, view.prefix, request)
+
+    assert list(view.get_form_list()) == ['one']
+
+    view.storage.set_step_data('one', {'one-name': ['Jim']})
+    with mock.patch.object(StepForm, 'full_clean', autospec=True, side_effect=StepForm.full_clean) as mock_full_clean:
+        assert list(view.get_form_list()) == ['one', 'two']
+        assert list(view.get_form_list()) == ['one', 'two']
+    assert mock_full_clean.call_count == 1
+
+    view.storage.set_step_data('one', {'one-name': ['']})
+    assert list(view.get_form_list()) == ['one']
+
+
 @pytest.mark.parametrize('is_anon', (True, False))
 def test_wizard_progress_indicator_mixin(is_anon, rf, settings, client, user):
 
@@ -2262,6 +2392,26 @@ def test_collaborator_enrolment_submit_end_to_end_already_has_profile(
     assert mock_collaborator_invite_accept.call_args == mock.call(invite_key='abc', sso_session_id='123')
 
 
+def test_collaborator_enrolment_clears_company_collaborators(
+    client, user, mock_create_user_profile, mock_collaborator_invite_accept, mock_user_has_company
+):
+    def accept_invite(**kwargs):
+        mock_user_has_company.return_value = create_response({'number': '12345678'})
+        return create_response()
+
+    mock_collaborator_invite_accept.side_effect = accept_invite
+    key = business_profile_helpers.build_collaborator_directory_cache_key('12345678')
+    cache.set(key, [])
+    user.has_user_profile = True
+    client.force_login(user)
+
+    url = reverse('enrolment-collaboration', kwargs={'step': constants.USER_ACCOUNT})
+    client.get(f'{url}?invite_key=abc')
+
+    assert mock_collaborator_invite_accept.call_count == 1
+    assert cache.get(key) is None
+
+
 @pytest.mark.parametrize('url,expected_page_id', (
     (reverse('enrolment-business-type'), 'EnrolmentBusinessTypeChooser'),
     (reverse('enrolment-start'), 'EnrolmentStartPage'),
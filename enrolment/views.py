@@ -4,6 +4,7 @@ from directory_constants import urls, user_roles
 from formtools.wizard.views import NamedUrlSessionWizardView
 from requests.exceptions import HTTPError
 
+from django.conf import settings
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
@@ -14,6 +15,7 @@ from django.views.generic import FormView, TemplateView
 import core.forms
 import core.mixins
 from enrolment import constants, forms, helpers, mixins
+from profile.business_profile import helpers as business_profile_helpers
 from directory_forms_api_client.helpers import FormSessionMixin
 
 
@@ -105,8 +107,10 @@ class BaseEnrolmentWizardView(
     mixins.ReadUserIntentMixin,
     mixins.CreateUserAccountMixin,
     mixins.GA360Mixin,
+    mixins.StepRoutingTableMixin,
     NamedUrlSessionWizardView
 ):
+    storage_name = settings.WIZARD_STORAGE_NAME
 
     def dispatch(self, request, *args, **kwargs):
         is_authentication_required = self.kwargs['step'] not in [constants.USER_ACCOUNT, constants.VERIFICATION]
@@ -259,6 +263,8 @@ class CompaniesHouseEnrolmentView(mixins.CreateBusinessProfileMixin, BaseEnrolme
 
     def done(self, form_list, form_dict, **kwargs):
         data = self.serialize_form_list(form_list)
+        # another user may have enrolled the company since it was cached as not enrolled
+        helpers.clear_cached_is_enrolled(data['company_number'])
         is_enrolled = helpers.get_is_enrolled(data['company_number'])
         if is_enrolled:
             helpers.create_company_member(
@@ -271,6 +277,7 @@ class CompaniesHouseEnrolmentView(mixins.CreateBusinessProfileMixin, BaseEnrolme
                     'mobile_number': data.get('phone_number', ''),
                 }
             )
+            business_profile_helpers.clear_cached_company_profile(self.request.user.id)
 
             helpers.notify_company_admins_member_joined(
                 sso_session_id=self.request.user.session_id,
@@ -283,6 +290,7 @@ class CompaniesHouseEnrolmentView(mixins.CreateBusinessProfileMixin, BaseEnrolme
                     ),
                     'report_abuse_url': urls.domestic.FEEDBACK
                 }, form_url=self.request.path)
+            business_profile_helpers.clear_cached_collaborator_directory(data['company_number'])
 
             if self.request.user.role == user_roles.MEMBER:
                 messages.add_message(self.request, messages.SUCCESS, 'You are now linked to the profile.')
@@ -483,6 +491,13 @@ class CollaboratorEnrolmentView(BaseEnrolmentWizardView):
             sso_session_id=self.request.user.session_id,
             invite_key=self.request.session[constants.SESSION_KEY_INVITE_KEY],
         )
+        business_profile_helpers.clear_cached_company_profile(self.request.user.id)
+        # `user.company` was read before the user joined, so the company is read afresh
+        company = business_profile_helpers.get_cached_company_profile(
+            sso_session_id=self.request.user.session_id, sso_id=self.request.user.id
+        )
+        if company:
+            business_profile_helpers.clear_cached_collaborator_directory(company['number'])
 
     @cached_property
     def collaborator_invition(self):
@@ -537,25 +552,36 @@ class PreVerifiedEnrolmentView(BaseEnrolmentWizardView):
         constants.FAILURE: 'enrolment/failure-pre-verified.html',
     }
 
+    def carry_over_session_data(self):
+        # for enrolments that were started while the company was kept in the session
+        for name in [constants.SESSION_KEY_COMPANY_DATA, constants.SESSION_KEY_ENROL_KEY]:
+            if name in self.request.session:
+                self.storage.extra_data[name] = self.request.session.pop(name)
+
     def get(self, *args, **kwargs):
+        self.carry_over_session_data()
         key = self.request.GET.get('key')
         if key:
             data = helpers.retrieve_preverified_company(key)
             if data:
-                self.request.session[constants.SESSION_KEY_COMPANY_DATA] = data
-                self.request.session[constants.SESSION_KEY_ENROL_KEY] = key
-                self.request.session.save()
+                # kept with the wizard data rather than growing the session cookie
+                self.storage.extra_data[constants.SESSION_KEY_COMPANY_DATA] = data
+                self.storage.extra_data[constants.SESSION_KEY_ENROL_KEY] = key
             else:
                 return redirect(reverse('enrolment-start'))
         if self.steps.current == constants.PERSONAL_INFO:
-            if not self.request.session.get(constants.SESSION_KEY_COMPANY_DATA):
+            if not self.storage.extra_data.get(constants.SESSION_KEY_COMPANY_DATA):
                 return redirect(reverse('enrolment-start'))
         return super().get(*args, **kwargs)
 
+    def post(self, *args, **kwargs):
+        self.carry_over_session_data()
+        return super().post(*args, **kwargs)
+
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         if self.steps.current == constants.PERSONAL_INFO:
-            context['company'] = self.request.session[constants.SESSION_KEY_COMPANY_DATA]
+            context['company'] = self.storage.extra_data[constants.SESSION_KEY_COMPANY_DATA]
         return context
 
     def done(self, form_list, **kwargs):
@@ -569,10 +595,14 @@ class PreVerifiedEnrolmentView(BaseEnrolmentWizardView):
 
     def claim_company(self, data):
         helpers.claim_company(
-            enrolment_key=self.request.session[constants.SESSION_KEY_ENROL_KEY],
+            enrolment_key=self.storage.extra_data[constants.SESSION_KEY_ENROL_KEY],
             personal_name=f'{data["given_name"]} {data["family_name"]}',
             sso_session_id=self.request.user.session_id,
         )
+        business_profile_helpers.clear_cached_company_profile(self.request.user.id)
+        company_number = self.storage.extra_data[constants.SESSION_KEY_COMPANY_DATA].get('number')
+        if company_number:
+            helpers.clear_cached_is_enrolled(company_number)
 
     def serialize_form_list(self, form_list):
         data = {}
@@ -588,9 +618,11 @@ class ResendVerificationCodeView(
     mixins.StepsListMixin,
     mixins.CreateUserAccountMixin,
     mixins.GA360Mixin,
+    mixins.StepRoutingTableMixin,
     NamedUrlSessionWizardView
 ):
 
+    storage_name = settings.WIZARD_STORAGE_NAME
     google_analytics_page_id = 'ResendVerificationCode'
     form_list = (
         (constants.RESEND_VERIFICATION, forms.ResendVerificationCode),
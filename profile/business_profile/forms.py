@@ -6,9 +6,12 @@ import directory_validators.string
 import directory_validators.file
 
 from django.conf import settings
-from django.forms import ImageField, SelectMultiple, Textarea, ValidationError
+from django.core.validators import validate_email
+from django.forms import HiddenInput, SelectMultiple, Textarea, ValidationError
 from django.utils.safestring import mark_safe
 
+from core import direct_upload
+from core.forms import HeaderImageField
 from profile.business_profile import constants, validators
 
 
@@ -18,6 +21,7 @@ USER_ROLE_CHOICES = [('', 'Select role')] + [choice for choice in choices.USER_R
 REMOVE_COLLABORATOR = 'REMOVE'
 CHANGE_COLLABORATOR_TO_MEMBER = 'CHANGE_TO_MEMBER'
 CHANGE_COLLABORATOR_TO_ADMIN = 'CHANGE_TO_ADMIN'
+CASE_STUDY_IMAGE_CONTENT_TYPES = ['image/png', 'image/jpeg']
 
 
 class SocialLinksForm(forms.Form):
@@ -158,6 +162,9 @@ class DynamicHelptextFieldsMixin:
 
 
 class CaseStudyRichMediaForm(DynamicHelptextFieldsMixin, forms.Form):
+    MESSAGE_UPLOAD_NOT_FOUND = 'The uploaded file could not be found, please upload it again'
+    # fields that can instead be given the key of a file the browser uploaded straight to S3
+    DIRECT_UPLOAD_FIELDS = ['image_one', 'image_two', 'image_three']
 
     image_help_text_create = (
         'This image will be shown at full width on your case study page and '
@@ -195,9 +202,11 @@ class CaseStudyRichMediaForm(DynamicHelptextFieldsMixin, forms.Form):
         },
     ]
 
-    image_one = ImageField(
-        validators=[directory_validators.file.case_study_image_filesize, directory_validators.file.image_format],
+    image_one = HeaderImageField(
+        required=False,  # either this or image_one_key is required, see clean
+        validators=[directory_validators.file.case_study_image_filesize],
     )
+    image_one_key = forms.CharField(label='', widget=HiddenInput, required=False)
     image_one_caption = forms.CharField(
         label=(
             'Add a caption that tells visitors what the main image represents'
@@ -207,10 +216,11 @@ class CaseStudyRichMediaForm(DynamicHelptextFieldsMixin, forms.Form):
         widget=Textarea,
         validators=[directory_validators.string.no_html],
     )
-    image_two = ImageField(
+    image_two = HeaderImageField(
         required=False,
-        validators=[directory_validators.file.case_study_image_filesize, directory_validators.file.image_format]
+        validators=[directory_validators.file.case_study_image_filesize]
     )
+    image_two_key = forms.CharField(label='', widget=HiddenInput, required=False)
     image_two_caption = forms.CharField(
         label=(
             'Add a caption that tells visitors what this second image '
@@ -222,10 +232,11 @@ class CaseStudyRichMediaForm(DynamicHelptextFieldsMixin, forms.Form):
         required=False,
         validators=[directory_validators.string.no_html],
     )
-    image_three = ImageField(
+    image_three = HeaderImageField(
         required=False,
-        validators=[directory_validators.file.case_study_image_filesize, directory_validators.file.image_format]
+        validators=[directory_validators.file.case_study_image_filesize]
     )
+    image_three_key = forms.CharField(label='', widget=HiddenInput, required=False)
     image_three_caption = forms.CharField(
         label=(
             'Add a caption that tells visitors what this third image '
@@ -271,9 +282,45 @@ class CaseStudyRichMediaForm(DynamicHelptextFieldsMixin, forms.Form):
         validators=[directory_validators.string.no_html],
     )
 
+    def __init__(self, *args, direct_upload_key_prefix=None, **kwargs):
+        self.direct_upload_key_prefix = direct_upload_key_prefix
+        super().__init__(*args, **kwargs)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in self.DIRECT_UPLOAD_FIELDS:
+            key = cleaned_data.pop(f'{name}_key', None)
+            if key:
+                try:
+                    self.validate_direct_upload(key)
+                except ValidationError as error:
+                    self.add_error(name, error)
+                else:
+                    cleaned_data[name] = key
+        if not cleaned_data.get('image_one') and 'image_one' not in self.errors:
+            self.add_error('image_one', self.fields['image_one'].error_messages['required'])
+        return cleaned_data
+
+    def validate_direct_upload(self, key):
+        # the metadata of the object is checked as the file itself never passed through here
+        if not self.direct_upload_key_prefix or not key.startswith(f'{self.direct_upload_key_prefix}/'):
+            raise ValidationError(self.MESSAGE_UPLOAD_NOT_FOUND)
+        metadata = direct_upload.get_metadata(key)
+        if metadata is None:
+            raise ValidationError(self.MESSAGE_UPLOAD_NOT_FOUND)
+        if metadata['size'] > settings.VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES:
+            raise ValidationError(directory_validators.file.MESSAGE_FILE_TOO_BIG)
+        if metadata['content_type'] not in CASE_STUDY_IMAGE_CONTENT_TYPES:
+            raise ValidationError(directory_validators.file.MESSAGE_INVALID_IMAGE_FORMAT)
+
+
+class CaseStudyMediaUploadForm(forms.Form):
+    filename = forms.CharField(max_length=255)
+    content_type = forms.ChoiceField(choices=[(item, item) for item in CASE_STUDY_IMAGE_CONTENT_TYPES])
+
 
 class LogoForm(forms.Form):
-    logo = ImageField(
+    logo = HeaderImageField(
         help_text=(
             'For best results this should be a transparent PNG file of 600 x '
             '600 pixels and no more than 2MB'.format(
@@ -281,7 +328,7 @@ class LogoForm(forms.Form):
             )
         ),
         required=True,
-        validators=[directory_validators.file.logo_filesize, directory_validators.file.image_format]
+        validators=[directory_validators.file.logo_filesize]
     )
 
 
@@ -572,5 +619,107 @@ class AdminInviteCollaboratorForm(forms.Form):
     )
 
 
+class AdminCollaboratorBulkForm(forms.Form):
+    MESSAGE_NO_CHANGES = 'Please enter email addresses to invite or select a change to make'
+    MESSAGE_ROLE_REQUIRED = 'Please select the role of the invited collaborators'
+    MESSAGE_INVALID_EMAIL = '%(email)s is not a valid email address'
+    MESSAGE_TOO_MANY_CHANGES = 'Please make no more than %(max_changes)s changes at a time'
+    MAX_CHANGES = 50
+
+    ACTION_ROLES = {
+        CHANGE_COLLABORATOR_TO_MEMBER: user_roles.MEMBER,
+        CHANGE_COLLABORATOR_TO_ADMIN: user_roles.ADMIN,
+    }
+
+    collaborator_emails = forms.CharField(
+        label='Email addresses of collaborators to invite',
+        help_text='Separate email addresses with a comma or a new line.',
+        widget=Textarea(attrs={'rows': 5}),
+        required=False,
+    )
+    role = forms.ChoiceField(
+        label='Role of invited collaborators',
+        choices=USER_ROLE_CHOICES,
+        container_css_classes='width-half',
+        required=False,
+    )
+
+    def __init__(self, collaborators, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collaborators = collaborators
+        for collaborator in collaborators:
+            choices = AdminCollaboratorEditForm.CHOICES[collaborator['role']][1:]
+            self.fields[self.build_action_field_name(collaborator['sso_id'])] = forms.ChoiceField(
+                label='',
+                choices=[('', 'No change')] + choices,
+                required=False,
+            )
+
+    @staticmethod
+    def build_action_field_name(sso_id):
+        return f'action_{sso_id}'
+
+    @property
+    def collaborator_action_fields(self):
+        return [
+            (collaborator, self[self.build_action_field_name(collaborator['sso_id'])])
+            for collaborator in self.collaborators
+        ]
+
+    def clean_collaborator_emails(self):
+        emails = []
+        for email in self.cleaned_data['collaborator_emails'].replace(',', ' ').split():
+            try:
+                validate_email(email)
+            except ValidationError:
+                raise ValidationError(self.MESSAGE_INVALID_EMAIL % {'email': email})
+            if email not in emails:
+                emails.append(email)
+        return emails
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('collaborator_emails') and not cleaned_data.get('role'):
+            self.add_error('role', self.MESSAGE_ROLE_REQUIRED)
+        elif not self.errors:
+            change_count = len(self.invites) + len(self.role_updates) + len(self.removals)
+            if not change_count:
+                raise ValidationError(self.MESSAGE_NO_CHANGES)
+            if change_count > self.MAX_CHANGES:
+                raise ValidationError(self.MESSAGE_TOO_MANY_CHANGES % {'max_changes': self.MAX_CHANGES})
+        return cleaned_data
+
+    def get_actions(self):
+        for collaborator in self.collaborators:
+            action = self.cleaned_data.get(self.build_action_field_name(collaborator['sso_id']))
+            if action:
+                yield collaborator['sso_id'], action
+
+    @property
+    def invites(self):
+        return [(email, self.cleaned_data['role']) for email in self.cleaned_data.get('collaborator_emails', [])]
+
+    @property
+    def role_updates(self):
+        return [
+            (sso_id, self.ACTION_ROLES[action]) for sso_id, action in self.get_actions() if action in self.ACTION_ROLES
+        ]
+
+    @property
+    def removals(self):
+        return [sso_id for sso_id, action in self.get_actions() if action == REMOVE_COLLABORATOR]
+
+
 class AdminInviteCollaboratorDeleteForm(forms.Form):
     invite_key = forms.CharField()
+
+
+class CollaboratorFilterForm(forms.Form):
+    role = forms.ChoiceField(
+        label='Role',
+        choices=[('', 'All roles')] + USER_ROLE_CHOICES[1:],
+        container_css_classes='width-half',
+        required=False,
+    )
+    name = forms.CharField(label='Name or email address', max_length=255, required=False)
+    cursor = forms.CharField(widget=HiddenInput, required=False)
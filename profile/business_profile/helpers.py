@@ -1,21 +1,83 @@
+import bisect
+import collections
+from functools import partial
 import http
+import itertools
 
 from directory_api_client.client import api_client
+from requests.exceptions import RequestException
 
 from directory_constants import company_types, user_roles
 import directory_components.helpers
 
+from django.conf import settings
+from django.core.cache import cache
+
+from core import upstream
+from core.helpers import run_concurrently
+from core.cache import request_cache, single_flight
+
+
+CACHE_KEY_BUSINESS_PROFILE = 'BUSINESS_PROFILE'
+# the raw collaborator list is cached rather than the directory, so changes to the index do not need a cache flush
+CACHE_KEY_COLLABORATOR_DIRECTORY = 'COLLABORATOR_LIST'
+
+Page = collections.namedtuple('Page', ['items', 'next_cursor'])
+
 
 def get_company_profile(sso_session_id):
-    response = api_client.company.profile_retrieve(sso_session_id)
+    response = request_cache.call(api_client.company.profile_retrieve, sso_session_id)
     if response.status_code == http.client.NOT_FOUND:
         return None
     response.raise_for_status()
     return response.json()
 
 
+def build_company_profile_cache_key(sso_id):
+    return f'{CACHE_KEY_BUSINESS_PROFILE}-{sso_id}'
+
+
+def build_company_profile_fallback_cache_key(sso_id):
+    return f'{CACHE_KEY_BUSINESS_PROFILE}-FALLBACK-{sso_id}'
+
+
+def get_cached_company_profile(sso_session_id, sso_id):
+    # `None` is cached when the user has no company, so distinguish it from a miss
+    key = build_company_profile_cache_key(sso_id)
+    fallback_key = build_company_profile_fallback_cache_key(sso_id)
+    values = cache.get_many([key, fallback_key])
+    if key in values:
+        return values[key]
+
+    def fetch():
+        value = get_company_profile(sso_session_id)
+        if value is None:
+            timeout = settings.COMPANY_PROFILE_NOT_FOUND_CACHE_TIMEOUT
+        else:
+            timeout = settings.COMPANY_PROFILE_CACHE_TIMEOUT
+        cache.set(key=key, value=value, timeout=timeout)
+        cache.set(key=fallback_key, value=value, timeout=settings.COMPANY_PROFILE_FALLBACK_CACHE_TIMEOUT)
+        return value
+
+    try:
+        return single_flight.do(key=key, fetch=fetch)
+    except RequestException:
+        # directory-api is unavailable, so serve the last profile retrieved if there is one
+        if fallback_key in values:
+            return values[fallback_key]
+        raise
+
+
+def clear_cached_company_profile(sso_id):
+    cache.delete_many([build_company_profile_cache_key(sso_id), build_company_profile_fallback_cache_key(sso_id)])
+
+
+def build_case_study_upload_prefix(sso_id):
+    return f'{settings.DIRECT_UPLOAD_KEY_PREFIX}/{sso_id}'
+
+
 def get_supplier_profile(sso_id):
-    response = api_client.supplier.retrieve_profile(sso_id)
+    response = request_cache.call(api_client.supplier.retrieve_profile, sso_id)
     if response.status_code == http.client.NOT_FOUND:
         return None
     response.raise_for_status()
@@ -62,51 +124,193 @@ class CompanyParser(directory_components.helpers.CompanyParser):
 
 
 def collaborator_list(sso_session_id):
-    response = api_client.company.collaborator_list(sso_session_id=sso_session_id)
+    response = request_cache.call(api_client.company.collaborator_list, sso_session_id=sso_session_id)
     response.raise_for_status()
     return response.json()
 
 
-def retrieve_collaborator(sso_session_id, collaborator_sso_id):
-    for collaborator in collaborator_list(sso_session_id):
-        if collaborator['sso_id'] == collaborator_sso_id:
-            return collaborator
+class CollaboratorDirectory:
+    """The collaborators of a company, indexed by sso_id, role and email address."""
+
+    def __init__(self, collaborators):
+        self.collaborators = collaborators
+        self.ordered = sorted(collaborators, key=lambda collaborator: collaborator['sso_id'])
+        self.sso_ids = [collaborator['sso_id'] for collaborator in self.ordered]
+        self.by_sso_id = {}
+        self.by_email = {}
+        self.by_role = {}
+        for collaborator in collaborators:
+            self.by_sso_id[collaborator['sso_id']] = collaborator
+            self.by_email[collaborator['company_email'].lower()] = collaborator
+            self.by_role.setdefault(collaborator['role'], []).append(collaborator)
+
+    def __iter__(self):
+        return iter(self.collaborators)
+
+    def __len__(self):
+        return len(self.collaborators)
+
+    def get(self, sso_id):
+        return self.by_sso_id.get(sso_id)
+
+    def get_by_email(self, email):
+        return self.by_email.get(email.lower())
+
+    def with_role(self, role):
+        return self.by_role.get(role, [])
+
+    def count_role(self, role):
+        return len(self.with_role(role))
+
+    def iter_after(self, sso_id=None):
+        """Iterate over the collaborators in sso_id order, starting after `sso_id`."""
+        start = 0 if sso_id is None else bisect.bisect_right(self.sso_ids, sso_id)
+        return itertools.islice(self.ordered, start, None)
+
+
+def build_collaborator_directory_cache_key(company_number):
+    return f'{CACHE_KEY_COLLABORATOR_DIRECTORY}-{company_number}'
+
+
+def get_collaborator_directory(sso_session_id, company_number):
+    """Return the company's collaborators, cached once per company."""
+    key = build_collaborator_directory_cache_key(company_number)
+    collaborators = cache.get(key)
+    if collaborators is None:
+
+        def fetch():
+            collaborators = collaborator_list(sso_session_id)
+            cache.set(key=key, value=collaborators, timeout=settings.COLLABORATOR_DIRECTORY_CACHE_TIMEOUT)
+            return collaborators
+
+        collaborators = single_flight.do(key=key, fetch=fetch)
+    return CollaboratorDirectory(collaborators)
+
+
+def clear_cached_collaborator_directory(company_number):
+    cache.delete(build_collaborator_directory_cache_key(company_number))
+
+
+def paginate(items, cursor_key, page_size):
+    """Return the first `page_size` of `items` and the cursor of the page after it.
+
+    `items` is consumed lazily, so at most one item more than the page is
+    read. The cursor is the `cursor_key` of the last item on the page.
+
+    """
+
+    items = list(itertools.islice(items, page_size + 1))
+    next_cursor = cursor_key(items[page_size - 1]) if len(items) > page_size else None
+    return Page(items=items[:page_size], next_cursor=next_cursor)
+
+
+def filter_collaborators(collaborators, role=None, name=None, name_fields=('name', 'company_email')):
+    if role:
+        collaborators = (item for item in collaborators if item['role'] == role)
+    if name:
+        name = name.lower()
+        collaborators = (
+            item for item in collaborators if any(name in (item.get(field) or '').lower() for field in name_fields)
+        )
+    return collaborators
+
+
+def list_collaborators(sso_session_id, company_number, cursor=None, role=None, name=None):
+    directory = get_collaborator_directory(sso_session_id, company_number)
+    return paginate(
+        items=filter_collaborators(directory.iter_after(cursor), role=role, name=name),
+        cursor_key=lambda collaborator: collaborator['sso_id'],
+        page_size=settings.COLLABORATOR_PAGE_SIZE,
+    )
+
+
+def retrieve_collaborator(sso_session_id, company_number, collaborator_sso_id):
+    return get_collaborator_directory(sso_session_id, company_number).get(collaborator_sso_id)
 
 
 def remove_collaborator(sso_session_id, sso_id):
-    response = api_client.company.collaborator_disconnect(sso_session_id=sso_session_id, sso_id=sso_id)
+    response = upstream.call(api_client.company.collaborator_disconnect, sso_session_id=sso_session_id, sso_id=sso_id)
+    request_cache.clear()
+    clear_cached_company_profile(sso_id)
     response.raise_for_status()
     assert response.status_code == 200
 
 
 def disconnect_from_company(sso_session_id):
-    response = api_client.supplier.disconnect_from_company(sso_session_id)
+    response = upstream.call(api_client.supplier.disconnect_from_company, sso_session_id)
+    request_cache.clear()
     response.raise_for_status()
     assert response.status_code == 200
 
 
-def is_sole_admin(sso_session_id):
-    collaborators = collaborator_list(sso_session_id)
-    return [collaborator['role'] for collaborator in collaborators].count(user_roles.ADMIN) == 1
+def is_sole_admin(sso_session_id, company_number):
+    return get_collaborator_directory(sso_session_id, company_number).count_role(user_roles.ADMIN) == 1
 
 
 def collaborator_invite_create(sso_session_id, collaborator_email, role):
     data = {'collaborator_email': collaborator_email, 'role': role}
-    response = api_client.company.collaborator_invite_create(sso_session_id=sso_session_id, data=data)
+    response = upstream.call(api_client.company.collaborator_invite_create, sso_session_id=sso_session_id, data=data)
+    request_cache.clear()
     response.raise_for_status()
 
 
 def collaborator_invite_list(sso_session_id):
-    response = api_client.company.collaborator_invite_list(sso_session_id=sso_session_id)
+    response = request_cache.call(api_client.company.collaborator_invite_list, sso_session_id=sso_session_id)
     response.raise_for_status()
     return response.json()
 
 
+def list_collaborator_invites(sso_session_id, cursor=None, role=None, name=None):
+    """Return a page of the invites that have not been accepted yet, in uuid order."""
+    invites = sorted(
+        (invite for invite in collaborator_invite_list(sso_session_id) if not invite['accepted']),
+        key=lambda invite: invite['uuid'],
+    )
+    if cursor is not None:
+        invites = itertools.dropwhile(lambda invite: invite['uuid'] <= cursor, invites)
+    return paginate(
+        items=filter_collaborators(invites, role=role, name=name, name_fields=('collaborator_email',)),
+        cursor_key=lambda invite: invite['uuid'],
+        page_size=settings.COLLABORATOR_PAGE_SIZE,
+    )
+
+
 def collaborator_invite_delete(sso_session_id, invite_key):
-    response = api_client.company.collaborator_invite_delete(sso_session_id=sso_session_id, invite_key=invite_key)
+    response = upstream.call(
+        api_client.company.collaborator_invite_delete, sso_session_id=sso_session_id, invite_key=invite_key
+    )
+    request_cache.clear()
     response.raise_for_status()
 
 
 def collaborator_role_update(sso_session_id, sso_id, role):
-    response = api_client.company.collaborator_role_update(sso_session_id=sso_session_id, sso_id=sso_id, role=role)
+    response = upstream.call(
+        api_client.company.collaborator_role_update, sso_session_id=sso_session_id, sso_id=sso_id, role=role
+    )
+    request_cache.clear()
     response.raise_for_status()
+
+
+def collaborator_bulk_update(sso_session_id, invites, role_updates, removals):
+    """Invite, change the role of and remove many collaborators at once.
+
+    `invites` is a list of (email, role), `role_updates` a list of (sso_id, role)
+    and `removals` a list of sso_ids. The calls are made concurrently and one
+    failing does not stop the others. Returns the errors of the failed calls,
+    keyed on the email address or sso_id they were for.
+
+    """
+
+    operations = [
+        (email, partial(collaborator_invite_create, sso_session_id, collaborator_email=email, role=role))
+        for email, role in invites
+    ] + [
+        (sso_id, partial(collaborator_role_update, sso_session_id, sso_id=sso_id, role=role))
+        for sso_id, role in role_updates
+    ] + [
+        (sso_id, partial(remove_collaborator, sso_session_id, sso_id=sso_id))
+        for sso_id in removals
+    ]
+    results = run_concurrently(*[call for _, call in operations])
+    request_cache.clear()
+    return {key: error for (key, _), (_, error) in zip(operations, results) if error}
@@ -0,0 +1,131 @@
+import collections
+import io
+import uuid
+
+from directory_api_client.client import api_client
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import DefaultStorage
+
+from core import direct_upload, metrics, upstream
+from core.outbox import MessageRejected, Outbox
+from profile.business_profile import helpers
+
+
+Rendition = collections.namedtuple('Rendition', ['name', 'file', 'extension', 'content_type'])
+
+
+class SessionExpiredError(MessageRejected):
+    pass
+
+
+def has_transparency(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def build_renditions(file, sizes):
+    """Decode an image once and re-encode a copy scaled to fit each of `sizes`.
+
+    `sizes` maps a rendition name to a (width, height) box. Images smaller
+    than a box are not scaled up. The renditions are encoded from the pixels
+    alone, so EXIF and other metadata in the original are dropped. Images
+    with transparency are kept as PNG and others are encoded as JPEG.
+
+    """
+
+    with Image.open(file) as original:
+        # apply the camera orientation before the EXIF that records it is dropped
+        image = ImageOps.exif_transpose(original)
+        if has_transparency(image):
+            image, image_format, extension = image.convert('RGBA'), 'PNG', 'png'
+            options = {'optimize': True}
+        else:
+            image, image_format, extension = image.convert('RGB'), 'JPEG', 'jpg'
+            options = {'optimize': True, 'progressive': True, 'quality': settings.LOGO_JPEG_QUALITY}
+    renditions = []
+    for name, size in sizes.items():
+        rendition = image.copy()
+        rendition.thumbnail(size, Image.LANCZOS)
+        output = io.BytesIO()
+        rendition.save(output, format=image_format, **options)
+        output.seek(0)
+        renditions.append(
+            Rendition(name=name, file=output, extension=extension, content_type=f'image/{image_format.lower()}')
+        )
+    return renditions
+
+
+def build_thumbnail_path(company_number, rendition):
+    return f'{settings.LOGO_THUMBNAIL_PATH}/{company_number}/{rendition.name}.{rendition.extension}'
+
+
+class LogoOutbox(Outbox):
+    """Process uploaded logos out of band and send them to directory-api.
+
+    The original is parked in the direct upload bucket until the worker,
+    `./manage.py process_logos`, picks it up. The 'logo' rendition replaces
+    the company's logo and the others are saved to the public storage as
+    thumbnails.
+
+    directory-api only accepts the logo on behalf of the user, so the worker
+    needs their session id. It is kept out of the message, which can end up
+    in the failed list, and is instead held under its own key for
+    LOGO_SESSION_TIMEOUT seconds.
+
+    """
+
+    def build_session_key(self, session_token):
+        return f'{self.queue_key}-SESSION-{session_token}'
+
+    def enqueue_logo(self, file, sso_session_id, sso_id, company_number):
+        key = direct_upload.build_key(prefix=f'{settings.LOGO_UPLOAD_KEY_PREFIX}/{sso_id}', filename=file.name)
+        # validating the image read the file
+        file.seek(0)
+        direct_upload.upload_object(key=key, file=file, content_type=file.content_type)
+        session_token = uuid.uuid4().hex
+        self.connection.set(
+            self.build_session_key(session_token), sso_session_id, ex=settings.LOGO_SESSION_TIMEOUT
+        )
+        return self.enqueue(key=key, session_token=session_token, sso_id=sso_id, company_number=company_number)
+
+    def send(self, message):
+        session_key = self.build_session_key(message['session_token'])
+        sso_session_id = self.connection.get(session_key)
+        if sso_session_id is None:
+            # the logo can no longer be sent, so the original is not kept for a retry
+            direct_upload.delete_object(message['key'])
+            raise SessionExpiredError(f'Session for outbox message {message["id"]} has expired')
+        filename, file = direct_upload.open_object(message['key'])
+        with file:
+            renditions = build_renditions(file, sizes=settings.LOGO_RENDITION_SIZES)
+        storage = DefaultStorage()
+        for rendition in renditions:
+            if rendition.name == 'logo':
+                logo = rendition
+                continue
+            path = build_thumbnail_path(company_number=message['company_number'], rendition=rendition)
+            # storage does not overwrite files, so remove the previous thumbnail to keep the path stable
+            storage.delete(path)
+            storage.save(path, File(rendition.file))
+        response = upstream.call(
+            api_client.company.profile_update,
+            sso_session_id=sso_session_id.decode(),
+            data={'logo': (f'logo.{logo.extension}', logo.file)},
+        )
+        helpers.clear_cached_company_profile(message['sso_id'])
+        response.raise_for_status()
+        direct_upload.delete_object(message['key'])
+        self.connection.delete(session_key)
+
+
+logo_outbox = LogoOutbox(
+    name='LOGO',
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retry_backoff=settings.OUTBOX_RETRY_BACKOFF,
+    status_timeout=settings.OUTBOX_STATUS_TIMEOUT,
+    worker_timeout=settings.OUTBOX_WORKER_TIMEOUT,
+    failed_max_length=settings.OUTBOX_FAILED_MAX_LENGTH,
+    counter=metrics.logo_outbox,
+)
@@ -1,3 +1,5 @@
+from unittest import mock
+
 from profile.business_profile import forms
 from profile.business_profile import validators
 
@@ -120,3 +122,40 @@ def test_admin_invite_missing_email():
 
     assert form.is_valid() is False
     assert form.errors == {NON_FIELD_ERRORS: [form.MESSAGE_EMAIL_REQUIRED]}
+
+
+@pytest.mark.parametrize('metadata,expected', (
+    (None, forms.CaseStudyRichMediaForm.MESSAGE_UPLOAD_NOT_FOUND),
+    ({'size': 3 * 1024 * 1024, 'content_type': 'image/png'}, 'File is too big.'),
+    ({'size': 100, 'content_type': 'image/gif'}, 'Invalid image format, allowed formats: PNG, JPG, JPEG'),
+))
+@mock.patch.object(forms.direct_upload, 'get_metadata')
+def test_case_study_rich_media_direct_upload_invalid(mock_get_metadata, metadata, expected):
+    mock_get_metadata.return_value = metadata
+    form = forms.CaseStudyRichMediaForm(
+        data={'image_one_key': 'uploads/1/abc/image.png', 'image_one_caption': 'nice'},
+        direct_upload_key_prefix='uploads/1',
+    )
+
+    assert form.is_valid() is False
+    assert form.errors == {'image_one': [expected]}
+
+
+@mock.patch.object(forms.direct_upload, 'get_metadata')
+def test_case_study_rich_media_direct_upload_valid(mock_get_metadata):
+    mock_get_metadata.return_value = {'size': 100, 'content_type': 'image/jpeg'}
+    form = forms.CaseStudyRichMediaForm(
+        data={'image_one_key': 'uploads/1/abc/image.png', 'image_one_caption': 'nice'},
+        direct_upload_key_prefix='uploads/1',
+    )
+
+    assert form.is_valid() is True
+    assert form.cleaned_data['image_one'] == 'uploads/1/abc/image.png'
+    assert 'image_one_key' not in form.cleaned_data
+
+
+def test_case_study_rich_media_image_one_required():
+    form = forms.CaseStudyRichMediaForm(data={'image_one_caption': 'nice'})
+
+    assert form.is_valid() is False
+    assert form.errors == {'image_one': ['This field is required.']}
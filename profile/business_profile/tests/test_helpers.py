@@ -3,7 +3,11 @@ from unittest import mock
 from directory_api_client import api_client
 from directory_constants import company_types
 import pytest
+from requests.exceptions import HTTPError
 
+from django.core.cache import cache
+
+from core.circuit_breaker import CircuitOpenError
 from core.tests.helpers import create_response
 from profile.business_profile import helpers
 
@@ -64,3 +68,197 @@ def test_get_company_profile_not_found(mock_profile_retrieve):
     assert mock_profile_retrieve.call_count == 1
     assert mock_profile_retrieve.call_args == mock.call('1234')
     assert profile is None
+
+
+@mock.patch.object(api_client.company, 'profile_retrieve')
+def test_get_cached_company_profile(mock_profile_retrieve):
+    data = {'name': 'Cool Company'}
+    mock_profile_retrieve.return_value = create_response(data)
+
+    assert helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1) == data
+    assert helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1) == data
+    assert mock_profile_retrieve.call_count == 1
+
+
+@mock.patch.object(api_client.company, 'profile_retrieve')
+def test_get_cached_company_profile_not_found(mock_profile_retrieve, settings):
+    settings.COMPANY_PROFILE_NOT_FOUND_CACHE_TIMEOUT = 10
+    mock_profile_retrieve.return_value = create_response(status_code=404)
+
+    assert helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1) is None
+    assert helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1) is None
+    assert mock_profile_retrieve.call_count == 1
+
+
+@mock.patch.object(api_client.company, 'profile_retrieve')
+def test_get_cached_company_profile_upstream_unavailable(mock_profile_retrieve):
+    data = {'name': 'Cool Company'}
+    mock_profile_retrieve.side_effect = [create_response(data), CircuitOpenError(name='DIRECTORY_API', retry_after=1)]
+
+    helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1)
+    cache.delete(helpers.build_company_profile_cache_key(1))
+
+    assert helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1) == data
+    assert mock_profile_retrieve.call_count == 2
+
+
+@mock.patch.object(api_client.company, 'profile_retrieve')
+def test_get_cached_company_profile_upstream_unavailable_no_fallback(mock_profile_retrieve):
+    mock_profile_retrieve.return_value = create_response(status_code=500)
+
+    with pytest.raises(HTTPError):
+        helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1)
+
+
+@mock.patch.object(api_client.company, 'profile_retrieve')
+def test_clear_cached_company_profile(mock_profile_retrieve):
+    mock_profile_retrieve.return_value = create_response({'name': 'Cool Company'})
+
+    helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1)
+    helpers.clear_cached_company_profile(sso_id=1)
+    helpers.get_cached_company_profile(sso_session_id='1234', sso_id=1)
+
+    assert mock_profile_retrieve.call_count == 2
+
+
+@mock.patch.object(api_client.company, 'collaborator_disconnect')
+@mock.patch.object(api_client.company, 'collaborator_role_update')
+@mock.patch.object(api_client.company, 'collaborator_invite_create')
+def test_collaborator_bulk_update(mock_invite_create, mock_role_update, mock_disconnect):
+    mock_invite_create.side_effect = lambda sso_session_id, data: create_response(
+        status_code=400 if data['collaborator_email'] == 'b@example.com' else 201
+    )
+    mock_role_update.return_value = create_response()
+    mock_disconnect.return_value = create_response(status_code=500)
+
+    errors = helpers.collaborator_bulk_update(
+        sso_session_id='123',
+        invites=[('a@example.com', 'MEMBER'), ('b@example.com', 'ADMIN')],
+        role_updates=[(1, 'ADMIN')],
+        removals=[2],
+    )
+
+    assert mock_invite_create.call_count == 2
+    assert mock_role_update.call_args == mock.call(sso_session_id='123', sso_id=1, role='ADMIN')
+    assert mock_disconnect.call_args == mock.call(sso_session_id='123', sso_id=2)
+    assert list(errors) == ['b@example.com', 2]
+    assert all(isinstance(error, HTTPError) for error in errors.values())
+
+
+@pytest.fixture
+def collaborators():
+    return [
+        {'sso_id': 1, 'role': 'ADMIN', 'company_email': 'Jim@example.com', 'name': 'jim'},
+        {'sso_id': 2, 'role': 'MEMBER', 'company_email': 'bob@example.com', 'name': 'bob'},
+        {'sso_id': 3, 'role': 'MEMBER', 'company_email': 'sam@example.com', 'name': 'sam'},
+    ]
+
+
+def test_collaborator_directory_indexes(collaborators):
+    directory = helpers.CollaboratorDirectory(collaborators)
+
+    assert len(directory) == 3
+    assert list(directory) == collaborators
+    assert directory.get(2) == collaborators[1]
+    assert directory.get(4) is None
+    assert directory.get_by_email('jim@EXAMPLE.com') == collaborators[0]
+    assert directory.with_role('MEMBER') == collaborators[1:]
+    assert directory.count_role('ADMIN') == 1
+    assert directory.count_role('EDITOR') == 0
+
+
+@mock.patch.object(api_client.company, 'collaborator_list')
+def test_get_collaborator_directory_cached(mock_collaborator_list, collaborators):
+    mock_collaborator_list.return_value = create_response(collaborators)
+
+    helpers.get_collaborator_directory(sso_session_id='123', company_number='12345678')
+    directory = helpers.get_collaborator_directory(sso_session_id='123', company_number='12345678')
+
+    assert mock_collaborator_list.call_count == 1
+    assert directory.collaborators == collaborators
+    # the raw list is cached so the index can change without a cache flush
+    assert cache.get(helpers.build_collaborator_directory_cache_key('12345678')) == collaborators
+
+
+@mock.patch.object(api_client.company, 'collaborator_list')
+def test_get_collaborator_directory_shared_by_company(mock_collaborator_list, collaborators):
+    mock_collaborator_list.return_value = create_response(collaborators)
+
+    helpers.get_collaborator_directory(sso_session_id='123', company_number='12345678')
+    helpers.get_collaborator_directory(sso_session_id='456', company_number='12345678')
+
+    assert mock_collaborator_list.call_count == 1
+
+
+@mock.patch.object(api_client.company, 'collaborator_list')
+def test_clear_cached_collaborator_directory(mock_collaborator_list, collaborators):
+    mock_collaborator_list.return_value = create_response(collaborators)
+    helpers.get_collaborator_directory(sso_session_id='123', company_number='12345678')
+    cache.set(helpers.build_collaborator_directory_cache_key('87654321'), 'other company')
+
+    helpers.clear_cached_collaborator_directory('12345678')
+
+    assert cache.get(helpers.build_collaborator_directory_cache_key('12345678')) is None
+    assert cache.get(helpers.build_collaborator_directory_cache_key('87654321')) == 'other company'
+
+
+@pytest.mark.parametrize('roles,expected', ((['ADMIN', 'MEMBER'], True), (['ADMIN', 'ADMIN'], False)))
+@mock.patch.object(api_client.company, 'collaborator_list')
+def test_is_sole_admin(mock_collaborator_list, roles, expected):
+    mock_collaborator_list.return_value = create_response([
+        {'sso_id': sso_id, 'role': role, 'company_email': f'{sso_id}@example.com'}
+        for sso_id, role in enumerate(roles)
+    ])
+
+    assert helpers.is_sole_admin(sso_session_id='123', company_number='12345678') is expected
+
+
+def test_paginate():
+    page = helpers.paginate(iter(range(10)), cursor_key=str, page_size=3)
+
+    assert page == helpers.Page(items=[0, 1, 2], next_cursor='2')
+
+
+def test_paginate_last_page():
+    page = helpers.paginate(iter(range(3)), cursor_key=str, page_size=3)
+
+    assert page == helpers.Page(items=[0, 1, 2], next_cursor=None)
+
+
+@pytest.mark.parametrize('kwargs,expected_sso_ids,expected_cursor', (
+    ({}, [1, 2], 2),
+    ({'cursor': 2}, [3], None),
+    ({'role': 'MEMBER'}, [2, 3], None),
+    ({'name': 'JIM'}, [1], None),
+    ({'name': 'sam@'}, [3], None),
+))
+@mock.patch.object(api_client.company, 'collaborator_list')
+def test_list_collaborators(
+    mock_collaborator_list, kwargs, expected_sso_ids, expected_cursor, collaborators, settings
+):
+    settings.COLLABORATOR_PAGE_SIZE = 2
+    mock_collaborator_list.return_value = create_response(list(reversed(collaborators)))
+
+    page = helpers.list_collaborators(sso_session_id='123', company_number='12345678', **kwargs)
+
+    assert [item['sso_id'] for item in page.items] == expected_sso_ids
+    assert page.next_cursor == expected_cursor
+
+
+@mock.patch.object(api_client.company, 'collaborator_invite_list')
+def test_list_collaborator_invites(mock_collaborator_invite_list, settings):
+    settings.COLLABORATOR_PAGE_SIZE = 1
+    mock_collaborator_invite_list.return_value = create_response([
+        {'uuid': 'c', 'collaborator_email': 'c@example.com', 'role': 'MEMBER', 'accepted': False},
+        {'uuid': 'a', 'collaborator_email': 'a@example.com', 'role': 'ADMIN', 'accepted': False},
+        {'uuid': 'b', 'collaborator_email': 'b@example.com', 'role': 'MEMBER', 'accepted': True},
+    ])
+
+    first_page = helpers.list_collaborator_invites(sso_session_id='123')
+    second_page = helpers.list_collaborator_invites(sso_session_id='123', cursor=first_page.next_cursor)
+    filtered_page = helpers.list_collaborator_invites(sso_session_id='123', role='MEMBER')
+
+    assert first_page == helpers.Page(items=[mock_collaborator_invite_list.return_value.json()[1]], next_cursor='a')
+    assert [item['uuid'] for item in second_page.items] == ['c']
+    assert second_page.next_cursor is None
+    assert [item['uuid'] for item in filtered_page.items] == ['c']
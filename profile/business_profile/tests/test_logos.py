@@ -0,0 +1,172 @@
+import json
+from unittest import mock
+
+from directory_api_client.client import api_client
+from PIL import Image
+import pytest
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+
+from core import direct_upload
+from core.outbox import Outbox
+from core.tests.helpers import create_image, create_response
+from profile.business_profile import logos
+
+
+@pytest.fixture(autouse=True)
+def mock_client():
+    client = mock.Mock()
+    client.download_fileobj.side_effect = lambda Bucket, Key, Fileobj: Fileobj.write(
+        create_image('PNG', size=(1200, 900), mode='RGBA').read()
+    )
+    # passing `new` stops mock inspecting, and so building, the lazily created real client
+    patch = mock.patch.object(direct_upload, 'client', new=client)
+    patch.start()
+    yield client
+    patch.stop()
+
+
+@pytest.fixture(autouse=True)
+def mock_storage():
+    patch = mock.patch.object(logos, 'DefaultStorage')
+    yield patch.start().return_value
+    patch.stop()
+
+
+@pytest.fixture(autouse=True)
+def mock_profile_update():
+    patch = mock.patch.object(api_client.company, 'profile_update', return_value=create_response())
+    yield patch.start()
+    patch.stop()
+
+
+def enqueue_logo():
+    return logos.logo_outbox.enqueue_logo(
+        file=SimpleUploadedFile(name='logo.png', content=b'image', content_type='image/png'),
+        sso_session_id='123',
+        sso_id=1,
+        company_number='12345678',
+    )
+
+
+def test_build_renditions_fits_each_size():
+    file = create_image('PNG', size=(1200, 900), mode='RGBA')
+
+    renditions = logos.build_renditions(file, sizes={'logo': (600, 600), 'small': (100, 100)})
+
+    assert [rendition.name for rendition in renditions] == ['logo', 'small']
+    assert [Image.open(rendition.file).size for rendition in renditions] == [(600, 450), (100, 75)]
+
+
+def test_build_renditions_does_not_scale_up():
+    file = create_image('PNG', size=(50, 50), mode='RGBA')
+
+    rendition, = logos.build_renditions(file, sizes={'logo': (600, 600)})
+
+    assert Image.open(rendition.file).size == (50, 50)
+
+
+def test_build_renditions_keeps_transparent_images_as_png():
+    file = create_image('PNG', size=(50, 50), mode='RGBA')
+
+    rendition, = logos.build_renditions(file, sizes={'logo': (600, 600)})
+
+    assert rendition.extension == 'png'
+    assert rendition.content_type == 'image/png'
+    assert Image.open(rendition.file).format == 'PNG'
+
+
+def test_build_renditions_encodes_opaque_images_as_jpeg():
+    file = create_image('PNG', size=(50, 50), mode='RGB')
+
+    rendition, = logos.build_renditions(file, sizes={'logo': (600, 600)})
+
+    assert rendition.extension == 'jpg'
+    assert rendition.content_type == 'image/jpeg'
+    assert Image.open(rendition.file).format == 'JPEG'
+
+
+def test_build_renditions_strips_metadata():
+    exif = Image.Exif()
+    exif[0x010f] = 'Camera maker'
+    file = create_image('JPEG', size=(50, 50), mode='RGB', exif=exif.tobytes())
+
+    rendition, = logos.build_renditions(file, sizes={'logo': (600, 600)})
+
+    assert 'exif' not in Image.open(rendition.file).info
+
+
+def test_enqueue_logo_parks_original(mock_client, mock_profile_update):
+    message_id = enqueue_logo()
+
+    assert mock_client.upload_fileobj.call_count == 1
+    assert mock_client.upload_fileobj.call_args[1]['Key'].startswith('logo-uploads/1/')
+    assert mock_client.upload_fileobj.call_args[1]['ExtraArgs'] == {'ContentType': 'image/png'}
+    assert mock_profile_update.call_count == 0
+    assert logos.logo_outbox.get_status(message_id) == Outbox.STATUS_PENDING
+
+
+def test_enqueue_logo_keeps_session_id_out_of_message(settings):
+    enqueue_logo()
+    connection = logos.logo_outbox.connection
+
+    message = json.loads(connection.lindex(logos.logo_outbox.queue_key, 0))
+
+    assert 'sso_session_id' not in message
+    assert '123' not in message.values()
+    session_key = logos.logo_outbox.build_session_key(message['session_token'])
+    assert connection.get(session_key) == b'123'
+    assert 0 < connection.ttl(session_key) <= settings.LOGO_SESSION_TIMEOUT
+
+
+def test_drain_sends_logo_and_saves_thumbnails(mock_client, mock_storage, mock_profile_update, settings):
+    settings.LOGO_RENDITION_SIZES = {'logo': (600, 600), 'thumbnail-small': (100, 100)}
+    message_id = enqueue_logo()
+    key = mock_client.upload_fileobj.call_args[1]['Key']
+
+    assert logos.logo_outbox.drain() == 1
+
+    assert logos.logo_outbox.get_status(message_id) == Outbox.STATUS_SENT
+    assert mock_profile_update.call_count == 1
+    assert mock_profile_update.call_args == mock.call(sso_session_id='123', data={'logo': ('logo.png', mock.ANY)})
+    logo = Image.open(mock_profile_update.call_args[1]['data']['logo'][1])
+    assert logo.size == (600, 450)
+    assert mock_storage.delete.call_args == mock.call('company-logos/12345678/thumbnail-small.png')
+    assert mock_storage.save.call_count == 1
+    assert mock_storage.save.call_args[0][0] == 'company-logos/12345678/thumbnail-small.png'
+    assert mock_client.delete_object.call_args == mock.call(Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME, Key=key)
+    assert not logos.logo_outbox.connection.keys(logos.logo_outbox.build_session_key('*'))
+
+
+def test_drain_retries_failed_update(mock_client, mock_profile_update):
+    mock_profile_update.return_value = create_response(status_code=502)
+    message_id = enqueue_logo()
+
+    assert logos.logo_outbox.drain() == 1
+
+    assert logos.logo_outbox.get_status(message_id) == Outbox.STATUS_RETRYING
+    # the original is kept for the retry
+    assert mock_client.delete_object.call_count == 0
+
+
+def test_drain_gives_up_once_session_expired(mock_client, mock_profile_update, settings):
+    message_id = enqueue_logo()
+    key = mock_client.upload_fileobj.call_args[1]['Key']
+    connection = logos.logo_outbox.connection
+    connection.delete(*connection.keys(logos.logo_outbox.build_session_key('*')))
+
+    assert logos.logo_outbox.drain() == 1
+
+    assert logos.logo_outbox.get_status(message_id) == Outbox.STATUS_FAILED
+    assert mock_profile_update.call_count == 0
+    assert mock_client.delete_object.call_args == mock.call(Bucket=settings.DIRECT_UPLOAD_BUCKET_NAME, Key=key)
+    assert connection.zcard(logos.logo_outbox.delayed_key) == 0
+
+
+def test_process_logos_command_once(mock_profile_update):
+    enqueue_logo()
+
+    call_command('process_logos', '--once')
+
+    assert mock_profile_update.call_count == 1
@@ -9,11 +9,13 @@ import pytest
 from PIL import Image, ImageDraw
 from requests.exceptions import HTTPError
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.forms.forms import NON_FIELD_ERRORS
 
-from core.tests.helpers import create_response, submit_step_factory
+from core.circuit_breaker import CircuitOpenError
+from core.tests.helpers import create_image, create_response, submit_step_factory
 from profile.business_profile import constants, forms, helpers, views
 from directory_constants import urls
 
@@ -302,6 +304,26 @@ def test_edit_page_submmit_success(
     )
 
 
+def test_edit_page_submit_circuit_open(client, mock_update_company, user):
+    mock_update_company.side_effect = CircuitOpenError(name='directory_api_client', retry_after=10)
+    client.force_login(user)
+
+    response = client.post(reverse('business-profile-website'), {'website': 'https://example.com'})
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '11'
+
+
+def test_edit_page_submit_success_clears_cached_company(client, mock_retrieve_company, user):
+    client.force_login(user)
+
+    client.get(reverse('business-profile-website'))
+    client.post(reverse('business-profile-website'), {'website': 'https://example.com'})
+    client.get(reverse('business-profile-website'))
+
+    assert mock_retrieve_company.call_count == 2
+
+
 def test_publish_not_publishable(client, user, mock_retrieve_company, company_profile_data):
     client.force_login(user)
     mock_retrieve_company.return_value = create_response({**company_profile_data, 'is_publishable': False})
@@ -374,6 +396,49 @@ def test_edit_page_logo_submmit_success(client, mock_update_company, user):
     )
 
 
+@mock.patch('profile.business_profile.logos.logo_outbox.enqueue_logo')
+def test_edit_page_logo_submit_processing_on(mock_enqueue_logo, client, mock_update_company, user, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'LOGO_PROCESSING_ON': True}
+    client.force_login(user)
+    url = reverse('business-profile-logo')
+    data = {
+        'logo': SimpleUploadedFile(
+            name='image.png',
+            content=create_image(size=(300, 50)).read(),
+            content_type='image/png',
+        )
+    }
+
+    response = client.post(url, data)
+
+    assert response.status_code == 302
+    assert response.url == reverse('business-profile')
+    assert mock_update_company.call_count == 0
+    assert mock_enqueue_logo.call_count == 1
+    assert mock_enqueue_logo.call_args == mock.call(
+        file=mock.ANY, sso_session_id=user.session_id, sso_id=user.id, company_number='1234567'
+    )
+
+
+def test_edit_page_logo_submit_too_big(client, mock_update_company, user, settings):
+    settings.UPLOAD_MAX_SIZE_BYTES = {'logo': 10}
+    client.force_login(user)
+    url = reverse('business-profile-logo')
+    data = {
+        'logo': SimpleUploadedFile(
+            name='image.png',
+            content=create_image(size=(300, 50)).read(),
+            content_type='image/png',
+        )
+    }
+
+    response = client.post(url, data)
+
+    assert response.status_code == 200
+    assert response.context_data['form'].errors == {'logo': ['File is too big.']}
+    assert mock_update_company.call_count == 0
+
+
 @pytest.mark.parametrize('url,data', zip(edit_urls, edit_data))
 def test_edit_page_submmit_error(
     client, mock_update_company, url, data, user
@@ -404,6 +469,115 @@ def test_case_study_create(
     assert mock_case_study_create.call_count == 1
 
 
+@mock.patch.object(views.direct_upload, 'delete_objects')
+@mock.patch.object(views.direct_upload, 'open_object')
+@mock.patch.object(forms.direct_upload, 'get_metadata')
+def test_case_study_create_direct_upload(
+    mock_get_metadata, mock_open_object, mock_delete_objects, submit_case_study_create_step, mock_case_study_create,
+    case_study_data, client, user
+):
+    mock_get_metadata.return_value = {'size': 100, 'content_type': 'image/png'}
+    mock_open_object.return_value = ('image-one.png', BytesIO(b'image'))
+    key = f'case-study-uploads/{user.id}/1234/image-one.png'
+    client.force_login(user)
+
+    submit_case_study_create_step(case_study_data[views.BASIC])
+    data = {**case_study_data[views.MEDIA], 'image_one': '', 'image_one_key': key}
+    response = submit_case_study_create_step(data)
+    assert response.status_code == 302
+
+    client.get(response.url)
+
+    assert mock_open_object.call_args == mock.call(key)
+    assert mock_case_study_create.call_count == 1
+    assert mock_case_study_create.call_args[1]['data']['image_one'] == mock_open_object.return_value
+    assert 'image_one_key' not in mock_case_study_create.call_args[1]['data']
+    assert mock_delete_objects.call_args == mock.call([key])
+
+
+@mock.patch.object(views.direct_upload, 'delete_objects')
+@mock.patch.object(views.direct_upload, 'open_object')
+@mock.patch.object(forms.direct_upload, 'get_metadata')
+def test_case_study_create_direct_upload_kept_if_create_fails(
+    mock_get_metadata, mock_open_object, mock_delete_objects, submit_case_study_create_step, mock_case_study_create,
+    case_study_data, client, user
+):
+    mock_get_metadata.return_value = {'size': 100, 'content_type': 'image/png'}
+    mock_open_object.return_value = ('image-one.png', BytesIO(b'image'))
+    mock_case_study_create.return_value = create_response(status_code=400)
+    key = f'case-study-uploads/{user.id}/1234/image-one.png'
+    client.force_login(user)
+
+    submit_case_study_create_step(case_study_data[views.BASIC])
+    # no files are uploaded through the wizard, as it is not reset to delete them when done fails
+    data = {**case_study_data[views.MEDIA], 'image_one': '', 'image_one_key': key, 'image_two': ''}
+    response = submit_case_study_create_step(data)
+
+    with pytest.raises(HTTPError):
+        client.get(response.url)
+
+    assert mock_delete_objects.call_count == 0
+
+
+@mock.patch.object(forms.direct_upload, 'get_metadata')
+def test_case_study_create_direct_upload_other_users_key(
+    mock_get_metadata, submit_case_study_create_step, case_study_data, client, user
+):
+    client.force_login(user)
+
+    submit_case_study_create_step(case_study_data[views.BASIC])
+    data = {**case_study_data[views.MEDIA], 'image_one': '', 'image_one_key': 'case-study-uploads/2/1234/image.png'}
+    response = submit_case_study_create_step(data)
+
+    assert response.status_code == 200
+    assert response.context_data['form'].errors == {
+        'image_one': [forms.CaseStudyRichMediaForm.MESSAGE_UPLOAD_NOT_FOUND]
+    }
+    assert mock_get_metadata.call_count == 0
+
+
+def test_case_study_media_upload_feature_off(client, user, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'CASE_STUDY_DIRECT_UPLOAD_ON': False}
+    client.force_login(user)
+
+    url = reverse('business-profile-case-study-media-upload')
+    response = client.post(url, {'filename': 'image.png', 'content_type': 'image/png'})
+
+    assert response.status_code == 404
+
+
+@mock.patch.object(views.direct_upload, 'create_presigned_post')
+def test_case_study_media_upload(mock_create_presigned_post, client, user, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'CASE_STUDY_DIRECT_UPLOAD_ON': True}
+    mock_create_presigned_post.return_value = {'url': 'https://bucket.s3.amazonaws.com', 'fields': {'key': 'k'}}
+    client.force_login(user)
+
+    url = reverse('business-profile-case-study-media-upload')
+    response = client.post(url, {'filename': 'my image.png', 'content_type': 'image/png'})
+
+    assert response.status_code == 200
+    key = response.json()['key']
+    assert key.startswith(f'case-study-uploads/{user.id}/')
+    assert key.endswith('/my_image.png')
+    assert response.json() == {'key': key, **mock_create_presigned_post.return_value}
+    assert mock_create_presigned_post.call_args == mock.call(
+        key=key, max_size=settings.VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES, content_types=['image/png', 'image/jpeg']
+    )
+
+
+@mock.patch.object(views.direct_upload, 'create_presigned_post')
+def test_case_study_media_upload_invalid(mock_create_presigned_post, client, user, settings):
+    settings.FEATURE_FLAGS = {**settings.FEATURE_FLAGS, 'CASE_STUDY_DIRECT_UPLOAD_ON': True}
+    client.force_login(user)
+
+    url = reverse('business-profile-case-study-media-upload')
+    response = client.post(url, {'filename': 'video.mp4', 'content_type': 'video/mp4'})
+
+    assert response.status_code == 400
+    assert 'content_type' in response.json()
+    assert mock_create_presigned_post.call_count == 0
+
+
 def test_case_study_edit_foo(
     submit_case_study_edit_step, mock_case_study_retrieve, client,
     mock_case_study_update, case_study_data,
@@ -755,8 +929,10 @@ def test_request_identity_verification(mock_verify_identity_request, client, use
 
 
 @mock.patch.object(api_client.company, 'verify_identity_request')
-def test_request_identity_verification_already_sent(mock_verify_identity_request, client, user):
-    user.company.data['is_identity_check_message_sent'] = True
+def test_request_identity_verification_already_sent(
+    mock_verify_identity_request, company_profile_data, client, user
+):
+    company_profile_data['is_identity_check_message_sent'] = True
     client.force_login(user)
 
     url = reverse('business-profile-request-to-verify')
@@ -879,6 +1055,172 @@ def test_edit_collaborator_edit_remove_collaborator(mock_collaborator_disconnect
     assert mock_collaborator_disconnect.call_args == mock.call(sso_session_id=user.session_id, sso_id=1234)
 
 
+def test_admin_collaborators_list_paginated(client, user, settings):
+    settings.COLLABORATOR_PAGE_SIZE = 1
+    client.force_login(user)
+    url = reverse('business-profile-admin-tools')
+
+    response = client.get(url)
+
+    assert [item['sso_id'] for item in response.context_data['collaborators']] == [1]
+    assert response.context_data['next_page_querystring'] == 'cursor=1'
+    assert 'first_page_querystring' not in response.context_data
+
+    response = client.get(url, {'cursor': 1})
+
+    assert [item['sso_id'] for item in response.context_data['collaborators']] == [1234]
+    assert 'next_page_querystring' not in response.context_data
+    assert response.context_data['first_page_querystring'] == ''
+
+
+@pytest.mark.parametrize('params,expected', (
+    ({'role': user_roles.ADMIN}, [1]),
+    ({'name': 'BOB'}, [1234]),
+    ({'cursor': 'nope'}, [1, 1234]),
+    ({'role': 'nope'}, [1, 1234]),
+))
+def test_admin_collaborators_list_filtered(client, user, params, expected):
+    client.force_login(user)
+
+    response = client.get(reverse('business-profile-admin-tools'), params)
+
+    assert [item['sso_id'] for item in response.context_data['collaborators']] == expected
+
+
+def test_admin_invite_collaborator_list_paginated(mock_collaborator_invite_list, client, user, settings):
+    settings.COLLABORATOR_PAGE_SIZE = 1
+    mock_collaborator_invite_list.return_value = create_response([
+        {'uuid': uuid, 'collaborator_email': f'{uuid}@example.com', 'role': user_roles.MEMBER, 'accepted': False}
+        for uuid in ['b', 'a']
+    ])
+    client.force_login(user)
+    url = reverse('business-profile-admin-invite-collaborator')
+
+    response = client.get(url, {'role': user_roles.MEMBER})
+
+    assert [item['uuid'] for item in response.context_data['collaborator_invites']] == ['a']
+    assert response.context_data['next_page_querystring'] == f'role={user_roles.MEMBER}&cursor=a'
+
+    response = client.get(url, {'role': user_roles.MEMBER, 'cursor': 'a'})
+
+    assert [item['uuid'] for item in response.context_data['collaborator_invites']] == ['b']
+
+
+@mock.patch.object(api_client.company, 'collaborator_disconnect')
+def test_edit_collaborator_clears_collaborator_directory(
+    mock_collaborator_disconnect, mock_collaborator_list, client, user
+):
+    mock_collaborator_disconnect.return_value = create_response()
+    client.force_login(user)
+
+    client.get(reverse('business-profile-admin-tools'))
+    client.get(reverse('business-profile-admin-collaborator-edit', kwargs={'sso_id': 1234}))
+    assert mock_collaborator_list.call_count == 1
+
+    client.post(
+        reverse('business-profile-admin-collaborator-edit', kwargs={'sso_id': 1234}),
+        data={'action': forms.REMOVE_COLLABORATOR}
+    )
+    mock_collaborator_list.return_value = create_response([
+        {'sso_id': user.id, 'role': user_roles.ADMIN, 'company_email': user.email, 'name': 'jim example'},
+    ])
+    response = client.get(reverse('business-profile-admin-tools'))
+
+    assert mock_collaborator_list.call_count == 2
+    assert [item['sso_id'] for item in response.context_data['collaborators']] == [user.id]
+
+
+def test_admin_collaborator_bulk_excludes_current_user(client, user):
+    client.force_login(user)
+
+    response = client.get(reverse('business-profile-admin-collaborator-bulk'))
+
+    assert response.status_code == 200
+    assert [item['sso_id'] for item in response.context_data['form'].collaborators] == [1234]
+
+
+@mock.patch.object(api_client.company, 'collaborator_disconnect')
+@mock.patch.object(api_client.company, 'collaborator_invite_create')
+def test_admin_collaborator_bulk(
+    mock_collaborator_invite_create, mock_collaborator_disconnect, mock_collaborator_list,
+    mock_collaborator_role_update, client, user
+):
+    mock_collaborator_list.return_value = create_response([
+        {'sso_id': user.id, 'role': user_roles.ADMIN, 'company_email': user.email, 'name': 'jim example'},
+        {'sso_id': 1234, 'role': user_roles.EDITOR, 'company_email': 'bob@example.com', 'name': 'bob example'},
+        {'sso_id': 1235, 'role': user_roles.MEMBER, 'company_email': 'sam@example.com', 'name': 'sam example'},
+        {'sso_id': 1236, 'role': user_roles.MEMBER, 'company_email': 'ann@example.com', 'name': 'ann example'},
+    ])
+    mock_collaborator_invite_create.return_value = create_response(status_code=201)
+    mock_collaborator_disconnect.return_value = create_response()
+    client.force_login(user)
+
+    url = reverse('business-profile-admin-collaborator-bulk')
+    response = client.post(url, {
+        'collaborator_emails': 'a@example.com, b@example.com\na@example.com',
+        'role': user_roles.MEMBER,
+        'action_1234': forms.CHANGE_COLLABORATOR_TO_MEMBER,
+        'action_1235': forms.REMOVE_COLLABORATOR,
+        'action_1236': '',
+    })
+
+    assert response.status_code == 302
+    assert response.url == reverse('business-profile-admin-tools')
+    assert sorted(mock_collaborator_invite_create.call_args_list, key=str) == [
+        mock.call(sso_session_id=user.session_id, data={'collaborator_email': email, 'role': user_roles.MEMBER})
+        for email in ['a@example.com', 'b@example.com']
+    ]
+    assert mock_collaborator_role_update.call_args_list == [
+        mock.call(sso_session_id=user.session_id, sso_id=1234, role=user_roles.MEMBER)
+    ]
+    assert mock_collaborator_disconnect.call_args_list == [mock.call(sso_session_id=user.session_id, sso_id=1235)]
+
+    response = client.get(response.url)
+    assert [str(message) for message in response.context['messages']] == ['4 collaborator changes made']
+
+
+@mock.patch.object(api_client.company, 'collaborator_invite_create')
+def test_admin_collaborator_bulk_partial_failure(mock_collaborator_invite_create, client, user):
+    mock_collaborator_invite_create.return_value = create_response(status_code=400)
+    client.force_login(user)
+
+    url = reverse('business-profile-admin-collaborator-bulk')
+    response = client.post(url, {
+        'collaborator_emails': 'a@example.com',
+        'role': user_roles.MEMBER,
+        'action_1234': forms.CHANGE_COLLABORATOR_TO_MEMBER,
+    })
+
+    assert response.status_code == 302
+
+    response = client.get(response.url)
+    assert [str(message) for message in response.context['messages']] == [
+        '1 collaborator change made',
+        'Could not update a@example.com',
+    ]
+
+
+@pytest.mark.parametrize('data,expected', (
+    ({}, {NON_FIELD_ERRORS: [forms.AdminCollaboratorBulkForm.MESSAGE_NO_CHANGES]}),
+    ({'collaborator_emails': 'a@example.com'}, {'role': [forms.AdminCollaboratorBulkForm.MESSAGE_ROLE_REQUIRED]}),
+    (
+        {'collaborator_emails': 'a@example.com, nope', 'role': user_roles.MEMBER},
+        {'collaborator_emails': ['nope is not a valid email address']}
+    ),
+    ({'action_1234': forms.CHANGE_COLLABORATOR_TO_MEMBER}, {}),
+))
+def test_admin_collaborator_bulk_validation(data, expected, client, user):
+    client.force_login(user)
+
+    response = client.post(reverse('business-profile-admin-collaborator-bulk'), data)
+
+    if expected:
+        assert response.status_code == 200
+        assert response.context_data['form'].errors == expected
+    else:
+        assert response.status_code == 302
+
+
 @mock.patch.object(api_client.supplier, 'disconnect_from_company')
 def test_admin_disconnect_remote_validation_error(mock_disconnect_from_company, client, user):
     errors = ['Something went wrong']
@@ -917,6 +1259,20 @@ def test_admin_disconnect(mock_disconnect_from_company, client, user):
     assert mock_disconnect_from_company.call_args == mock.call(user.session_id)
 
 
+@mock.patch.object(api_client.supplier, 'disconnect_from_company')
+def test_admin_disconnect_clears_company_collaborators(
+    mock_disconnect_from_company, client, user, company_profile_data
+):
+    mock_disconnect_from_company.return_value = create_response()
+    key = helpers.build_collaborator_directory_cache_key(company_profile_data['number'])
+    cache.set(key, [])
+    client.force_login(user)
+
+    client.post(reverse('business-profile-admin-disconnect'))
+
+    assert cache.get(key) is None
+
+
 @pytest.mark.parametrize('count,expected', ((1, True), (2, False),))
 def test_admin_disconnect_is_sole_collaborator(mock_collaborator_list, count, expected, client, user):
     collaborators = [
@@ -1001,7 +1357,8 @@ def test_admin_invite_administrator_change_role(mock_collaborator_role_update, c
 @pytest.mark.parametrize('url', (
     reverse('business-profile-admin-invite-administrator'),
     reverse('business-profile-admin-invite-collaborator'),
-    reverse('business-profile-admin-collaborator-edit', kwargs={'sso_id': '123'})
+    reverse('business-profile-admin-collaborator-edit', kwargs={'sso_id': '123'}),
+    reverse('business-profile-admin-collaborator-bulk'),
 ))
 def test_admin_not_admin_role(mock_retrieve_supplier, client, user, url):
     mock_retrieve_supplier.return_value = create_response({'is_company_owner': False, 'role': user_roles.EDITOR})
@@ -1019,6 +1376,7 @@ def test_admin_not_admin_role(mock_retrieve_supplier, client, user, url):
     reverse('business-profile-admin-collaborator-edit', kwargs={'sso_id': '123'}),
     reverse('business-profile-admin-tools'),
     reverse('business-profile-admin-disconnect'),
+    reverse('business-profile-admin-collaborator-bulk'),
 ))
 def test_admin_anon_user(client, settings, url):
     response = client.get(url)
@@ -1103,6 +1461,17 @@ def test_business_profile_member_redirect(client, user, mock_retrieve_supplier,
     )
 
 
+def test_business_profile_prefetch(client, user, mock_retrieve_company, mock_retrieve_supplier):
+    client.force_login(user)
+
+    response = client.get(reverse('business-profile'))
+
+    assert response.status_code == 200
+    assert mock_retrieve_company.call_count == 1
+    assert mock_retrieve_supplier.call_count == 1
+    assert len(response.wsgi_request.upstream_calls) == 2
+
+
 def test_fab_redirect(client, user):
     client.force_login(user)
 
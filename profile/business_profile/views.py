@@ -1,20 +1,29 @@
+from functools import partial
+
 from directory_constants import user_roles
 from directory_api_client.client import api_client
 from formtools.wizard.views import NamedUrlSessionWizardView
 from raven.contrib.django.raven_compat.models import client as sentry_client
 from requests.exceptions import HTTPError, RequestException
 
+from django.conf import settings
 from django.contrib import messages
 from django.urls import reverse, reverse_lazy
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.files.storage import DefaultStorage
+from django.http import JsonResponse
 from django.shortcuts import redirect, Http404
 from django.utils.functional import cached_property
+from django.utils.translation import ngettext
+from django.views import View
 from django.views.generic import TemplateView, FormView
 
 import core.mixins
 import core.forms
-from profile.business_profile import forms, helpers
+from core import direct_upload, upstream
+from core.circuit_breaker import CircuitOpenError
+from core.cache import request_cache
+from profile.business_profile import forms, helpers, logos
 from directory_constants import urls
 
 BASIC = 'details'
@@ -27,6 +36,8 @@ class DisconnectFromCompanyMixin:
     success_url = reverse_lazy('business-profile')
 
     def form_valid(self, form):
+        # read before disconnecting, as afterwards the user has no company
+        company_number = self.request.user.company.data['number']
         try:
             helpers.disconnect_from_company(self.request.user.session_id)
         except HTTPError as error:
@@ -35,14 +46,21 @@ class DisconnectFromCompanyMixin:
                 return self.form_invalid(form)
             else:
                 raise
+        finally:
+            helpers.clear_cached_company_profile(self.request.user.id)
+            helpers.clear_cached_collaborator_directory(company_number)
         return super().form_valid(form)
 
 
-class BusinessProfileView(TemplateView):
+class BusinessProfileView(core.mixins.PrefetchMixin, TemplateView):
     template_name_fab_user = 'business_profile/profile.html'
     template_name_not_fab_user = 'business_profile/is-not-business-profile-user.html'
     template_business_profile_member = 'business_profile/business-profile-member.html'
 
+    def get_prefetch_calls(self):
+        user = self.request.user
+        return [partial(getattr, user, 'company'), partial(getattr, user, 'supplier')]
+
     def get_template_names(self, *args, **kwargs):
         if self.request.user.company:
             if self.request.user.role == user_roles.MEMBER:
@@ -80,11 +98,17 @@ class BaseFormView(FormView):
 
     def form_valid(self, form):
         try:
-            response = api_client.company.profile_update(
+            response = upstream.call(
+                api_client.company.profile_update,
                 sso_session_id=self.request.user.session_id,
                 data=self.serialize_form(form)
             )
+            request_cache.clear()
+            helpers.clear_cached_company_profile(self.request.user.id)
             response.raise_for_status()
+        except CircuitOpenError:
+            # answered with a 503 by core.middleware.CircuitOpenMiddleware
+            raise
         except RequestException:
             self.send_update_error_to_sentry(
                 user=self.request.user,
@@ -138,12 +162,26 @@ class WebsiteFormView(BaseFormView):
     success_message = 'Website updated'
 
 
-class LogoFormView(BaseFormView):
+class LogoFormView(core.mixins.OversizedUploadMixin, BaseFormView):
     def get_initial(self):
         return {}
     form_class = forms.LogoForm
     template_name = 'business_profile/logo-form.html'
     success_message = 'Logo updated'
+    processing_message = 'Logo uploaded. It will appear on your business profile in a few minutes.'
+
+    def form_valid(self, form):
+        if not settings.FEATURE_FLAGS['LOGO_PROCESSING_ON']:
+            return super().form_valid(form)
+        # resized and sent to directory-api by the logo worker
+        logos.logo_outbox.enqueue_logo(
+            file=form.cleaned_data['logo'],
+            sso_session_id=self.request.user.session_id,
+            sso_id=self.request.user.id,
+            company_number=self.request.user.company.data['number'],
+        )
+        messages.success(self.request, self.processing_message)
+        return redirect(self.success_url)
 
 
 class ExpertiseRoutingFormView(FormView):
@@ -230,9 +268,10 @@ class PublishFormView(BaseFormView):
         return super().get_context_data(company=company, **kwargs)
 
 
-class BaseCaseStudyWizardView(NamedUrlSessionWizardView):
+class BaseCaseStudyWizardView(core.mixins.OversizedUploadMixin, NamedUrlSessionWizardView):
 
     done_step_name = 'finished'
+    storage_name = settings.WIZARD_STORAGE_NAME
 
     file_storage = DefaultStorage()
 
@@ -248,24 +287,69 @@ class BaseCaseStudyWizardView(NamedUrlSessionWizardView):
     def get_template_names(self):
         return [self.templates[self.steps.current]]
 
+    @cached_property
+    def direct_upload_key_prefix(self):
+        return helpers.build_case_study_upload_prefix(self.request.user.id)
+
+    def get_form_kwargs(self, step=None):
+        kwargs = super().get_form_kwargs(step=step)
+        if step == MEDIA:
+            kwargs['direct_upload_key_prefix'] = self.direct_upload_key_prefix
+        return kwargs
+
     def serialize_form_list(self, form_list):
+        self.direct_upload_keys = []
         data = {}
         for form in form_list:
             data.update(form.cleaned_data)
         # the case studies edit view pre-populates the image fields with the
         # url of the existing value (rather than the real file). Things would
         # get confused if we send a string instead of a file here.
-        for field in ['image_one', 'image_two', 'image_three']:
+        for field in forms.CaseStudyRichMediaForm.DIRECT_UPLOAD_FIELDS:
             value = data.get(field)
-            if not value or isinstance(value, str):
+            if value and isinstance(value, str) and value.startswith(f'{self.direct_upload_key_prefix}/'):
+                # uploaded straight to S3 by the browser
+                data[field] = direct_upload.open_object(value)
+                self.direct_upload_keys.append(value)
+            elif not value or isinstance(value, str):
                 del data[field]
         return data
 
+    def delete_direct_uploads(self):
+        # directory-api keeps its own copy, so the uploads are no longer needed
+        if self.direct_upload_keys:
+            direct_upload.delete_objects(self.direct_upload_keys)
+
+
+class CaseStudyMediaUploadView(View):
+    """Sign a policy for the browser to upload a case study image straight to S3."""
+
+    def dispatch(self, *args, **kwargs):
+        if not settings.FEATURE_FLAGS['CASE_STUDY_DIRECT_UPLOAD_ON']:
+            raise Http404()
+        return super().dispatch(*args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        form = forms.CaseStudyMediaUploadForm(data=request.POST)
+        if not form.is_valid():
+            return JsonResponse(form.errors, status=400)
+        key = direct_upload.build_key(
+            prefix=helpers.build_case_study_upload_prefix(request.user.id),
+            filename=form.cleaned_data['filename'],
+        )
+        presigned_post = direct_upload.create_presigned_post(
+            key=key,
+            max_size=settings.VALIDATOR_MAX_CASE_STUDY_IMAGE_SIZE_BYTES,
+            content_types=forms.CASE_STUDY_IMAGE_CONTENT_TYPES,
+        )
+        return JsonResponse({'key': key, **presigned_post})
+
 
 class CaseStudyWizardEditView(BaseCaseStudyWizardView):
 
     def get_form_initial(self, step):
-        response = api_client.company.case_study_retrieve(
+        response = request_cache.call(
+            api_client.company.case_study_retrieve,
             sso_session_id=self.request.user.session_id,
             case_study_id=self.kwargs['id'],
         )
@@ -275,12 +359,16 @@ class CaseStudyWizardEditView(BaseCaseStudyWizardView):
         return response.json()
 
     def done(self, form_list, *args, **kwags):
-        response = api_client.company.case_study_update(
+        response = upstream.call(
+            api_client.company.case_study_update,
             data=self.serialize_form_list(form_list),
             case_study_id=self.kwargs['id'],
             sso_session_id=self.request.user.session_id,
         )
+        request_cache.clear()
+        helpers.clear_cached_company_profile(self.request.user.id)
         response.raise_for_status()
+        self.delete_direct_uploads()
         return redirect('business-profile')
 
     def get_step_url(self, step):
@@ -291,20 +379,72 @@ class CaseStudyWizardEditView(BaseCaseStudyWizardView):
 
 class CaseStudyWizardCreateView(BaseCaseStudyWizardView):
     def done(self, form_list, *args, **kwags):
-        response = api_client.company.case_study_create(
+        response = upstream.call(
+            api_client.company.case_study_create,
             sso_session_id=self.request.user.session_id,
             data=self.serialize_form_list(form_list),
         )
+        request_cache.clear()
+        helpers.clear_cached_company_profile(self.request.user.id)
         response.raise_for_status()
+        self.delete_direct_uploads()
         return redirect('business-profile')
 
 
-class AdminCollaboratorsListView(TemplateView):
+class CollaboratorPaginationMixin:
+    """Filter and paginate a list of collaborators or invites by the querystring."""
+
+    def parse_cursor(self, value):
+        return value
+
+    @cached_property
+    def filter_form(self):
+        return forms.CollaboratorFilterForm(data=self.request.GET)
+
+    def get_filters(self):
+        if not self.filter_form.is_valid():
+            return {}
+        filters = {
+            'role': self.filter_form.cleaned_data['role'],
+            'name': self.filter_form.cleaned_data['name'],
+        }
+        if self.filter_form.cleaned_data['cursor']:
+            try:
+                filters['cursor'] = self.parse_cursor(self.filter_form.cleaned_data['cursor'])
+            except ValueError:
+                pass
+        return filters
+
+    def get_pagination_context(self, page):
+        context = {'filter_form': self.filter_form, 'page': page}
+        if page.next_cursor is not None:
+            querystring = self.request.GET.copy()
+            querystring['cursor'] = page.next_cursor
+            context['next_page_querystring'] = querystring.urlencode()
+        if self.request.GET.get('cursor'):
+            querystring = self.request.GET.copy()
+            del querystring['cursor']
+            context['first_page_querystring'] = querystring.urlencode()
+        return context
+
+
+class AdminCollaboratorsListView(CollaboratorPaginationMixin, TemplateView):
     template_name = 'business_profile/admin-collaborator-list.html'
 
+    def parse_cursor(self, value):
+        return int(value)
+
     def get_context_data(self, **kwargs):
-        collaborators = helpers.collaborator_list(self.request.user.session_id)
-        return super().get_context_data(collaborators=collaborators, **kwargs)
+        page = helpers.list_collaborators(
+            sso_session_id=self.request.user.session_id,
+            company_number=self.request.user.company.data['number'],
+            **self.get_filters(),
+        )
+        return super().get_context_data(
+            collaborators=page.items,
+            **self.get_pagination_context(page),
+            **kwargs,
+        )
 
 
 class MemberDisconnectFromCompany(DisconnectFromCompanyMixin, SuccessMessageMixin, FormView):
@@ -337,6 +477,7 @@ class AdminCollaboratorEditFormView(SuccessMessageMixin, FormView):
     def collaborator(self):
         return helpers.retrieve_collaborator(
             sso_session_id=self.request.user.session_id,
+            company_number=self.request.user.company.data['number'],
             collaborator_sso_id=int(self.kwargs['sso_id'])
         )
 
@@ -364,17 +505,55 @@ class AdminCollaboratorEditFormView(SuccessMessageMixin, FormView):
                 sso_id=self.collaborator['sso_id'],
                 role=role,
             )
+        helpers.clear_cached_collaborator_directory(self.request.user.company.data['number'])
         return super().form_valid(form)
 
     def get_success_message(self, cleaned_data):
         return self.success_messages[cleaned_data['action']]
 
 
+class AdminCollaboratorBulkFormView(FormView):
+    template_name = 'business_profile/admin-collaborator-bulk.html'
+    form_class = forms.AdminCollaboratorBulkForm
+    success_url = reverse_lazy('business-profile-admin-tools')
+    # one call per change on top of the usual reads
+    upstream_call_budget = settings.UPSTREAM_CALL_BUDGET + forms.AdminCollaboratorBulkForm.MAX_CHANGES
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        directory = helpers.get_collaborator_directory(
+            self.request.user.session_id, self.request.user.company.data['number']
+        )
+        kwargs['collaborators'] = [item for item in directory if item['sso_id'] != self.request.user.id]
+        return kwargs
+
+    def form_valid(self, form):
+        errors = helpers.collaborator_bulk_update(
+            sso_session_id=self.request.user.session_id,
+            invites=form.invites,
+            role_updates=form.role_updates,
+            removals=form.removals,
+        )
+        helpers.clear_cached_collaborator_directory(self.request.user.company.data['number'])
+        change_count = len(form.invites) + len(form.role_updates) + len(form.removals) - len(errors)
+        if change_count:
+            message = ngettext(
+                '%(count)d collaborator change made', '%(count)d collaborator changes made', change_count
+            )
+            messages.success(self.request, message % {'count': change_count})
+        names = {item['sso_id']: item['name'] or item['company_email'] for item in form.collaborators}
+        for key in errors:
+            messages.error(self.request, f'Could not update {names.get(key, key)}')
+        return super().form_valid(form)
+
+
 class AdminDisconnectFormView(DisconnectFromCompanyMixin, SuccessMessageMixin, FormView):
     template_name = 'business_profile/admin-disconnect.html'
 
     def get_context_data(self, **kwargs):
-        is_sole_admin = helpers.is_sole_admin(self.request.user.session_id)
+        is_sole_admin = helpers.is_sole_admin(
+            self.request.user.session_id, self.request.user.company.data['number']
+        )
         return super().get_context_data(is_sole_admin=is_sole_admin, **kwargs)
 
 
@@ -395,7 +574,9 @@ class AdminInviteNewAdminFormView(SuccessMessageMixin, FormView):
 
     @cached_property
     def collaborators(self):
-        return helpers.collaborator_list(self.request.user.session_id)
+        return helpers.get_collaborator_directory(
+            self.request.user.session_id, self.request.user.company.data['number']
+        )
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -423,6 +604,7 @@ class AdminInviteNewAdminFormView(SuccessMessageMixin, FormView):
                     sso_id=form.cleaned_data['sso_id'],
                     role=user_roles.ADMIN
                 )
+                helpers.clear_cached_collaborator_directory(self.request.user.company.data['number'])
         except HTTPError as error:
             if error.response.status_code == 400:
                 parsed = error.response.json()
@@ -435,7 +617,9 @@ class AdminInviteNewAdminFormView(SuccessMessageMixin, FormView):
         return super().form_valid(form)
 
 
-class AdminInviteCollaboratorFormView(SuccessMessageMixin, FormView):
+class AdminInviteCollaboratorFormView(
+    CollaboratorPaginationMixin, core.mixins.PrefetchMixin, SuccessMessageMixin, FormView
+):
     template_name = 'business_profile/admin-invite-collaborator.html'
     form_class = forms.AdminInviteCollaboratorForm
     success_message = (
@@ -443,11 +627,17 @@ class AdminInviteCollaboratorFormView(SuccessMessageMixin, FormView):
     )
     success_url = reverse_lazy('business-profile-admin-invite-collaborator')
 
+    def get_prefetch_calls(self):
+        if self.request.method != 'GET':
+            return []
+        user = self.request.user
+        return [partial(getattr, user, 'company'), partial(helpers.collaborator_invite_list, user.session_id)]
+
     def get_context_data(self, **kwargs):
-        collaborator_invites = helpers.collaborator_invite_list(self.request.user.session_id)
-        collaborator_invites_not_accepted = [c for c in collaborator_invites if not c['accepted']]
+        page = helpers.list_collaborator_invites(sso_session_id=self.request.user.session_id, **self.get_filters())
         return super().get_context_data(
-            collaborator_invites=collaborator_invites_not_accepted,
+            collaborator_invites=page.items,
+            **self.get_pagination_context(page),
             **kwargs,
         )
 
@@ -590,6 +780,8 @@ class IdentityVerificationRequestFormView(SuccessMessageMixin, FormView):
         return super().dispatch(*args, **kwargs)
 
     def form_valid(self, form):
-        response = api_client.company.verify_identity_request(self.request.user.session_id)
+        response = upstream.call(api_client.company.verify_identity_request, self.request.user.session_id)
+        request_cache.clear()
+        helpers.clear_cached_company_profile(self.request.user.id)
         response.raise_for_status()
         return super().form_valid(form)
@@ -1,13 +1,24 @@
 import http
+import socket
 import urllib.parse as urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 
 from django.conf import settings
+from django.core.cache import cache
+
+from core import upstream
+
+
+CACHE_KEY_OPPORTUNITIES = 'EXPORT_OPPORTUNITIES'
+CACHE_MISS = object()
 
 
 def get_opportunities(sso_id):
-    response = exopps_client.get_opportunities(sso_id)
+    response = upstream.call(exopps_client.get_opportunities, sso_id)
     if response.status_code == http.client.FORBIDDEN:
         return None
     elif response.status_code == http.client.OK:
@@ -15,6 +26,39 @@ def get_opportunities(sso_id):
     raise response.raise_for_status()
 
 
+def build_opportunities_cache_key(sso_id):
+    return f'{CACHE_KEY_OPPORTUNITIES}-{sso_id}'
+
+
+def get_cached_opportunities(sso_id, refresh=False):
+    # `None` is cached when the user is not an exops user, so distinguish it from a miss
+    key = build_opportunities_cache_key(sso_id)
+    value = CACHE_MISS if refresh else cache.get(key, CACHE_MISS)
+    if value is CACHE_MISS:
+        value = get_opportunities(sso_id)
+        if value is None:
+            timeout = settings.EXPORTING_OPPORTUNITIES_NOT_FOUND_CACHE_TIMEOUT
+        else:
+            timeout = settings.EXPORTING_OPPORTUNITIES_CACHE_TIMEOUT
+        cache.set(key=key, value=value, timeout=timeout)
+    return value
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """Enable TCP keep-alive probes on pooled connections.
+
+    Stops idle connections in the pool being silently dropped by load
+    balancers between requests.
+
+    """
+
+    socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.socket_options
+        return super().init_poolmanager(*args, **kwargs)
+
+
 class ExportingIsGreatClient:
     auth = requests.auth.HTTPBasicAuth(
         settings.EXPORTING_OPPORTUNITIES_API_BASIC_AUTH_USERNAME,
@@ -25,11 +69,38 @@ class ExportingIsGreatClient:
         'opportunities': 'api/profile_dashboard'
     }
     secret = settings.EXPORTING_OPPORTUNITIES_API_SECRET
+    timeout = (
+        settings.EXPORTING_OPPORTUNITIES_API_CONNECT_TIMEOUT,
+        settings.EXPORTING_OPPORTUNITIES_API_READ_TIMEOUT,
+    )
+
+    def __init__(self):
+        self.session = self.build_session()
+
+    def build_session(self):
+        retry = Retry(
+            total=settings.EXPORTING_OPPORTUNITIES_API_MAX_RETRIES,
+            backoff_factor=settings.EXPORTING_OPPORTUNITIES_API_RETRY_BACKOFF_FACTOR,
+            status_forcelist=[502, 503, 504],
+            method_whitelist=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter_class = KeepAliveHTTPAdapter if settings.EXPORTING_OPPORTUNITIES_API_TCP_KEEPALIVE else HTTPAdapter
+        adapter = adapter_class(
+            pool_connections=1,
+            pool_maxsize=settings.EXPORTING_OPPORTUNITIES_API_POOL_MAXSIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.auth = self.auth
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     def get(self, partial_url, params):
         params['shared_secret'] = self.secret
         url = urlparse.urljoin(self.base_url, partial_url)
-        return requests.get(url, params=params, auth=self.auth)
+        return self.session.get(url, params=params, timeout=self.timeout)
 
     def get_opportunities(self, sso_id):
         params = {'sso_user_id': sso_id}
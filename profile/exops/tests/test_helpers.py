@@ -1,9 +1,16 @@
+import socket
 from unittest.mock import patch
 
+import pytest
+from requests.exceptions import HTTPError
+
+from django.core.cache import cache
+
+from core.tests.helpers import create_response
 from profile.exops import helpers
 
 
-@patch('requests.get')
+@patch('requests.Session.get')
 def test_exporting_is_great_handles_auth(mock_get, settings):
     client = helpers.ExportingIsGreatClient()
     client.base_url = 'http://b.co'
@@ -16,7 +23,78 @@ def test_exporting_is_great_handles_auth(mock_get, settings):
     mock_get.assert_called_once_with(
         'http://b.co/api/profile_dashboard',
         params={'sso_user_id': 2, 'shared_secret': 123},
-        auth=helpers.exopps_client.auth
+        timeout=(
+            settings.EXPORTING_OPPORTUNITIES_API_CONNECT_TIMEOUT,
+            settings.EXPORTING_OPPORTUNITIES_API_READ_TIMEOUT,
+        )
     )
+    assert client.session.auth == helpers.exopps_client.auth
     assert helpers.exopps_client.auth.username == username
     assert helpers.exopps_client.auth.password == password
+
+
+def test_exporting_is_great_session_pooled(settings):
+    settings.EXPORTING_OPPORTUNITIES_API_POOL_MAXSIZE = 5
+    settings.EXPORTING_OPPORTUNITIES_API_MAX_RETRIES = 3
+
+    client = helpers.ExportingIsGreatClient()
+    adapter = client.session.get_adapter('https://b.co')
+
+    assert type(adapter) is helpers.HTTPAdapter
+    assert adapter._pool_maxsize == 5
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.method_whitelist == {'GET'}
+    assert client.session.get_adapter('http://b.co') is adapter
+
+
+def test_exporting_is_great_session_tcp_keepalive(settings):
+    settings.EXPORTING_OPPORTUNITIES_API_TCP_KEEPALIVE = True
+
+    client = helpers.ExportingIsGreatClient()
+    adapter = client.session.get_adapter('https://b.co')
+
+    assert isinstance(adapter, helpers.KeepAliveHTTPAdapter)
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in adapter.poolmanager.connection_pool_kw['socket_options']
+
+
+@patch.object(helpers.exopps_client, 'get_opportunities')
+def test_get_cached_opportunities(mock_get_opportunities, settings):
+    mock_get_opportunities.return_value = create_response({'applications': []})
+
+    assert helpers.get_cached_opportunities(sso_id=2) == {'applications': []}
+    assert helpers.get_cached_opportunities(sso_id=2) == {'applications': []}
+    assert mock_get_opportunities.call_count == 1
+    assert cache.ttl(helpers.build_opportunities_cache_key(2)) == settings.EXPORTING_OPPORTUNITIES_CACHE_TIMEOUT
+
+
+@patch.object(helpers.exopps_client, 'get_opportunities')
+def test_get_cached_opportunities_not_exops_user(mock_get_opportunities, settings):
+    mock_get_opportunities.return_value = create_response(status_code=403)
+
+    assert helpers.get_cached_opportunities(sso_id=2) is None
+    assert helpers.get_cached_opportunities(sso_id=2) is None
+    assert mock_get_opportunities.call_count == 1
+    assert cache.ttl(helpers.build_opportunities_cache_key(2)) == (
+        settings.EXPORTING_OPPORTUNITIES_NOT_FOUND_CACHE_TIMEOUT
+    )
+
+
+@patch.object(helpers.exopps_client, 'get_opportunities')
+def test_get_cached_opportunities_error_not_cached(mock_get_opportunities):
+    mock_get_opportunities.side_effect = [create_response(status_code=500), create_response({})]
+
+    with pytest.raises(HTTPError):
+        helpers.get_cached_opportunities(sso_id=2)
+
+    assert helpers.get_cached_opportunities(sso_id=2) == {}
+    assert mock_get_opportunities.call_count == 2
+
+
+@patch.object(helpers.exopps_client, 'get_opportunities')
+def test_get_cached_opportunities_refresh(mock_get_opportunities):
+    mock_get_opportunities.side_effect = [create_response({'a': 1}), create_response({'a': 2})]
+
+    assert helpers.get_cached_opportunities(sso_id=2) == {'a': 1}
+    assert helpers.get_cached_opportunities(sso_id=2, refresh=True) == {'a': 2}
+    assert helpers.get_cached_opportunities(sso_id=2) == {'a': 2}
+    assert mock_get_opportunities.call_count == 2
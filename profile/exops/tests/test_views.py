@@ -1,5 +1,7 @@
 from unittest.mock import patch, Mock
 
+from requests.exceptions import Timeout
+
 from django.urls import reverse
 
 from core.tests.helpers import create_response
@@ -111,3 +113,34 @@ def test_opportunities_email_alerts_retrieve_error(client, user):
     assert response.template_name == [
         views.ExportOpportunitiesEmailAlertsView.template_name_error
     ]
+
+
+@patch.object(exopps_client, 'get_opportunities', side_effect=Timeout)
+def test_opportunities_applications_retrieve_timeout(mock_get_opportunities, client, user):
+    client.force_login(user)
+
+    response = client.get(reverse('export-opportunities-applications'))
+
+    assert response.template_name == [
+        views.ExportOpportunitiesApplicationsView.template_name_error
+    ]
+
+
+@patch.object(exopps_client, 'get_opportunities', response_factory(200))
+def test_opportunities_cached_across_tabs(client, user):
+    client.force_login(user)
+
+    client.get(reverse('export-opportunities-applications'))
+    client.get(reverse('export-opportunities-email-alerts'))
+
+    assert exopps_client.get_opportunities.call_count == 1
+
+
+@patch.object(exopps_client, 'get_opportunities', response_factory(200))
+def test_opportunities_cache_bypass(client, user):
+    client.force_login(user)
+
+    client.get(reverse('export-opportunities-applications'))
+    client.get(reverse('export-opportunities-applications'), {'refresh': ''})
+
+    assert exopps_client.get_opportunities.call_count == 2
@@ -1,4 +1,4 @@
-from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 
 from django.conf import settings
 from django.views.generic import TemplateView
@@ -10,13 +10,18 @@ class ExportOpportunitiesBaseView(TemplateView):
     template_name_not_exops_user = 'exops/is-not-exops-user.html'
     template_name_error = 'exops/opportunities-retrieve-error.html'
 
+    refresh_param = 'refresh'
+
     opportunities = None
     opportunities_retrieve_error = False
 
     def dispatch(self, request, *args, **kwargs):
         try:
-            self.opportunities = helpers.get_opportunities(request.user.id)
-        except HTTPError:
+            self.opportunities = helpers.get_cached_opportunities(
+                sso_id=request.user.id,
+                refresh=self.refresh_param in request.GET,
+            )
+        except RequestException:
             self.opportunities_retrieve_error = True
         return super().dispatch(request, *args, **kwargs)
 
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from profile.business_profile.logos import logo_outbox
+
+
+class Command(BaseCommand):
+    help = 'Resize the logos queued for processing and send them to directory-api.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the logos that are currently due and then exit.',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count = logo_outbox.drain()
+            self.stdout.write(self.style.SUCCESS(f'Processed {count} logos'))
+            return
+        while True:
+            logo_outbox.recover()
+            logo_outbox.promote_due()
+            logo_outbox.process_one(block_timeout=settings.OUTBOX_POLL_TIMEOUT)
@@ -10,7 +10,7 @@ class SSOUser(directory_sso_api_client.models.SSOUser):
 
     @cached_property
     def company(self):
-        company = helpers.get_company_profile(self.session_id)
+        company = helpers.get_cached_company_profile(sso_session_id=self.session_id, sso_id=self.id)
         if company:
             return helpers.CompanyParser(company)
 